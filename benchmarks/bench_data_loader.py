@@ -0,0 +1,35 @@
+"""Compare DataLoader throughput (rows/sec) across worker counts on a generated file.
+
+Usage: python -m benchmarks.bench_data_loader --rows 2000000 --workers 1 4 16
+"""
+import argparse
+import os
+import tempfile
+import time
+from benchmarks.synthetic import generate_transactions
+from src.data_loader import DataLoader
+
+def main():
+    parser = argparse.ArgumentParser(description="DataLoader parallel parsing benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16, os.cpu_count()])
+    parser.add_argument("--input", help="Existing JSONL file to use instead of a generated one")
+    args = parser.parse_args()
+
+    path = args.input
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "transfers.jsonl")
+        print(f"Generating {args.rows} rows into {path}...")
+        generate_transactions(path, args.rows)
+
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        start = time.perf_counter()
+        df = DataLoader(path, workers=workers).load_data()
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"workers={workers:3d}  rows={len(df)}  {elapsed:8.2f}s  "
+              f"{len(df) / elapsed:12,.0f} rows/sec  speedup={baseline / elapsed:5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Peak RSS of each analysis stage, measured in a fresh process per stage.
+
+Each stage runs in its own spawned process, after loading the transactions.
+On Linux the RSS high-water mark is reset once loading is done, so the peak
+reflects the stage itself; the benchmark reports how much the stage added
+above the loaded table. Run it on two revisions to compare memory before and
+after a change.
+
+Usage: python -m benchmarks.bench_memory --rows 2000000
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from benchmarks.synthetic import generate_transactions
+from src.profiling import current_rss_mb, peak_rss_mb, reset_peak_rss
+
+STAGES = ("run_clustering", "run_anomaly_detection", "run_network_analysis")
+
+def _measure(path, stage, graph_backend):
+    from src.analyzer import BlockchainAnalyzer
+    analyzer = BlockchainAnalyzer(path, use_cache=False, graph_backend=graph_backend,
+                                  clustering_method="minibatch_kmeans",
+                                  models_path=os.path.join(tempfile.mkdtemp(), "models.pkl"))
+    analyzer.load_data()
+    gc.collect()
+    loaded = current_rss_mb() if reset_peak_rss() else peak_rss_mb()
+    start = time.perf_counter()
+    getattr(analyzer, stage)()
+    return loaded, peak_rss_mb(), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage peak memory benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--input", help="Existing JSONL file to use instead of a generated one")
+    parser.add_argument("--graph-backend", choices=["networkx", "sparse"], default="sparse")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    args = parser.parse_args()
+
+    path = args.input
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(), "transfers.jsonl")
+        print(f"Generating {args.rows} rows into {path}...")
+        generate_transactions(path, args.rows)
+
+    for stage in args.stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            loaded, peak, seconds = pool.submit(_measure, path, stage, args.graph_backend).result()
+        print(f"{stage:24s} loaded={loaded:9.1f} MB  peak={peak:9.1f} MB  "
+              f"stage_added={peak - loaded:9.1f} MB  {seconds:8.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare NetworkAnalyzer backends (networkx vs sparse CSR) on random edge tables.
+
+Usage: python -m benchmarks.bench_network --edges 100000 1000000 10000000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+from src.network_analysis import NetworkAnalyzer
+
+def random_transactions(n_edges, seed=42):
+    rng = np.random.default_rng(seed)
+    n_nodes = max(10, n_edges // 5)
+    # Zipf-distributed senders give the hub-heavy degree distribution seen on-chain
+    senders = (rng.zipf(1.8, n_edges) - 1) % n_nodes
+    recipients = rng.integers(0, n_nodes, n_edges)
+    transactions = pd.DataFrame({"amount": rng.lognormal(5, 2, n_edges)})
+    index = AddressIndex(pd.RangeIndex(n_nodes), senders.astype(np.int32), recipients.astype(np.int32))
+    return transactions, index
+
+def run(backend, transactions, index, k):
+    timings = {}
+    analyzer = NetworkAnalyzer(transactions, index, backend=backend)
+    for name, step in [
+        ("build", analyzer.build_graph),
+        ("centrality", lambda: analyzer.analyze_centrality(k=k)),
+        ("hubs", lambda: analyzer.get_hubs(threshold=0.01)),
+        ("table", lambda: analyzer.centrality_table(hub_threshold=0.01, k=k)),
+        ("components", analyzer.connected_components),
+        ("pagerank", analyzer.pagerank),
+    ]:
+        start = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Graph backend benchmark")
+    parser.add_argument("--edges", type=int, nargs="+", default=[10**5, 10**6, 10**7])
+    parser.add_argument("--k", type=int, default=10, help="Betweenness pivots")
+    parser.add_argument("--max-networkx-edges", type=int, default=10**6,
+                        help="Skip the networkx backend above this size (it needs hundreds of bytes per edge)")
+    args = parser.parse_args()
+
+    for n_edges in args.edges:
+        transactions, index = random_transactions(n_edges)
+        for backend in ("networkx", "sparse"):
+            if backend == "networkx" and n_edges > args.max_networkx_edges:
+                print(f"edges={n_edges:>10,}  backend={backend:8s}  skipped")
+                continue
+            timings = run(backend, transactions, index, args.k)
+            steps = "  ".join(f"{name}={secs:7.2f}s" for name, secs in timings.items())
+            print(f"edges={n_edges:>10,}  backend={backend:8s}  total={sum(timings.values()):7.2f}s  {steps}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""CLI startup time and heavy imports pulled in by `import src.analyzer`.
+
+Each measurement runs in a fresh interpreter. Exits non-zero if the median
+`--help` time exceeds --max-seconds or a heavy dependency is imported at module
+load, so it can guard against startup regressions in CI.
+
+Usage: python -m benchmarks.bench_startup --runs 5 --max-seconds 2
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Dependencies that should only be imported by the stage that needs them
+HEAVY_MODULES = ("sklearn", "hdbscan", "networkx", "matplotlib", "openai", "fpdf", "scipy")
+
+def loaded_heavy_modules(module="src.analyzer"):
+    """Heavy modules present in sys.modules after importing module in a fresh interpreter."""
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    return output.stdout.split()
+
+def time_command(args, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyzer startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=None,
+                        help="Fail if the median `python -m src.analyzer --help` time exceeds this")
+    args = parser.parse_args()
+
+    baseline = time_command(["-c", "pass"], args.runs)
+    import_time = time_command(["-c", "import src.analyzer"], args.runs)
+    help_time = time_command(["-m", "src.analyzer", "--help"], args.runs)
+    heavy = loaded_heavy_modules()
+    print(f"interpreter          {baseline:6.2f}s")
+    print(f"import src.analyzer  {import_time:6.2f}s")
+    print(f"--help               {help_time:6.2f}s")
+    print(f"heavy imports        {', '.join(heavy) or 'none'}")
+    if heavy or (args.max_seconds is not None and help_time > args.max_seconds):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Scaling benchmark: throughput, peak memory and anomaly recall per stage and input size.
+
+For each size a seeded synthetic file with injected anomalies is generated
+(or reused from --data-dir). Loading and each analysis stage then run in a
+fresh spawned process under src.profiling, and one JSON line per
+(size, stage) is appended to the results file, tagged with --label and the
+git revision. Anomaly detection also records the recall of the injected
+amount anomalies and burst senders, and network analysis the recall of the
+injected cycles, so a speed-up can be checked for lost detections. Compare
+two runs with --baseline.
+
+Usage: python -m benchmarks.bench_suite --rows 10000 100000 1000000 10000000 --label my-change
+       python -m benchmarks.bench_suite --rows 100000 --baseline main --min-recall 0.9
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from benchmarks.synthetic import generate_transactions
+
+STAGES = ("clustering", "anomaly_detection", "network_analysis")
+
+def dataset(data_dir, rows, seed):
+    path = os.path.join(data_dir, f"synthetic_{rows}_{seed}.jsonl")
+    truth_path = path.replace(".jsonl", ".truth.json")
+    if not (os.path.exists(path) and os.path.exists(truth_path)):
+        print(f"Generating {rows} rows into {path}...")
+        generate_transactions(path, rows, seed=seed, truth_path=truth_path)
+    return path, truth_path
+
+def _measure(path, truth_path, stage, options):
+    from src.analyzer import BlockchainAnalyzer
+    from src.profiling import Profiler, profile_step
+    analyzer = BlockchainAnalyzer(path, use_cache=False, graph_backend=options["graph_backend"],
+                                  clustering_method=options["clustering_method"],
+                                  clustering_sample_size=options["clustering_sample_size"],
+                                  models_path=os.path.join(tempfile.mkdtemp(), "models.pkl"))
+    profiler = Profiler()
+    with profiler.activate():
+        analyzer.load_data()
+        with profile_step(stage, len(analyzer.transactions)):
+            getattr(analyzer, f"run_{stage}")()
+    recall = _recall(analyzer, stage, truth_path)
+    return profiler.records, recall
+
+def _recall(analyzer, stage, truth_path):
+    with open(truth_path) as f:
+        truth = json.load(f)
+    if stage == "network_analysis":
+        cycles = analyzer.raw_network_results.get("cycles")
+        if cycles is None or not truth.get("cycles"):
+            return {}
+        found = {tuple(hashes) for hashes in cycles.groupby("cycle")["tx_hash"].agg(tuple)}
+        return {
+            "cycle_recall": sum(tuple(cycle) in found for cycle in truth["cycles"]) / len(truth["cycles"]),
+            "cycles_found": len(found),
+        }
+    if stage != "anomaly_detection":
+        return {}
+    flagged_rows = set(analyzer.raw_anomaly_results["amount_anomalies"]["tx_hash"])
+    flagged_senders = set(analyzer.raw_anomaly_results["activity_anomalies"]["sender"])
+    return {
+        "amount_recall": sum(h in flagged_rows for h in truth["amount_anomalies"]) / len(truth["amount_anomalies"]),
+        "burst_recall": sum(s in flagged_senders for s in truth["burst_senders"]) / len(truth["burst_senders"]),
+        "amount_flagged": len(flagged_rows),
+        "senders_flagged": len(flagged_senders),
+    }
+
+def _result(record, rows, stage, label, revision, steps=None, **extra):
+    return {
+        "label": label,
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "rows": rows,
+        "stage": stage,
+        "seconds": record["wall_seconds"],
+        "cpu_seconds": record["cpu_seconds"],
+        "rows_per_sec": record.get("rows_per_sec"),
+        "peak_rss_mb": record["peak_rss_mb"],
+        "rss_start_mb": record["rss_start_mb"],
+        "steps": steps or {},
+        **extra,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_results(path, label):
+    """Latest result per (rows, stage) recorded under label."""
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                result = json.loads(line)
+                if result["label"] == label:
+                    latest[(result["rows"], result["stage"])] = result
+    return latest
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage scaling benchmark on synthetic transfers")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10**4, 10**5, 10**6])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data-dir", default=None, help="Where generated inputs are kept and reused (default: temp dir)")
+    parser.add_argument("--output", default="benchmarks/results.jsonl", help="Results file (JSON lines, appended)")
+    parser.add_argument("--label", default=None, help="Tag for this run (default: the git revision)")
+    parser.add_argument("--baseline", help="Label of an earlier run in the results file to compare against")
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="Exit with an error if any anomaly recall falls below this")
+    parser.add_argument("--graph-backend", choices=["networkx", "sparse"], default="sparse")
+    parser.add_argument("--clustering-method", choices=["hdbscan", "kmeans", "minibatch_kmeans"],
+                        default="minibatch_kmeans")
+    parser.add_argument("--clustering-sample-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    revision = git_revision()
+    label = args.label or revision or "unlabelled"
+    data_dir = args.data_dir or tempfile.mkdtemp()
+    os.makedirs(data_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    baseline = load_results(args.output, args.baseline) if args.baseline else {}
+    options = {"graph_backend": args.graph_backend, "clustering_method": args.clustering_method,
+               "clustering_sample_size": args.clustering_sample_size}
+
+    low_recall = []
+    for rows in args.rows:
+        path, truth_path = dataset(data_dir, rows, args.seed)
+        results = []
+        for stage in args.stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                records, recall = pool.submit(_measure, path, truth_path, stage, options).result()
+            by_name = {record["name"]: record for record in records}
+            if not results:
+                results.append(_result(by_name["load"], rows, "load", label, revision))
+            steps = {r["name"]: r["wall_seconds"] for r in records if r["parent"] == stage}
+            results.append(_result(by_name[stage], rows, stage, label, revision, steps, **recall))
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        for result in results:
+            print(_format(result, baseline.get((rows, result["stage"]))))
+            for key in ("amount_recall", "burst_recall", "cycle_recall"):
+                if args.min_recall is not None and key in result and result[key] < args.min_recall:
+                    low_recall.append(f"{result['stage']} rows={rows} {key}={result[key]:.3f}")
+    print(f"Results appended to {args.output} (label {label})")
+    if low_recall:
+        sys.exit("Recall below --min-recall: " + "; ".join(low_recall))
+
+def _format(result, base=None):
+    line = (f"rows={result['rows']:>10,}  {result['stage']:18s} {result['seconds']:8.2f}s  "
+            f"{result['rows'] / result['seconds'] if result['seconds'] else float('inf'):12,.0f} rows/sec  "
+            f"peak={result['peak_rss_mb']:8.1f} MB")
+    if "amount_recall" in result:
+        line += f"  recall amount={result['amount_recall']:.3f} burst={result['burst_recall']:.3f}"
+    if "cycle_recall" in result:
+        line += f"  recall cycles={result['cycle_recall']:.3f}"
+    if base:
+        line += f"  speedup={base['seconds'] / result['seconds']:5.2f}x  peak_delta={result['peak_rss_mb'] - base['peak_rss_mb']:+8.1f} MB"
+        if "amount_recall" in base and "amount_recall" in result:
+            line += (f"  recall_delta amount={result['amount_recall'] - base['amount_recall']:+.3f}"
+                     f" burst={result['burst_recall'] - base['burst_recall']:+.3f}")
+        if "cycle_recall" in base and "cycle_recall" in result:
+            line += f"  recall_delta cycles={result['cycle_recall'] - base['cycle_recall']:+.3f}"
+    return line
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Seeded synthetic transfers with heavy tails, power-law hubs and injected anomalies.
+
+Senders and recipients are drawn from power-law (Zipf-like) popularity
+weights, so a few hub addresses take a large share of the traffic and the
+degree distribution is heavy-tailed. Amounts are log-normal with a Pareto
+tail. Three kinds of anomalies are injected and written to a ground-truth file
+so benchmarks can check detection recall:
+
+- amount anomalies: single transfers far above the largest regular amount
+- burst senders: fresh addresses sending more transfers than almost any
+  regular sender within a few blocks
+- cycles: chains of 2-4 transfers in consecutive blocks that return a
+  near-identical amount to the first sender (round trips and wash trades)
+"""
+import json
+import numpy as np
+
+# Rows formatted per write; keeps memory flat when generating 10^7 rows
+CHUNK_ROWS = 500_000
+LINE = ('{{"sender": "{}", "recipient": "{}", "amount": "{:.6f}", "token": "token", '
+        '"height": "{}", "tx_hash": "0x{:064x}"}}\n')
+
+def generate_transactions(path: str, n_rows: int, n_addresses: int = None, seed: int = 42,
+                          anomaly_rate: float = 0.001, hub_exponent: float = 1.0, truth_path: str = None):
+    """Write n_rows synthetic transfers in the sender/recipient/amount/height JSONL schema.
+
+    Args:
+        n_addresses: regular address pool (default n_rows // 10)
+        anomaly_rate: share of rows that are injected amount anomalies; one
+            burst sender is injected per 10 / anomaly_rate regular addresses
+            and one cycle per 10 / anomaly_rate rows
+        hub_exponent: exponent of the address popularity power law (higher
+            means more traffic concentrated on the top hubs)
+        truth_path: if given, the injected anomalies are written there as JSON
+            (see synthetic_transactions)
+    """
+    columns, truth = synthetic_transactions(n_rows, n_addresses, seed, anomaly_rate, hub_exponent)
+    n_pool = int(max(columns["sender"].max(), columns["recipient"].max())) + 1
+    addresses = np.array([f"0x{i:040x}" for i in range(n_pool)], dtype=object)
+    with open(path, "w", encoding="utf-8") as f:
+        for start in range(0, n_rows, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n_rows)
+            rows = zip(addresses[columns["sender"][start:stop]], addresses[columns["recipient"][start:stop]],
+                       columns["amount"][start:stop].tolist(), columns["height"][start:stop].tolist(),
+                       range(start, stop))
+            f.write("".join([LINE.format(*row) for row in rows]))
+    if truth_path:
+        with open(truth_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "seed": seed,
+                "rows": n_rows,
+                "amount_anomalies": [f"0x{i:064x}" for i in truth["amount_rows"]],
+                "burst_senders": [addresses[i] for i in truth["burst_senders"]],
+                "cycles": [[f"0x{i:064x}" for i in cycle] for cycle in truth["cycles"]],
+            }, f)
+    return path
+
+def synthetic_transactions(n_rows: int, n_addresses: int = None, seed: int = 42, anomaly_rate: float = 0.001,
+                           hub_exponent: float = 1.0):
+    """Generate the transfer columns as arrays; returns (columns, truth).
+
+    columns holds integer sender/recipient ids, amount and height (sorted
+    ascending, about 50 transfers per block). truth holds the row positions
+    of the injected amount anomalies ("amount_rows"), the ids of the burst
+    senders ("burst_senders") and the row positions of each injected cycle
+    in transfer order ("cycles").
+    """
+    rng = np.random.default_rng(seed)
+    n_addresses = n_addresses or max(10, n_rows // 10)
+    weights = 1.0 / np.arange(1, n_addresses + 1) ** hub_exponent
+    weights /= weights.sum()
+    # Shuffle which ids are hubs so popularity does not follow id order
+    senders = rng.permutation(n_addresses)[rng.choice(n_addresses, n_rows, p=weights)]
+    recipients = rng.permutation(n_addresses)[rng.choice(n_addresses, n_rows, p=weights)]
+
+    amounts = rng.lognormal(mean=3, sigma=1.5, size=n_rows)
+    tail = rng.random(n_rows) < 0.02
+    amounts[tail] = np.exp(5) * (rng.pareto(1.5, int(tail.sum())) + 1)
+    heights = np.sort(rng.integers(0, max(1, n_rows // 50), n_rows)) + 1_000_000
+
+    # Burst senders: fresh ids above the regular pool, each sending somewhere between 2x and 20x
+    # the 99.9th percentile of regular sender counts, capped at 10% of all rows
+    counts = np.bincount(senders, minlength=n_addresses)
+    busy = np.quantile(counts[counts > 0], 0.999)
+    n_burst = max(1, int(n_addresses * anomaly_rate / 10))
+    burst_counts = np.maximum(1, (busy * np.geomspace(2, 20, n_burst)).astype(np.int64))
+    burst_counts = np.maximum(1, burst_counts * min(1.0, 0.1 * n_rows / burst_counts.sum())).astype(np.int64)
+    burst_rows = rng.choice(n_rows, int(burst_counts.sum()), replace=False)
+    burst_senders = n_addresses + np.arange(n_burst)
+    senders[burst_rows] = np.repeat(burst_senders, burst_counts)
+    # Each burst happens within a few blocks: move its rows to consecutive positions around a random start
+    offset = 0
+    order = np.arange(n_rows)
+    for count in burst_counts:
+        rows = burst_rows[offset:offset + count]
+        start = rng.integers(0, max(1, n_rows - count))
+        order[rows] = start + np.arange(count)
+        offset += count
+    heights = heights[np.clip(order, 0, n_rows - 1)]
+
+    regular = np.ones(n_rows, dtype=bool)
+    regular[burst_rows] = False
+    n_amount = max(1, int(round(n_rows * anomaly_rate)))
+    amount_rows = np.sort(rng.choice(np.flatnonzero(regular), min(n_amount, int(regular.sum())), replace=False))
+    amounts[amount_rows] = amounts.max() * rng.uniform(10, 100, len(amount_rows))
+    regular[amount_rows] = False
+
+    # Cycles: distinct regular addresses passing one amount around (minus a small fee), one block per hop
+    n_cycles = max(1, int(n_rows * anomaly_rate / 10))
+    lengths = rng.integers(2, 5, n_cycles)
+    cycle_rows = rng.choice(np.flatnonzero(regular), min(int(lengths.sum()), int(regular.sum())), replace=False)
+    cycles = []
+    offset = 0
+    for length in lengths:
+        rows = cycle_rows[offset:offset + length]
+        if len(rows) < length:
+            break
+        offset += length
+        members = rng.choice(n_addresses, length, replace=False)
+        senders[rows] = members
+        recipients[rows] = np.roll(members, -1)
+        amounts[rows] = rng.lognormal(3, 1.5) * (1 - 0.001 * np.arange(length))
+        heights[rows] = rng.integers(heights.min(), heights.max() + 1) + np.arange(length)
+        cycles.append(rows)
+
+    order = np.argsort(heights, kind="stable")
+    position = np.empty(n_rows, dtype=np.int64)
+    position[order] = np.arange(n_rows)
+    columns = {
+        "sender": senders[order],
+        "recipient": recipients[order],
+        "amount": np.round(amounts[order], 6),
+        "height": heights[order],
+    }
+    truth = {"amount_rows": np.sort(position[amount_rows]), "burst_senders": burst_senders,
+             "cycles": [position[rows] for rows in cycles]}
+    return columns, truth
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+class AddressIndex:
+    """Dense int32 ids for every address seen as a sender or recipient.
+
+    Built once at load time and shared by the clustering, anomaly and network
+    stages so they group and join on integer ids; address strings are only
+    materialized again when results are written out or plotted.
+    Missing addresses are encoded as -1.
+    """
+
+    def __init__(self, addresses: pd.Index, sender_ids: np.ndarray, recipient_ids: np.ndarray):
+        self.addresses = addresses
+        self.sender_ids = sender_ids
+        self.recipient_ids = recipient_ids
+
+    @classmethod
+    def from_transactions(cls, transactions: pd.DataFrame) -> "AddressIndex":
+        sender, recipient = transactions["sender"], transactions["recipient"]
+        if isinstance(sender.dtype, pd.CategoricalDtype) and isinstance(recipient.dtype, pd.CategoricalDtype):
+            if sender.cat.categories.equals(recipient.cat.categories):
+                # Loader output: both columns already share one dictionary, so ids are free
+                addresses = sender.cat.categories
+                sender_ids = sender.cat.codes.to_numpy()
+                recipient_ids = recipient.cat.codes.to_numpy()
+            else:
+                addresses = sender.cat.categories.union(recipient.cat.categories)
+                sender_ids = _recode(sender, addresses)
+                recipient_ids = _recode(recipient, addresses)
+        else:
+            codes, uniques = pd.factorize(np.concatenate([sender.to_numpy(), recipient.to_numpy()]))
+            addresses = pd.Index(uniques)
+            sender_ids, recipient_ids = codes[:len(sender)], codes[len(sender):]
+        return cls(addresses, sender_ids.astype(np.int32), recipient_ids.astype(np.int32))
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def decode(self, ids) -> np.ndarray:
+        """Materialize address strings for an array of ids."""
+        return self.addresses.take(np.asarray(ids)).to_numpy()
+
+    def encode(self, addresses) -> np.ndarray:
+        """Look up ids for address strings (-1 for unknown addresses)."""
+        return self.addresses.get_indexer(addresses).astype(np.int32)
+
+    def as_categorical(self, ids) -> pd.Categorical:
+        """Wrap ids as a Categorical over the address dictionary without copying strings."""
+        return pd.Categorical.from_codes(np.asarray(ids), categories=self.addresses)
+
+def _recode(column: pd.Series, addresses: pd.Index) -> np.ndarray:
+    """Translate a categorical column's codes into positions in a shared address dictionary."""
+    mapping = np.append(addresses.get_indexer(column.cat.categories), -1)
+    return mapping[column.cat.codes.to_numpy()]
+
+def share_address_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Give the sender and recipient columns one shared category dictionary."""
+    if "sender" not in df.columns or "recipient" not in df.columns:
+        return df
+    index = AddressIndex.from_transactions(df)
+    df["sender"] = index.as_categorical(index.sender_ids)
+    df["recipient"] = index.as_categorical(index.recipient_ids)
+    return df
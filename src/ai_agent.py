@@ -1,39 +1,221 @@
-from openai import OpenAI
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import pandas as pd
 from src.config import Config
 
+SYSTEM_PROMPT = "You are an expert in blockchain analysis."
+
+# Report sections, each requested separately; the methodology section sees the whole summary
+REPORT_SECTIONS = {
+    "Clustering & Address Profiling": (
+        "Describe transaction behavior patterns, such as frequent transactors, large-value movers, and inactive "
+        "accounts. Specify the clustering algorithm used and provide insights into its outcomes."
+    ),
+    "Anomaly Detection": (
+        "Identify outliers, including abnormally high-value transfers and sudden spikes in activity. Detail the "
+        "methods used, such as Isolation Forest, Local Outlier Factor and statistical methods."
+    ),
+    "Network Analysis": (
+        "Analyze the transaction graph by discussing network properties like centrality and connected components. "
+        "Identify potential hubs or influential addresses."
+    ),
+    "Methodology, Findings & Assumptions": (
+        "Explain the overall methodology, summarize the key findings across clustering, anomaly detection and "
+        "network analysis, and list the assumptions made during the analysis."
+    ),
+}
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
 class AIAgent:
-    def __init__(self, api_key=None):
-        self.api_key = api_key or Config.OPENAI_API_KEY
-        if not self.api_key:
-            raise ValueError("OpenAI API key not provided")
-        self.client = OpenAI(api_key=self.api_key)
-
-    def generate_insight_report(self, summary: str) -> str:
-        """Generate a detailed insight report using OpenAI's API."""
-        prompt = (
-            f"Based on the blockchain analysis results provided below, generate a comprehensive report that includes the following sections:\n\n"
-            f"1. Clustering & Address Profiling:\n"
-            f"   - Describe transaction behavior patterns, such as frequent transactors, large-value movers, and inactive accounts.\n"
-            f"   - Specify the clustering algorithms used (e.g., HDBSCAN or KMeans) and provide insights into their outcomes.\n\n"
-            f"2. Anomaly Detection:\n"
-            f"   - Identify outliers, including abnormally high-value transfers and sudden spikes in activity.\n"
-            f"   - Detail the methods used, such as machine learning models (Isolation Forest, Local Outlier Factor) and statistical methods.\n\n"
-            f"3. Network Analysis:\n"
-            f"   - Analyze the constructed transaction graph by discussing network properties like centrality and connected components.\n"
-            f"   - Identify potential hubs or influential addresses.\n\n"
-            f"Additionally, please include sections that explain the methodology, the findings, and any assumptions made during the analysis.\n\n"
-            f"Results Summary:\n{summary}\n"
-        )
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert in blockchain analysis."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.0
-            )
-            report = response.choices[0].message.content.strip()
-            return report
-        except Exception as e:
-            return f"Error generating report: {e}"
\ No newline at end of file
+    """Generates the insight report with the OpenAI chat API.
+
+    Each report section is requested concurrently with its part of the
+    results summary, compacted to token_budget tokens. Completions are
+    cached on disk under cache_dir, keyed by a hash of the model and
+    messages, so identical reruns cost nothing; transient API errors are
+    retried with exponential backoff. Pass `client` (anything exposing an
+    async chat.completions.create, like openai.AsyncOpenAI) to use a local
+    stub instead of the live API.
+    """
+
+    def __init__(self, api_key=None, client=None, model="gpt-4o-mini", cache_dir="data/cache/ai",
+                 token_budget=3000, max_concurrency=4, max_retries=4, backoff=1.0):
+        if client is None:
+            api_key = api_key or Config.OPENAI_API_KEY
+            if not api_key:
+                raise ValueError("OpenAI API key not provided; please set your OPENAI_API_KEY in the .env file.")
+            # openai is only needed for reports, so it is imported when an agent is created
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=api_key)
+        self.api_key = api_key
+        self.client = client
+        self.model = model
+        self.cache_dir = cache_dir
+        self.token_budget = token_budget
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stats = {"requests": 0, "cache_hits": 0, "retries": 0, "prompt_tokens": 0}
+
+    def generate_insight_report(self, summary) -> str:
+        """Generate the report from a summary: a dict of section -> items, or a plain string."""
+        return asyncio.run(self.generate_report(summary))
+
+    async def generate_report(self, summary) -> str:
+        """Request all report sections concurrently and join them in order.
+
+        A dict summary maps section titles to lists of items (strings or
+        DataFrames, most important first); each section prompt carries its
+        own items, compacted to the token budget. A string summary is
+        compacted and sent with every section.
+        """
+        if isinstance(summary, str):
+            summary = {title: [summary] for title in REPORT_SECTIONS}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def section(title, instructions):
+            if title in summary:
+                items = {title: summary[title]}
+            else:
+                items = {name: section_items for name, section_items in summary.items() if name in REPORT_SECTIONS}
+            context = compact_summary(items, self.token_budget)
+            prompt = (f"Based on the blockchain analysis results below, write the '{title}' section of an insight "
+                      f"report. {instructions}\n\nResults Summary:\n{context}\n")
+            async with semaphore:
+                return await self.complete(prompt)
+
+        texts = await asyncio.gather(*(section(title, instructions) for title, instructions in REPORT_SECTIONS.items()))
+        return "\n\n".join(f"{i}. {title}:\n{text}" for i, (title, text) in enumerate(zip(REPORT_SECTIONS, texts), 1))
+
+    async def complete(self, prompt: str) -> str:
+        """One cached, retried chat completion; failures are returned as an error message, not raised."""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        key = cache_key(self.model, messages)
+        cached = self._cache_get(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+        self.stats["prompt_tokens"] += count_tokens(prompt, self.model)
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.stats["requests"] += 1
+                response = await self.client.chat.completions.create(model=self.model, messages=messages,
+                                                                     temperature=0.0)
+                text = response.choices[0].message.content.strip()
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    return f"Error generating report: {e}"
+                self.stats["retries"] += 1
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+        self._cache_put(key, text)
+        return text
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+
+    def _cache_get(self, key):
+        path = self._cache_path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["content"]
+
+    def _cache_put(self, key, text):
+        path = self._cache_path(key)
+        if path is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model, "content": text}, f)
+        os.replace(tmp_path, path)
+
+def cache_key(model: str, messages: list) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "temperature": 0.0}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def is_transient(error: Exception) -> bool:
+    """Connection problems, timeouts, rate limits and 5xx responses are worth retrying."""
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    try:
+        import openai
+    except ImportError:
+        openai = None
+    if openai is not None and isinstance(error, (openai.APIConnectionError, openai.RateLimitError,
+                                                 openai.InternalServerError)):
+        return True
+    return getattr(error, "status_code", None) in TRANSIENT_STATUS
+
+def _encoding(model: str):
+    """The model's tiktoken encoding, or None when tiktoken is not installed."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Token count with tiktoken when it is installed, otherwise about four characters per token."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text))
+
+def truncate_tokens(text: str, token_budget: int, model: str = "gpt-4o-mini") -> str:
+    """The first token_budget tokens of text, by the same measure as count_tokens."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return text[:token_budget * 4]
+    return encoding.decode(encoding.encode(text)[:token_budget])
+
+def render_summary(sections: dict, max_rows=None) -> str:
+    """Render section items as text; DataFrames become CSV (first max_rows[i] rows) with 4 significant digits."""
+    lines = []
+    position = 0
+    for title, items in sections.items():
+        lines.append(f"{title}:")
+        for item in items:
+            if isinstance(item, pd.DataFrame):
+                rows = len(item) if max_rows is None else max_rows[position]
+                position += 1
+                table = item.head(rows).to_csv(index=False, float_format="%.4g").strip()
+                omitted = f" (top {rows} of {len(item)} rows)" if rows < len(item) else ""
+                lines.append(f"  table{omitted}:\n{table}")
+            else:
+                lines.append(f"  - {item}")
+    return "\n".join(lines)
+
+def compact_summary(sections: dict, token_budget: int, model: str = "gpt-4o-mini") -> str:
+    """Render the summary, halving the longest table until it fits token_budget.
+
+    Tables are expected in priority order (most important rows first), so
+    compaction keeps their heads. If text items alone exceed the budget the
+    rendering is truncated at the budget.
+    """
+    tables = [item for items in sections.values() for item in items if isinstance(item, pd.DataFrame)]
+    max_rows = [len(table) for table in tables]
+    text = render_summary(sections, max_rows)
+    while count_tokens(text, model) > token_budget and any(rows > 1 for rows in max_rows):
+        longest = max(range(len(max_rows)), key=max_rows.__getitem__)
+        max_rows[longest] = max(1, max_rows[longest] // 2)
+        text = render_summary(sections, max_rows)
+    if count_tokens(text, model) > token_budget:
+        marker = "\n  [summary truncated]"
+        text = truncate_tokens(text, max(token_budget - count_tokens(marker, model), 0), model) + marker
+    return text
@@ -1,18 +1,96 @@
 import argparse
 import os
+import numpy as np
 import pandas as pd
 from src.data_loader import DataLoader
-from src.clustering import ClusteringAnalyzer
-from src.anomaly_detection import AnomalyDetector
-from src.network_analysis import NetworkAnalyzer
-from src.ai_agent import AIAgent
-from fpdf import FPDF
-from src.utils import plot_clusters, plot_network, plot_amount_anomalies, plot_activity_anomalies
+from src.cache import TransactionCache
+from src.address_index import AddressIndex
+from src.export import EXPORT_FORMATS, write_table
+from src.pipeline import Pipeline, Stage
+from src.profiling import Profiler, profile_step, profiled
+
+# Stage modules (sklearn, hdbscan, networkx, matplotlib, openai, fpdf) are imported inside the
+# methods that use them, so startup and runs of a subset of stages only pay for what they use.
+
+# The analysis stages only read the loaded transactions, so they can run concurrently
+ANALYSIS_STAGES = (
+    Stage("clustering", "run_clustering", ("transactions", "address_index"),
+          ("raw_clustering_results", "clustering_results", "clustering_timings")),
+    Stage("anomaly_detection", "run_anomaly_detection", ("transactions", "address_index"),
+          ("raw_anomaly_results", "anomaly_results")),
+    Stage("network_analysis", "run_network_analysis", ("transactions", "address_index"),
+          ("raw_network_results", "network_results")),
+    # Traces funds from flagged addresses, so it starts once anomalies and the graph are ready
+    Stage("fund_flows", "run_fund_flows", ("address_index", "raw_anomaly_results", "raw_network_results"),
+          ("fund_flows",)),
+)
+# Rows per update when sketching an already loaded (cached) table
+SKETCH_SLICE_ROWS = 1_000_000
+# Stages whose results the AI report summarizes
+REPORT_STAGES = ("clustering", "anomaly_detection", "network_analysis")
+# --stages choices: the analysis stages plus figure generation and the AI report
+STAGE_NAMES = tuple(stage.name for stage in ANALYSIS_STAGES) + ("plots", "report")
 
 class BlockchainAnalyzer:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, workers: int = 1, use_cache: bool = True,
+                 rebuild_cache: bool = False, cache_dir: str = "data/cache", graph_backend: str = "networkx",
+                 betweenness_epsilon: float = None, betweenness_time_budget: float = None,
+                 clustering_method: str = "hdbscan", clustering_sample_size: int = None, clustering_jobs: int = 4,
+                 models_path: str = "data/models/anomaly_models.pkl", stage_workers: int = 1,
+                 report_token_budget: int = 3000, spike_window: int = 100, spike_method: str = "ewma",
+                 cycle_max_length: int = 4, cycle_tolerance: float = 0.1, cycle_max_span: int = 100,
+                 taint_seeds: str = "anomalies", taint_hops: int = 3, taint_threshold: float = 1e-4,
+                 taint_top_n: int = 10, memory_budget: int = None, spill_dir: str = None,
+                 summary_source: str = "exact"):
         self.file_path = file_path
+        # Worker processes used by parallel stages (parsing, betweenness, cycles, partition aggregation)
+        self.workers = workers
+        # Processes running the clustering, anomaly and network stages side by side
+        self.stage_workers = stage_workers
+        self.pipeline_report = None
+        self.graph_backend = graph_backend
+        # Adaptive betweenness: stop once the top ranking moves less than epsilon, or after the budget (s)
+        self.betweenness_epsilon = betweenness_epsilon
+        self.betweenness_time_budget = betweenness_time_budget
+        # HDBSCAN fits on a stratified sample of this many addresses when set
+        self.clustering_method = clustering_method
+        self.clustering_sample_size = clustering_sample_size
+        # HDBSCAN core-distance jobs, kept apart from workers so its own default of 4 still applies
+        self.clustering_jobs = clustering_jobs
+        self.clustering_timings = None
+        # Fitted anomaly models are persisted here for AnomalyDetector.load_models(...).score()
+        self.models_path = models_path
+        # Activity spikes are scored per address over windows of spike_window blocks
+        self.spike_window = spike_window
+        self.spike_method = spike_method
+        # Cycles of up to cycle_max_length transfers (0 disables), amounts within cycle_tolerance of the first,
+        # completed within cycle_max_span blocks
+        self.cycle_max_length = cycle_max_length
+        self.cycle_tolerance = cycle_tolerance
+        self.cycle_max_span = cycle_max_span
+        # Fund flows are traced from flagged addresses ('anomalies') or hubs ('hubs') for taint_hops hops,
+        # dropping fractions below taint_threshold and keeping the taint_top_n exposed addresses per seed
+        self.taint_seeds = taint_seeds
+        self.taint_hops = taint_hops
+        self.taint_threshold = taint_threshold
+        self.taint_top_n = taint_top_n
+        self.fund_flows = None
+        # With a memory budget (bytes), edges and address features are aggregated out of core at load time
+        # (spilling hash partitions under spill_dir) instead of loading the transactions
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.aggregates = None
+        # 'sketch' builds fixed-memory traffic sketches while loading and takes the report's traffic summary
+        # (top senders, recipients and value movers, distinct recipients) from them instead of exact passes
+        self.summary_source = summary_source
+        self.sketches = None
+        # Parsed transactions are cached under cache_dir, keyed by the input fingerprint
+        self.use_cache = use_cache
+        self.rebuild_cache = rebuild_cache
+        self.cache_dir = cache_dir
         self.transactions = None
+        # Shared sender/recipient -> int id dictionary, built once at load time
+        self.address_index = None
         # Raw results (not aggregated)
         self.raw_clustering_results = None
         self.raw_anomaly_results = None
@@ -21,17 +99,73 @@ class BlockchainAnalyzer:
         self.clustering_results = None
         self.anomaly_results = None
         self.network_results = None
+        # Tokens of results summary sent with each AI report section
+        self.report_token_budget = report_token_budget
+        self.report_stats = None
 
     def load_data(self):
-        loader = DataLoader(self.file_path)
-        self.transactions = loader.load_data()
+        with profile_step("load") as record:
+            if self.memory_budget:
+                record["rows"] = self._aggregate_partitioned()
+            else:
+                self._load_data()
+                record["rows"] = len(self.transactions)
+
+    def _aggregate_partitioned(self):
+        from src.partitioned import PartitionedAggregator
+        aggregator = PartitionedAggregator(self.file_path, memory_budget=self.memory_budget, spill_dir=self.spill_dir,
+                                           workers=self.workers)
+        self.address_index, edges, features = aggregator.run()
+        self.aggregates = {"edges": edges, "address_features": features}
+        print(f"Aggregated {aggregator.stats['rows']} transactions out of core in {aggregator.stats['partitions']} "
+              f"partitions ({aggregator.stats['spill_bytes'] / 2 ** 20:.1f} MB spilled)")
+        return aggregator.stats["rows"]
+
+    def _load_data(self):
+        if self.summary_source == "sketch":
+            from src.sketches import TransferSketches
+            self.sketches = TransferSketches()
+        cache = TransactionCache(self.cache_dir) if self.use_cache else None
+        # Keyed before parsing, so a file changed mid-parse is cached under a key later runs miss
+        entry = cache.entry_path(self.file_path) if cache is not None else None
+        if cache is not None and not self.rebuild_cache:
+            self.transactions = cache.load(entry)
+            if self.transactions is not None:
+                print(f"Loaded cached transactions from {entry}")
+                self.address_index = AddressIndex.from_transactions(self.transactions)
+                if self.sketches is not None:
+                    # No parsing pass to share: stream the cached table through the sketches in slices
+                    for start in range(0, len(self.transactions), SKETCH_SLICE_ROWS):
+                        self.sketches.update(self.transactions.iloc[start:start + SKETCH_SLICE_ROWS])
+                return
+        loader = DataLoader(self.file_path, workers=self.workers)
+        self.transactions = loader.load_data(on_chunk=self.sketches.update if self.sketches is not None else None)
+        self.address_index = AddressIndex.from_transactions(self.transactions)
+        if cache is not None and cache.save(entry, self.transactions):
+            print(f"Cached parsed transactions to {entry}")
+
+    def run_analysis(self, stages=ANALYSIS_STAGES):
+        """Run the analysis stages, concurrently when stage_workers > 1, and return the timing report."""
+        self.pipeline_report = Pipeline(stages, workers=self.stage_workers).run(self)
+        return self.pipeline_report
 
     def run_clustering(self):
-        clustering = ClusteringAnalyzer(self.transactions)
-        clustering.compute_address_features()
+        from src.clustering import ClusteringAnalyzer
+        clustering = ClusteringAnalyzer(self.transactions, self.address_index)
+        if self.aggregates is not None:
+            # Features were aggregated out of core at load time
+            clustering.address_features = self.aggregates["address_features"]
+        else:
+            with profile_step("clustering.features", len(self.transactions)):
+                clustering.compute_address_features()
         # Save raw clustering output (unaggregated)
-        raw_results = clustering.cluster_addresses(method="hdbscan", min_cluster_size=5)
-        self.raw_clustering_results = raw_results.copy()
+        if self.clustering_method == "hdbscan":
+            raw_results = clustering.cluster_addresses(method="hdbscan", sample_size=self.clustering_sample_size,
+                                                       n_jobs=self.clustering_jobs, min_cluster_size=5)
+        else:
+            raw_results = clustering.cluster_addresses(method=self.clustering_method, n_clusters=5)
+        self.clustering_timings = clustering.timings
+        self.raw_clustering_results = raw_results
         
         # Aggregate cluster statistics for AI insights
         aggregated_clustering = raw_results.groupby("cluster").agg(
@@ -47,14 +181,28 @@ class BlockchainAnalyzer:
         return self.clustering_results
 
     def run_anomaly_detection(self):
-        detector = AnomalyDetector(self.transactions)
+        from src.anomaly_detection import AnomalyDetector
+        detector = AnomalyDetector(self.transactions, self.address_index)
         # Save raw anomaly detection results
-        raw_amount_anomalies = detector.detect_amount_anomalies(contamination=0.01)
-        raw_activity_anomalies = detector.detect_activity_anomalies(contamination=0.01)
+        with profile_step("anomaly.isolation_forest", len(self.transactions)):
+            raw_amount_anomalies = detector.detect_amount_anomalies(contamination=0.01)
+        with profile_step("anomaly.local_outlier_factor", len(self.transactions)):
+            raw_activity_anomalies = detector.detect_activity_anomalies(contamination=0.01)
+        raw_spikes = None
+        if "height" in self.transactions.columns:
+            with profile_step("anomaly.activity_spikes", len(self.transactions)):
+                raw_spikes = detector.detect_activity_spikes(window=self.spike_window, method=self.spike_method)
+        if self.models_path:
+            with profile_step("anomaly.save_models"):
+                detector.save_models(self.models_path)
+        # Stages share self.transactions read-only: results are row selections, not copies of the table
         self.raw_anomaly_results = {
-            "amount_anomalies": raw_amount_anomalies.copy(),
-            "activity_anomalies": raw_activity_anomalies.copy()
+            "amount_anomalies": raw_amount_anomalies,
+            "activity_anomalies": raw_activity_anomalies,
+            "activity": detector.activity
         }
+        if raw_spikes is not None:
+            self.raw_anomaly_results["activity_spikes"] = raw_spikes
 
         # Aggregated (or selected) anomalies for AI insights (e.g. top n)
         aggregated_amount_anomalies = raw_amount_anomalies.sort_values(by="amount", ascending=False).head(5)
@@ -63,50 +211,73 @@ class BlockchainAnalyzer:
             "amount_anomalies": aggregated_amount_anomalies,
             "activity_anomalies": aggregated_activity_anomalies
         }
+        if raw_spikes is not None:
+            self.anomaly_results["activity_spikes"] = raw_spikes.head(5)
         return self.anomaly_results
 
     def run_network_analysis(self):
-        network_analyzer = NetworkAnalyzer(self.transactions)
-        graph = network_analyzer.build_graph()
-        centrality = network_analyzer.analyze_centrality()
-        hubs = network_analyzer.get_hubs(threshold=0.05)
+        from src.network_analysis import NetworkAnalyzer, top_n_indices
+        network_analyzer = NetworkAnalyzer(self.transactions, self.address_index, backend=self.graph_backend)
+        if self.aggregates is not None:
+            with profile_step("network.build_graph", len(self.aggregates["edges"])):
+                graph = network_analyzer.build_graph(edges=self.aggregates["edges"])
+        else:
+            with profile_step("network.build_graph", len(self.transactions)):
+                graph = network_analyzer.build_graph()
+        # One columnar pass: node, degree, betweenness and hub flag for every node
+        with profile_step("network.centrality", len(network_analyzer.edges)):
+            nodes = network_analyzer.centrality_table(
+                hub_threshold=0.05, epsilon=self.betweenness_epsilon, time_budget=self.betweenness_time_budget,
+                workers=self.workers
+            )
+        edges = network_analyzer.edges
+        cycles = None
+        if self.transactions is not None and "height" in self.transactions.columns and self.cycle_max_length >= 2:
+            with profile_step("network.cycles", len(self.transactions)):
+                cycles = network_analyzer.find_cycles(max_length=self.cycle_max_length,
+                                                      tolerance=self.cycle_tolerance,
+                                                      max_span=self.cycle_max_span, workers=self.workers)
 
-        # Save raw network results without aggregation
+        # Save raw network results without aggregation (node ids; decoded on export)
         self.raw_network_results = {
             "graph": graph,
-            "centrality": centrality.copy(),
-            "hubs": hubs.copy()
+            "edges": edges,
+            "nodes": nodes
         }
+        if cycles is not None:
+            self.raw_network_results["cycles"] = cycles
         
         # Prepare aggregated network data for AI insights
-        # Aggregated centrality: convert to DataFrame and select top n nodes
-        degree_dict = centrality.get("degree", {})
-        betweenness_dict = centrality.get("betweenness", {})
-        nodes = set(degree_dict.keys()).union(betweenness_dict.keys())
-        data = []
-        for node in nodes:
-            data.append({
-                "node": node,
-                "degree": degree_dict.get(node, 0),
-                "betweenness": betweenness_dict.get(node, 0)
-            })
-        df_centrality = pd.DataFrame(data)
-        df_centrality = df_centrality.sort_values(by=["betweenness", "degree"], ascending=False).head(5)
-        aggregated_centrality = df_centrality.to_dict(orient="records")
+        # Aggregated centrality: top n nodes by betweenness, then degree
+        degree = nodes["degree"].to_numpy()
+        top = top_n_indices(nodes["betweenness"].to_numpy(), 5, tiebreak=degree)
+        aggregated_centrality = pd.DataFrame({
+            "node": self.address_index.decode(nodes["node"].to_numpy()[top]),
+            "degree": degree[top],
+            "betweenness": nodes["betweenness"].to_numpy()[top]
+        }).to_dict(orient="records")
         
         # Aggregated hubs: top n by hub value
-        aggregated_hubs = dict(sorted(hubs.items(), key=lambda x: x[1], reverse=True)[:5])
+        hubs = nodes[nodes["hub"]]
+        top_hubs = top_n_indices(hubs["degree"].to_numpy(), 5)
+        aggregated_hubs = dict(zip(self.address_index.decode(hubs["node"].to_numpy()[top_hubs]),
+                                   hubs["degree"].to_numpy()[top_hubs].tolist()))
         
-        # New Aggregated network edges: group by source and count number of unique target nodes (direct_connection)
-        edges = []
-        for u, v, data in graph.edges(data=True):
-            edges.append({"source": u, "target": v})
-        if edges:
-            df_edges = pd.DataFrame(edges)
-            df_direct_connection = df_edges.groupby("source").agg(direct_connection=("target", "nunique")).reset_index()
-            aggregated_edges = df_direct_connection.to_dict(orient="records")
+        if self.sketches is not None:
+            # Approximate unique targets of the busiest sources, from the sketches built while loading
+            top = self.sketches.top_senders(1000)
+            aggregated_edges = pd.DataFrame({
+                "source": top["address"].to_numpy(),
+                "direct_connection": top["distinct_recipients"].to_numpy()
+            }).to_dict(orient="records")
         else:
-            aggregated_edges = []
+            # Aggregated network edges: number of unique targets per source (edge rows are unique pairs)
+            direct = np.bincount(edges["sender"].to_numpy(), minlength=len(self.address_index))
+            sources = np.flatnonzero(direct)
+            aggregated_edges = pd.DataFrame({
+                "source": self.address_index.decode(sources),
+                "direct_connection": direct[sources]
+            }).to_dict(orient="records")
 
         # Include aggregated network edges in the results
         self.network_results = {
@@ -117,87 +288,236 @@ class BlockchainAnalyzer:
         }
         return self.network_results
 
-    def save_results_to_filesystem(self, directory="data/final"):
+    def run_fund_flows(self):
+        from src.network_analysis import NetworkAnalyzer
+        if self.taint_seeds == "hubs":
+            nodes = self.raw_network_results["nodes"]
+            seeds = nodes["node"].to_numpy()[nodes["hub"].to_numpy()]
+        else:
+            seeds = self.anomalous_address_ids()
+        network_analyzer = NetworkAnalyzer(self.transactions, self.address_index, backend=self.graph_backend)
+        # Reuse the aggregated graph from the network stage
+        network_analyzer.graph = self.raw_network_results["graph"]
+        network_analyzer.edges = self.raw_network_results["edges"]
+        with profile_step("network.fund_flows", len(seeds)):
+            self.fund_flows = network_analyzer.trace_funds(seeds, hops=self.taint_hops, threshold=self.taint_threshold,
+                                                           top_n=self.taint_top_n)
+        return self.fund_flows
+
+    def anomalous_address_ids(self) -> np.ndarray:
+        """Address ids flagged by any anomaly detector (senders and recipients of amount anomalies)."""
+        if self.raw_anomaly_results is None:
+            return np.zeros(0, dtype=np.int32)
+        amount = self.raw_anomaly_results["amount_anomalies"]
+        addresses = np.concatenate([
+            np.asarray(self.raw_anomaly_results["activity_anomalies"]["sender"], dtype=object),
+            np.asarray(amount["sender"], dtype=object),
+            np.asarray(amount["recipient"], dtype=object),
+            np.asarray(self.raw_anomaly_results.get("activity_spikes", {"address": []})["address"], dtype=object)
+        ])
+        ids = self.address_index.encode(addresses)
+        return np.unique(ids[ids >= 0])
+
+    @profiled("export")
+    def save_results_to_filesystem(self, directory="data/final", export_format="csv"):
+        """Write raw results as CSV, or as compressed Parquet/Feather (requires pyarrow)."""
         os.makedirs(directory, exist_ok=True)
+
+        def export(df, name, description):
+            path = write_table(df, os.path.join(directory, name), export_format)
+            print(f"Raw {description} saved to {path}")
         
         # Save raw clustering results (without aggregation)
         if self.raw_clustering_results is not None:
-            clustering_csv_path = os.path.join(directory, "clustering_results.csv")
-            self.raw_clustering_results.to_csv(clustering_csv_path, index=False)
-            print(f"Raw clustering results saved to {clustering_csv_path}")
+            export(self.raw_clustering_results, "clustering_results", "clustering results")
         
         # Save raw anomaly detection results
         if self.raw_anomaly_results is not None:
             if "amount_anomalies" in self.raw_anomaly_results:
-                amount_csv_path = os.path.join(directory, "amount_anomalies.csv")
-                self.raw_anomaly_results["amount_anomalies"].to_csv(amount_csv_path, index=False)
-                print(f"Raw amount anomalies saved to {amount_csv_path}")
+                export(self.raw_anomaly_results["amount_anomalies"], "amount_anomalies", "amount anomalies")
             if "activity_anomalies" in self.raw_anomaly_results:
-                activity_csv_path = os.path.join(directory, "activity_anomalies.csv")
-                self.raw_anomaly_results["activity_anomalies"].to_csv(activity_csv_path, index=False)
-                print(f"Raw activity anomalies saved to {activity_csv_path}")
+                export(self.raw_anomaly_results["activity_anomalies"], "activity_anomalies", "activity anomalies")
+            if "activity_spikes" in self.raw_anomaly_results:
+                export(self.raw_anomaly_results["activity_spikes"], "activity_spikes", "activity spikes")
         
-        # Save raw network analysis results
+        # Save raw network analysis results; ids become categorical addresses without copying strings
         if self.raw_network_results is not None:
-            graph = self.raw_network_results.get("graph")
-            if graph is not None:
-                edges = []
-                for u, v, data in graph.edges(data=True):
-                    edge_data = {"source": u, "target": v}
-                    if "weight" in data:
-                        edge_data["weight"] = data["weight"]
-                    edges.append(edge_data)
-                if edges:
-                    df_edges = pd.DataFrame(edges)
-                    edges_csv_path = os.path.join(directory, "network_edges.csv")
-                    df_edges.to_csv(edges_csv_path, index=False)
-                    print(f"Raw network edges saved to {edges_csv_path}")
-            
-            # Save raw centrality (convert full dict to DataFrame)
-            centrality = self.raw_network_results.get("centrality")
-            if centrality is not None:
-                degree_dict = centrality.get("degree", {})
-                betweenness_dict = centrality.get("betweenness", {})
-                nodes = set(degree_dict.keys()).union(betweenness_dict.keys())
-                data = []
-                for node in nodes:
-                    data.append({
-                        "node": node,
-                        "degree": degree_dict.get(node, 0),
-                        "betweenness": betweenness_dict.get(node, 0)
-                    })
-                df_centrality = pd.DataFrame(data)
-                centrality_csv_path = os.path.join(directory, "network_centrality.csv")
-                df_centrality.to_csv(centrality_csv_path, index=False)
-                print(f"Raw network centrality saved to {centrality_csv_path}")
+            edges = self.raw_network_results.get("edges")
+            if edges is not None:
+                export(pd.DataFrame({
+                    "source": self.address_index.as_categorical(edges["sender"].to_numpy()),
+                    "target": self.address_index.as_categorical(edges["recipient"].to_numpy()),
+                    "amount": edges["amount"].to_numpy(),
+                    "tx_count": edges["tx_count"].to_numpy()
+                }), "network_edges", "network edges")
             
-            # Save raw hubs
-            hubs = self.raw_network_results.get("hubs")
-            if hubs is not None:
-                df_hubs = pd.DataFrame(list(hubs.items()), columns=["node", "hub_value"])
-                hubs_csv_path = os.path.join(directory, "network_hubs.csv")
-                df_hubs.to_csv(hubs_csv_path, index=False)
-                print(f"Raw network hubs saved to {hubs_csv_path}")
+            nodes = self.raw_network_results.get("nodes")
+            if nodes is not None:
+                addresses = self.address_index.as_categorical(nodes["node"].to_numpy())
+                export(nodes.assign(node=addresses), "network_centrality", "network centrality")
+                hubs = nodes["hub"].to_numpy()
+                export(pd.DataFrame({"node": addresses[hubs], "hub_value": nodes["degree"].to_numpy()[hubs]}),
+                       "network_hubs", "network hubs")
+
+            cycles = self.raw_network_results.get("cycles")
+            if cycles is not None:
+                export(cycles.assign(source=self.address_index.as_categorical(cycles["source"].to_numpy()),
+                                     target=self.address_index.as_categorical(cycles["target"].to_numpy())),
+                       "network_cycles", "network cycles")
+
+        if self.fund_flows is not None:
+            export(self.fund_flows.assign(seed=self.address_index.as_categorical(self.fund_flows["seed"].to_numpy()),
+                                          address=self.address_index.as_categorical(self.fund_flows["address"].to_numpy())),
+                   "fund_flows", "fund flows")
+
+    @profiled("result_store")
+    def save_result_store(self, path="data/final/results.sqlite"):
+        """Write per-address results (cluster, features, anomaly flags, centrality, edges) to an indexed SQLite file.
+
+        Query it with src.result_store.ResultStore or python -m src.result_store.
+        """
+        from src.result_store import build_result_store
+        network = self.raw_network_results or {}
+        return build_result_store(path, self.address_index, clusters=self.raw_clustering_results,
+                                  anomalies=self.raw_anomaly_results, nodes=network.get("nodes"),
+                                  edges=network.get("edges"))
 
+    def report_summary(self, top_n=50) -> dict:
+        """Summary sent with the AI report: section title -> items (text lines and tables, most important first).
+
+        Tables hold the top rows only; AIAgent compacts them further to its
+        token budget.
+        """
+        from src.network_analysis import top_n_indices
+        clusters = self.raw_clustering_results["cluster"]
+        if self.clustering_method == "hdbscan":
+            algorithm = "HDBSCAN (min_cluster_size=5)"
+        else:
+            algorithm = f"{self.clustering_method} (n_clusters=5)"
+        clustering = [
+            f"Clustering algorithm used: {algorithm}.",
+            f"{len(clusters)} addresses in {clusters[clusters >= 0].nunique()} clusters, "
+            f"{int((clusters < 0).sum())} labelled as noise.",
+            self.clustering_results.sort_values("size", ascending=False),
+            *self.traffic_summary(top_n),
+        ]
+
+        amount = self.raw_anomaly_results["amount_anomalies"]
+        activity = self.raw_anomaly_results["activity_anomalies"]
+        anomalies = [
+            "Amount anomalies detected using Isolation Forest (contamination=0.01).",
+            "Activity anomalies detected using Local Outlier Factor on per-sender transaction counts (contamination=0.01).",
+            f"{len(amount)} of {len(self.transactions)} transfers flagged as amount anomalies; "
+            f"{len(activity)} of {len(self.raw_anomaly_results['activity'])} senders flagged as activity anomalies.",
+            amount.nlargest(top_n, "amount")[[c for c in ("sender", "recipient", "amount", "height") if c in amount]],
+            activity.nlargest(top_n, "tx_count")[["sender", "tx_count"]],
+        ]
+        spikes = self.raw_anomaly_results.get("activity_spikes")
+        if spikes is not None:
+            anomalies += [
+                f"Activity spikes: {len(spikes)} (address, {self.spike_window}-block window) cells whose sent/received "
+                f"counts or amounts exceed the address's {self.spike_method} baseline, across "
+                f"{spikes['address'].nunique()} addresses.",
+                spikes.head(top_n),
+            ]
+
+        nodes = self.raw_network_results["nodes"]
+        degree = nodes["degree"].to_numpy()
+        top = top_n_indices(nodes["betweenness"].to_numpy(), top_n, tiebreak=degree)
+        hubs = nodes[nodes["hub"]]
+        top_hubs = top_n_indices(hubs["degree"].to_numpy(), top_n)
+        network = [
+            f"Transaction graph with {len(nodes)} addresses and {len(self.raw_network_results['edges'])} "
+            f"directed sender-recipient edges; {len(hubs)} hubs with degree centrality >= 0.05.",
+            pd.DataFrame({
+                "address": self.address_index.decode(nodes["node"].to_numpy()[top]),
+                "degree": degree[top],
+                "betweenness": nodes["betweenness"].to_numpy()[top]
+            }),
+            pd.DataFrame({
+                "hub": self.address_index.decode(hubs["node"].to_numpy()[top_hubs]),
+                "degree": hubs["degree"].to_numpy()[top_hubs]
+            }),
+        ]
+        cycles = self.raw_network_results.get("cycles")
+        if cycles is not None:
+            first = cycles[cycles["hop"] == 0]
+            lengths = first["length"].value_counts().sort_index()
+            network.append(
+                f"Cycles returning funds to their first sender within {self.cycle_max_span} blocks, amounts within "
+                f"{self.cycle_tolerance:.0%}: {len(first)} found ("
+                + ", ".join(f"{count} of {length} transfers" for length, count in lengths.items()) + ")."
+            )
+            largest = first.nlargest(top_n, "amount")
+            network.append(pd.DataFrame({
+                "cycle": largest["cycle"].to_numpy(),
+                "length": largest["length"].to_numpy(),
+                "start": self.address_index.decode(largest["source"].to_numpy()),
+                "amount": largest["amount"].to_numpy(),
+                "height": largest["height"].to_numpy()
+            }))
+        if self.fund_flows is not None:
+            flows = self.fund_flows
+            network.append(
+                f"Fund flows traced from {flows['seed'].nunique()} {self.taint_seeds} seed addresses over "
+                f"{self.taint_hops} hops (amount-weighted); exposure is the fraction of a seed's funds received."
+            )
+            strongest = flows.nlargest(top_n, "exposure")
+            network.append(pd.DataFrame({
+                "seed": self.address_index.decode(strongest["seed"].to_numpy()),
+                "address": self.address_index.decode(strongest["address"].to_numpy()),
+                "exposure": strongest["exposure"].to_numpy(),
+                "hop": strongest["hop"].to_numpy()
+            }))
+        return {
+            "Clustering & Address Profiling": clustering,
+            "Anomaly Detection": anomalies,
+            "Network Analysis": network,
+        }
+
+    def traffic_summary(self, top_n=20) -> list:
+        """Top senders, value movers and recipients for the report, with distinct recipients per sender.
+
+        Exact counts from the loaded transactions and the edge table, or
+        streaming sketch estimates with error bounds when summary_source is 'sketch'.
+        """
+        if self.sketches is not None:
+            return self.sketches.summary(top_n)
+        if self.transactions is None:
+            return []
+        from src.network_analysis import top_n_indices
+        n = len(self.address_index)
+        sender_ids, recipient_ids = self.address_index.sender_ids, self.address_index.recipient_ids
+        sent, received = sender_ids >= 0, recipient_ids >= 0
+        amount = np.nan_to_num(self.transactions["amount"].to_numpy(dtype=np.float64))
+        distinct = np.bincount(self.raw_network_results["edges"]["sender"].to_numpy(), minlength=n)
+
+        def table(values, name, counterparties=True):
+            top = top_n_indices(values, top_n)
+            columns = {"address": self.address_index.decode(top), name: values[top]}
+            if counterparties:
+                columns["distinct_recipients"] = distinct[top]
+            return pd.DataFrame(columns)
+
+        return [
+            f"Traffic over {len(self.transactions)} transfers between {n} addresses (exact counts).",
+            table(np.bincount(sender_ids[sent], minlength=n), "transfers"),
+            table(np.bincount(sender_ids[sent], weights=amount[sent], minlength=n), "amount_sent"),
+            table(np.bincount(recipient_ids[received], minlength=n), "transfers", counterparties=False),
+        ]
+
+    @profiled("report")
     def run_ai_insights(self):
-        summary = "1. Clustering & Address Profiling:\n"
-        summary += "   - Clustering algorithm used: HDBSCAN (min_cluster_size=5).\n"
-        summary += "   - Aggregated clustering details: " + str(self.clustering_results.to_dict()) + "\n\n"
-        
-        summary += "2. Anomaly Detection:\n"
-        summary += "   - Amount anomalies detected using Isolation Forest.\n"
-        summary += "   - Activity anomalies detected using Local Outlier Factor.\n"
-        summary += "   - Aggregated anomaly detection results (row counts): " + str({k: v.shape for k, v in self.anomaly_results.items()}) + "\n\n"
-        
-        summary += "3. Network Analysis:\n"
-        summary += "   - Aggregated network hubs identified: " + str(self.network_results.get('hubs', {})) + "\n"
-        summary += "   - Aggregated centrality metrics: " + str(self.network_results.get('centrality', {})) + "\n"
-        
-        agent = AIAgent()
-        report = agent.generate_insight_report(summary)
+        from src.ai_agent import AIAgent
+        # Completions are cached next to the parsed transactions, so identical reruns are free
+        agent = AIAgent(cache_dir=os.path.join(self.cache_dir, "ai") if self.use_cache else None,
+                        token_budget=self.report_token_budget)
+        report = agent.generate_insight_report(self.report_summary())
+        self.report_stats = agent.stats
         return report
 
 def save_report_to_pdf(report: str, filename: str = "reports/report.pdf"):
+    from fpdf import FPDF
     pdf = FPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -217,19 +537,155 @@ def save_report_to_pdf(report: str, filename: str = "reports/report.pdf"):
 def main():
     parser = argparse.ArgumentParser(description="Blockchain Analyzer")
     parser.add_argument("--input", required=True, help="Path to dataset JSONL file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes for parsing, betweenness and cycle search")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the parsed-transactions cache")
+    parser.add_argument("--rebuild-cache", action="store_true", help="Re-parse the input and overwrite its cache entry")
+    parser.add_argument("--cache-dir", default="data/cache", help="Directory for the parsed-transactions cache")
+    parser.add_argument("--graph-backend", choices=["networkx", "sparse"], default="networkx",
+                        help="Graph engine for network analysis (sparse scales to very large edge counts)")
+    parser.add_argument("--clustering-method", choices=["hdbscan", "kmeans", "minibatch_kmeans"], default="hdbscan",
+                        help="Address clustering algorithm")
+    parser.add_argument("--clustering-sample-size", type=int, default=None,
+                        help="Fit HDBSCAN on a stratified sample of this many addresses and assign the rest")
+    parser.add_argument("--clustering-jobs", type=int, default=4,
+                        help="Parallel jobs for HDBSCAN core distances (hdbscan's core_dist_n_jobs)")
+    parser.add_argument("--models-path", default="data/models/anomaly_models.pkl",
+                        help="Where fitted anomaly models are saved for streaming scoring")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only process transactions above the last processed height, updating persisted state")
+    parser.add_argument("--state-dir", default="data/state", help="Directory for incremental-mode state")
+    parser.add_argument("--refit-factor", type=float, default=2.0,
+                        help="With --incremental, refit the amount model on the whole input once it has grown to "
+                             "this many times the rows the model was fitted on (0 never refits)")
+    parser.add_argument("--refit", action="store_true",
+                        help="With --incremental, refit the amount model on the whole input in this run")
+    parser.add_argument("--betweenness-epsilon", type=float, default=None,
+                        help="Keep adding betweenness pivots until top scores change by less than this")
+    parser.add_argument("--betweenness-time-budget", type=float, default=None,
+                        help="Stop adding betweenness pivots after this many seconds")
+    parser.add_argument("--export-format", choices=EXPORT_FORMATS, default="csv",
+                        help="File format for raw results (parquet and feather require pyarrow)")
+    parser.add_argument("--network-sample", choices=["degree", "pagerank", "anomalies"], default="degree",
+                        help="Nodes shown in the network view: top by degree or PageRank, or anomalies' neighbourhood")
+    parser.add_argument("--network-lod-sizes", type=int, nargs="+", default=None,
+                        help="Also write nested network views with these node counts (e.g. 200 2000 10000)")
+    parser.add_argument("--stage-workers", type=int, default=1,
+                        help="Run clustering, anomaly detection and network analysis in this many processes")
+    parser.add_argument("--stages", nargs="+", choices=STAGE_NAMES, default=list(STAGE_NAMES),
+                        help="Only run these stages (default: all)")
+    parser.add_argument("--profile-stage", action="append", default=[],
+                        help="Profile this step (e.g. clustering, network.centrality) with --profiler; repeatable")
+    parser.add_argument("--profiler", choices=["cprofile", "py-spy"], default="cprofile",
+                        help="Tool for --profile-stage: cProfile .prof files or py-spy flame graphs")
+    parser.add_argument("--spike-window", type=int, default=100,
+                        help="Block-height window (in blocks) for activity spike detection")
+    parser.add_argument("--spike-method", choices=["ewma", "mad"], default="ewma",
+                        help="Spike baseline: causal EWMA of earlier windows, or median/MAD of the address's active windows")
+    parser.add_argument("--cycle-max-length", type=int, default=4,
+                        help="Longest cycle (in transfers) to detect; 2 finds round trips only, 0 disables")
+    parser.add_argument("--cycle-tolerance", type=float, default=0.1,
+                        help="Allowed relative difference between each cycle transfer and the first amount")
+    parser.add_argument("--cycle-max-span", type=int, default=100,
+                        help="Blocks within which a cycle must complete")
+    parser.add_argument("--taint-seeds", choices=["anomalies", "hubs"], default="anomalies",
+                        help="Addresses whose funds the fund_flows stage traces")
+    parser.add_argument("--taint-hops", type=int, default=3, help="Hops to follow funds from each seed")
+    parser.add_argument("--taint-threshold", type=float, default=1e-4,
+                        help="Drop fund fractions below this after each hop")
+    parser.add_argument("--taint-top-n", type=int, default=10, help="Exposed addresses kept per seed")
+    parser.add_argument("--report-token-budget", type=int, default=3000,
+                        help="Token budget of the results summary sent with each AI report section")
+    parser.add_argument("--memory-budget", type=int, default=None,
+                        help="Aggregate edges and address features out of core within about this many MB")
+    parser.add_argument("--spill-dir", default=None, help="Directory for --memory-budget spill files (default: temp dir)")
+    parser.add_argument("--summary-source", choices=["exact", "sketch"], default="exact",
+                        help="Take the report's traffic summary from exact passes or from fixed-memory streaming sketches")
+    parser.add_argument("--result-store", action="store_true",
+                        help="Also write per-address results to <output-dir>/results.sqlite for fast lookups")
+    parser.add_argument("--output-dir", default="data/final", help="Directory for results and the run profile")
     args = parser.parse_args()
+    stages = set(args.stages)
+    if "report" in stages and not set(REPORT_STAGES) <= stages:
+        parser.error("the report stage needs clustering, anomaly_detection and network_analysis")
+    if "fund_flows" in stages and not {"anomaly_detection", "network_analysis"} <= stages:
+        parser.error("the fund_flows stage needs anomaly_detection and network_analysis")
+    if args.network_sample == "anomalies" and "anomaly_detection" not in stages:
+        parser.error("--network-sample anomalies needs the anomaly_detection stage")
+    if args.memory_budget and not stages <= {"clustering", "network_analysis", "plots"}:
+        parser.error("--memory-budget keeps no transaction table, so it only supports the clustering, "
+                     "network_analysis and plots stages")
+    if args.memory_budget and args.stage_workers > 1:
+        parser.error("--memory-budget runs the stages in one process; use --workers to aggregate partitions in parallel")
 
-    analyzer = BlockchainAnalyzer(args.input)
+    if args.incremental:
+        from src.incremental import IncrementalAnalyzer
+        incremental = IncrementalAnalyzer(args.input, state_dir=args.state_dir, workers=args.workers,
+                                          refit_factor=args.refit_factor, refit=args.refit)
+        results = incremental.run()
+        print(f"Incremental update completed up to height {results['last_height']}.")
+        incremental.save_results(results, export_format=args.export_format)
+        return
+
+    analyzer = BlockchainAnalyzer(args.input, workers=args.workers, use_cache=not args.no_cache,
+                                  rebuild_cache=args.rebuild_cache, cache_dir=args.cache_dir,
+                                  graph_backend=args.graph_backend, betweenness_epsilon=args.betweenness_epsilon,
+                                  betweenness_time_budget=args.betweenness_time_budget,
+                                  clustering_method=args.clustering_method,
+                                  clustering_sample_size=args.clustering_sample_size,
+                                  clustering_jobs=args.clustering_jobs,
+                                  models_path=args.models_path, stage_workers=args.stage_workers,
+                                  report_token_budget=args.report_token_budget, spike_window=args.spike_window,
+                                  spike_method=args.spike_method, cycle_max_length=args.cycle_max_length,
+                                  cycle_tolerance=args.cycle_tolerance, cycle_max_span=args.cycle_max_span,
+                                  taint_seeds=args.taint_seeds, taint_hops=args.taint_hops,
+                                  taint_threshold=args.taint_threshold, taint_top_n=args.taint_top_n,
+                                  memory_budget=args.memory_budget * 2 ** 20 if args.memory_budget else None,
+                                  spill_dir=args.spill_dir, summary_source=args.summary_source)
+    # Wall/CPU time, peak RSS and rows per step end up in <output-dir>/run_profile.json
+    profiler = Profiler(capture=args.profile_stage, tool=args.profiler,
+                        output_dir=os.path.join(args.output_dir, "profiles"))
+    try:
+        with profiler.activate():
+            run_stages(analyzer, args, stages)
+    finally:
+        path = profiler.write_json(os.path.join(args.output_dir, "run_profile.json"), stages=sorted(stages),
+                                   pipeline=analyzer.pipeline_report)
+        print(f"Run profile saved to {path}")
+
+def run_stages(analyzer: BlockchainAnalyzer, args, stages):
     analyzer.load_data()
     print("Data Loaded.")
-    analyzer.run_clustering()
-    print("Clustering completed.")
-    analyzer.run_anomaly_detection()
-    print("Anomaly detection completed.")
-    analyzer.run_network_analysis()
-    print("Network analysis completed.")
-    analyzer.save_results_to_filesystem()
+    pipeline_report = analyzer.run_analysis([stage for stage in ANALYSIS_STAGES if stage.name in stages])
+    for stage, timing in pipeline_report["stages"].items():
+        print(f"{stage} completed in {timing['seconds']:.2f}s")
+    for step, timing in (analyzer.clustering_timings or {}).items():
+        print(f"  {step}: {timing['rows']} addresses in {timing['seconds']:.2f}s")
+    print(f"Analysis stages took {pipeline_report['wall_seconds']:.2f}s; critical path "
+          f"{' -> '.join(pipeline_report['critical_path'])} ({pipeline_report['critical_path_seconds']:.2f}s)")
+    analyzer.save_results_to_filesystem(args.output_dir, export_format=args.export_format)
+    if args.result_store:
+        path = analyzer.save_result_store(os.path.join(args.output_dir, "results.sqlite"))
+        print(f"Result store saved to {path}; query it with python -m src.result_store {path} lookup ADDRESS")
     
+    if "plots" in stages:
+        save_figures(analyzer, args)
+    if "report" in stages:
+        report = analyzer.run_ai_insights()
+        stats = analyzer.report_stats
+        print(f"AI report: {stats['requests']} API requests, {stats['cache_hits']} cached sections, "
+              f"{stats['retries']} retries")
+        print("AI Generated Report:")
+        print(report)
+        save_report_to_pdf(report)
+        print("Report saved as 'report.pdf'.")
+
+@profiled("plots")
+def save_figures(analyzer: BlockchainAnalyzer, args):
+    from src.sparse_graph import SparseGraph
+    from src.utils import (plot_clusters, plot_network, export_network_views, plot_amount_anomalies,
+                           plot_activity_anomalies)
+    os.makedirs("figures", exist_ok=True)
     # Visualization using aggregated results
     if analyzer.clustering_results is not None:
         print("Generating clustering visualization...")
@@ -237,19 +693,24 @@ def main():
     if analyzer.anomaly_results is not None and "amount_anomalies" in analyzer.anomaly_results:
         print("Generating amount anomaly visualization...")
         plot_amount_anomalies(analyzer.transactions, analyzer.raw_anomaly_results["amount_anomalies"], save_path="figures/amount_anomalies.png")
-    activity = analyzer.transactions.groupby("sender").size().reset_index(name="tx_count")
     if analyzer.anomaly_results is not None and "activity_anomalies" in analyzer.anomaly_results:
         print("Generating activity anomaly visualization...")
+        # Per-sender activity was already computed by the anomaly stage
+        activity = analyzer.raw_anomaly_results["activity"]
         plot_activity_anomalies(activity, analyzer.raw_anomaly_results["activity_anomalies"], save_path="figures/activity_anomalies.png")
     if analyzer.raw_network_results is not None and "graph" in analyzer.raw_network_results:
         print("Generating network visualization...")
-        plot_network(analyzer.raw_network_results["graph"], save_path="figures/transaction_network.html")
-
-    report = analyzer.run_ai_insights()
-    print("AI Generated Report:")
-    print(report)
-    save_report_to_pdf(report)
-    print("Report saved as 'report.pdf'.")
+        graph = analyzer.raw_network_results["graph"]
+        if not isinstance(graph, SparseGraph):
+            # Sample and lay out on CSR arrays rather than walking the networkx graph
+            graph = SparseGraph.from_edges(analyzer.raw_network_results["edges"])
+        by = "degree" if args.network_sample == "anomalies" else args.network_sample
+        anomalies = analyzer.anomalous_address_ids() if args.network_sample == "anomalies" else None
+        plot_network(graph, save_path="figures/transaction_network.html", labels=analyzer.address_index.addresses,
+                     by=by, anomalies=anomalies)
+        if args.network_lod_sizes:
+            export_network_views(graph, "figures", sizes=args.network_lod_sizes,
+                                 labels=analyzer.address_index.addresses, by=by, anomalies=anomalies)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,28 +1,332 @@
+import os
+import pickle
+import time
+from collections import deque
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.ensemble import IsolationForest
 from sklearn.neighbors import LocalOutlierFactor
+from src.address_index import AddressIndex
+
+SPIKE_METHODS = ("ewma", "mad")
+SPIKE_METRICS = ("sent_count", "received_count", "sent_amount", "received_amount")
 
 class AnomalyDetector:
-    def __init__(self, transactions: pd.DataFrame):
+    def __init__(self, transactions: pd.DataFrame = None, address_index: AddressIndex = None):
         self.transactions = transactions
+        if address_index is None and transactions is not None:
+            address_index = AddressIndex.from_transactions(transactions)
+        self.address_index = address_index
         self.anomalies = None
+        # Row mask of amount anomalies and per-sender activity (with LOF labels), kept for reuse
+        self.amount_mask = None
+        self.activity = None
+        # Per-(address, window) activity as address x window CSR matrices, and the flagged spikes
+        self.activity_windows = None
+        self.spikes = None
+        # Fitted models and per-sender counts, reused by score() and save_models()
+        self.amount_model = None
+        self.activity_model = None
+        # Running sender counts: ids from sender_index, or from _new_senders for senders first seen by
+        # score(); the counts array grows by doubling and is updated in place
+        self.sender_index = None
+        self._new_senders = {}
+        self._counts = np.zeros(0, dtype=np.int64)
+        self.scoring_stats = {"batches": 0, "rows": 0, "seconds": 0.0}
+        self._latencies = deque(maxlen=1000)
 
     def detect_amount_anomalies(self, contamination=0.01):
         """Detect anomalies in transaction amounts using Isolation Forest."""
-        X = self.transactions[['amount']].values
+        X = self.transactions['amount'].to_numpy().reshape(-1, 1)
         clf = IsolationForest(contamination=contamination, random_state=42)
         preds = clf.fit_predict(X)
-        self.transactions['anomaly_if'] = preds
-        anomalies = self.transactions[self.transactions['anomaly_if'] == -1]
+        self.amount_model = clf
+        self.amount_mask = preds == -1
+        anomalies = select_amount_anomalies(self.transactions, preds)
         self.anomalies = anomalies
         return anomalies
 
     def detect_activity_anomalies(self, contamination=0.01):
         """Detect anomalies in sender activity using Local Outlier Factor."""
-        activity = self.transactions.groupby("sender").size().reset_index(name="tx_count")
-        X = activity[['tx_count']].values
-        lof = LocalOutlierFactor(contamination=contamination)
-        preds = lof.fit_predict(X)
+        sender_ids = self.address_index.sender_ids
+        counts = np.bincount(sender_ids[sender_ids >= 0], minlength=len(self.address_index))
+        active = np.flatnonzero(counts)
+        activity = pd.DataFrame({
+            "sender": self.address_index.as_categorical(active),
+            "tx_count": counts[active]
+        })
+        self.activity_model, preds = fit_activity_model(activity, contamination)
+        self.sender_counts = pd.Series(counts, index=self.address_index.addresses)
         activity['anomaly_lof'] = preds
-        anomalies = activity[activity['anomaly_lof'] == -1]
-        return anomalies
\ No newline at end of file
+        self.activity = activity
+        anomalies = activity[preds == -1]
+        return anomalies
+
+    def detect_activity_spikes(self, window=100, method="ewma", metrics=SPIKE_METRICS, threshold=5.0,
+                               min_count=10, alpha=0.1, min_scale=1.0, warmup=5):
+        """Flag (address, block-height window) cells whose activity spikes above the address's baseline.
+
+        Sent/received counts and amounts are bucketed into windows of `window`
+        blocks (see window_activity). Amounts are scored as log1p(amount).
+        Scores are computed for every active cell of every address at once
+        (see spike_scores); a cell is a spike when its score is at least
+        `threshold` and it holds at least `min_count` transfers.
+
+        Returns one row per spike (address, window, start_height, metric,
+        value, baseline, score), highest score first.
+        """
+        if method not in SPIKE_METHODS:
+            raise ValueError(f"Unsupported spike method: {method}")
+        height = self.transactions["height"].to_numpy(dtype=np.float64)
+        matrices, first_height = window_activity(self.address_index.sender_ids, self.address_index.recipient_ids,
+                                                 self.transactions["amount"].to_numpy(dtype=np.float64), height,
+                                                 window, len(self.address_index))
+        frames = []
+        for metric in metrics:
+            matrix = matrices[metric]
+            counts = matrices[metric.replace("amount", "count")].data
+            amounts = metric.endswith("amount")
+            values = np.log1p(matrix.data) if amounts else matrix.data.astype(np.float64)
+            baseline, score = spike_scores(matrix.indptr, matrix.indices, values, method, alpha, min_scale, warmup)
+            flagged = np.flatnonzero((score >= threshold) & (counts >= min_count))
+            rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))[flagged]
+            windows = matrix.indices[flagged]
+            frames.append(pd.DataFrame({
+                "address": self.address_index.as_categorical(rows),
+                "window": windows,
+                "start_height": first_height + windows.astype(np.int64) * window,
+                "metric": metric,
+                "value": matrix.data[flagged],
+                "baseline": np.expm1(baseline[flagged]) if amounts else baseline[flagged],
+                "score": score[flagged]
+            }))
+        self.activity_windows = matrices
+        self.spikes = pd.concat(frames, ignore_index=True).sort_values("score", ascending=False, ignore_index=True)
+        return self.spikes
+
+    def score(self, transactions_chunk: pd.DataFrame) -> pd.DataFrame:
+        """Score a batch of new transactions against the fitted models.
+
+        Returns one row per transaction with the Isolation Forest amount score
+        and flag, and the sender's running transaction count with its LOF
+        score and flag (lower scores are more anomalous). Sender counts are
+        updated with the batch so consecutive batches see cumulative activity.
+        """
+        if self.amount_model is None or self.activity_model is None:
+            raise ValueError("Models are not fitted; run detection or load_models() first")
+        start = time.perf_counter()
+        amount_score = self.amount_model.decision_function(transactions_chunk[['amount']].values)
+
+        # Missing senders get code -1: no count and no activity score
+        inverse, unique_senders = pd.factorize(np.asarray(transactions_chunk["sender"], dtype=object))
+        ids = self._sender_ids(unique_senders)
+        self._counts[ids] += np.bincount(inverse[inverse >= 0], minlength=len(unique_senders))
+        sender_counts = self._counts[ids]
+        activity_score = self.activity_model.decision_function(sender_counts.reshape(-1, 1))
+
+        known = inverse >= 0
+        tx_count = np.zeros(len(inverse), dtype=np.int64)
+        tx_count[known] = sender_counts[inverse[known]]
+        row_activity = np.full(len(inverse), np.nan)
+        row_activity[known] = activity_score[inverse[known]]
+        scores = pd.DataFrame({
+            "amount_score": amount_score,
+            "amount_anomaly": amount_score < 0,
+            "sender_tx_count": tx_count,
+            "activity_score": row_activity,
+            "activity_anomaly": row_activity < 0
+        }, index=transactions_chunk.index)
+        self._record_batch(len(transactions_chunk), time.perf_counter() - start)
+        return scores
+
+    def _sender_ids(self, senders) -> np.ndarray:
+        """Ids of the batch's unique senders, assigning new ids (with zero counts) to unseen ones.
+
+        Only senders missing from sender_index are looked up one by one. They
+        are folded into the index once there are as many as it holds, so its
+        hash table is rebuilt O(log n) times overall, not once per batch.
+        """
+        ids = self.sender_index.get_indexer(senders)
+        for i in np.flatnonzero(ids < 0):
+            ids[i] = self._new_senders.setdefault(senders[i], len(self.sender_index) + len(self._new_senders))
+        n = len(self.sender_index) + len(self._new_senders)
+        if n > len(self._counts):
+            self._counts = np.concatenate([self._counts, np.zeros(max(n, 2 * len(self._counts)) - len(self._counts),
+                                                                  dtype=np.int64)])
+        if len(self._new_senders) >= max(1024, len(self.sender_index)):
+            self.sender_index = self.sender_index.append(pd.Index(list(self._new_senders), dtype=object))
+            self._new_senders = {}
+        return ids
+
+    @property
+    def sender_counts(self) -> pd.Series:
+        """Transactions seen per sender, from training and all scored batches."""
+        if self.sender_index is None:
+            return None
+        index = self.sender_index.append(pd.Index(list(self._new_senders), dtype=object))
+        return pd.Series(self._counts[:len(index)], index=index)
+
+    @sender_counts.setter
+    def sender_counts(self, counts: pd.Series):
+        self.sender_index = counts.index
+        self._new_senders = {}
+        self._counts = counts.to_numpy(dtype=np.int64).copy()
+
+    def _record_batch(self, rows, seconds):
+        stats = self.scoring_stats
+        stats["batches"] += 1
+        stats["rows"] += rows
+        stats["seconds"] += seconds
+        self._latencies.append(seconds)
+        latencies = np.fromiter(self._latencies, dtype=float)
+        stats["rows_per_sec"] = stats["rows"] / stats["seconds"] if stats["seconds"] else float("inf")
+        stats["latency_p50"] = float(np.percentile(latencies, 50))
+        stats["latency_p99"] = float(np.percentile(latencies, 99))
+        stats["latency_max"] = float(latencies.max())
+
+    def save_models(self, path: str):
+        """Persist the fitted models and sender counts for later score() calls."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            pickle.dump({
+                "amount_model": self.amount_model,
+                "activity_model": self.activity_model,
+                "sender_counts": self.sender_counts
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load_models(cls, path: str) -> "AnomalyDetector":
+        """Create a detector ready for score() from models written by save_models()."""
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        detector = cls()
+        detector.amount_model = state["amount_model"]
+        detector.activity_model = state["activity_model"]
+        detector.sender_counts = state["sender_counts"]
+        return detector
+
+def fit_activity_model(activity: pd.DataFrame, contamination=0.01):
+    """Fit a novelty-mode LOF on sender tx_count; returns (model, training labels).
+
+    Training labels are derived from negative_outlier_factor_ and offset_,
+    which is exactly what LocalOutlierFactor.fit_predict returns.
+    """
+    X = activity[['tx_count']].values
+    lof = LocalOutlierFactor(contamination=contamination, novelty=True)
+    lof.fit(X)
+    preds = np.where(lof.negative_outlier_factor_ < lof.offset_, -1, 1)
+    return lof, preds
+
+def select_amount_anomalies(transactions: pd.DataFrame, preds: np.ndarray) -> pd.DataFrame:
+    """Return the flagged rows with an anomaly_if column, leaving the shared frame untouched."""
+    return transactions[preds == -1].assign(anomaly_if=-1)
+
+def label_activity_outliers(activity: pd.DataFrame, contamination=0.01) -> pd.DataFrame:
+    """Flag senders whose tx_count is a Local Outlier Factor outlier; returns the outlier rows."""
+    _, preds = fit_activity_model(activity, contamination)
+    return activity[preds == -1].assign(anomaly_lof=-1)
+
+def window_activity(sender_ids, recipient_ids, amount, height, window, n_addresses):
+    """Bucket transfers into block-height windows per address; returns (matrices, first_height).
+
+    matrices maps sent_count, sent_amount, received_count and received_amount
+    to CSR matrices of shape (n_addresses, n_windows), window w covering
+    heights first_height + w * window onwards. Only active cells are stored,
+    and the count and amount matrices of one direction share their sparsity
+    structure. Transfers with a missing address or height are skipped.
+    """
+    known = ~np.isnan(height)
+    first_height = int(height[known].min()) if known.any() else 0
+    windows = np.zeros(len(height), dtype=np.int64)
+    windows[known] = (height[known] - first_height) // window
+    n_windows = int(windows.max()) + 1 if len(windows) else 1
+    amount = np.where(np.isnan(amount), 0.0, amount)
+    matrices = {}
+    for direction, ids in (("sent", sender_ids), ("received", recipient_ids)):
+        valid = (ids >= 0) & known
+        # Cells are unique (address, window) keys in address-major order, i.e. CSR order
+        cells, inverse = np.unique(ids[valid].astype(np.int64) * n_windows + windows[valid], return_inverse=True)
+        rows, columns = np.divmod(cells, n_windows)
+        indptr = np.zeros(n_addresses + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_addresses), out=indptr[1:])
+        columns = columns.astype(np.int32)
+        shape = (n_addresses, n_windows)
+        matrices[f"{direction}_count"] = sparse.csr_matrix(
+            (np.bincount(inverse, minlength=len(cells)), columns, indptr), shape=shape)
+        matrices[f"{direction}_amount"] = sparse.csr_matrix(
+            (np.bincount(inverse, weights=amount[valid], minlength=len(cells)), columns, indptr), shape=shape)
+    return matrices, first_height
+
+def spike_scores(indptr, indices, values, method="ewma", alpha=0.1, min_scale=1.0, warmup=5):
+    """Baseline and spike score for every stored cell of a CSR address x window matrix.
+
+    Windows without a stored cell count as zero activity.
+    'ewma' is a causal rolling baseline. Each cell is compared with the
+    exponentially weighted mean and standard deviation of the address's
+    earlier windows, decayed in closed form over idle windows. The loop runs
+    over windows (vectorized across addresses), not over addresses. Cells in
+    the first `warmup` windows only feed the baseline: addresses active since
+    the start of the data have no history to compare against.
+    'mad' is the modified z-score against the median and MAD of the address's
+    active windows, falling back to the mean absolute deviation when the MAD
+    is zero.
+    Scales below min_scale are raised to it, so tiny baselines do not turn
+    single transfers into spikes. Returns (baseline, score) aligned with values.
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    if method == "mad":
+        return _mad_scores(rows, values, len(indptr) - 1, min_scale)
+    if method != "ewma":
+        raise ValueError(f"Unsupported spike method: {method}")
+    n = len(indptr) - 1
+    mean = np.zeros(n)
+    var = np.zeros(n)
+    last = np.full(n, -1, dtype=np.int64)
+    baseline = np.zeros(len(values))
+    score = np.zeros(len(values))
+    order = np.argsort(indices, kind="stable")
+    sorted_windows = indices[order]
+    bounds = np.flatnonzero(np.diff(sorted_windows)) + 1
+    for cells in np.split(order, bounds):
+        if not len(cells):
+            continue
+        w = indices[cells[0]]
+        ids = rows[cells]
+        x = values[cells]
+        # Decay through the idle windows since the last active one:
+        # after k zeros, mean *= d and var = d * (var + mean^2 * (1 - d)) with d = (1 - alpha)^k
+        seen = last[ids] >= 0
+        d = np.where(seen, (1 - alpha) ** (w - last[ids] - 1), 1.0)
+        m = mean[ids] * d
+        v = d * (var[ids] + mean[ids] ** 2 * (1 - d))
+        baseline[cells] = m
+        if w >= warmup:
+            score[cells] = (x - m) / np.maximum(np.sqrt(v), min_scale)
+        diff = x - m
+        mean[ids] = m + alpha * diff
+        var[ids] = (1 - alpha) * (v + alpha * diff ** 2)
+        last[ids] = w
+    return baseline, score
+
+def _mad_scores(rows, values, n, min_scale):
+    nnz = np.bincount(rows, minlength=n)
+    starts = np.concatenate([[0], np.cumsum(nnz)[:-1]])
+
+    def row_median(v):
+        ordered = v[np.lexsort((v, rows))]
+        active = nnz > 0
+        median = np.zeros(n)
+        lo = starts[active] + (nnz[active] - 1) // 2
+        hi = starts[active] + nnz[active] // 2
+        median[active] = (ordered[lo] + ordered[hi]) / 2
+        return median
+
+    median = row_median(values)
+    deviation = np.abs(values - median[rows])
+    mad = row_median(deviation)
+    mean_ad = np.bincount(rows, weights=deviation, minlength=n) / np.maximum(nnz, 1)
+    # Modified z-score (Iglewicz & Hoaglin): 0.6745 * (x - median) / MAD, or 0.7979 * (x - median) / MeanAD
+    scale = np.where(mad > 0, 1.4826 * mad, 1.2533 * mean_ad)
+    scale = np.maximum(scale, min_scale)
+    return median[rows], (values - median[rows]) / scale[rows]
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so stale caches are ignored
+CACHE_VERSION = 1
+
+class TransactionCache:
+    """Columnar on-disk cache of parsed transactions, keyed by an input fingerprint.
+
+    Each entry is a directory of .npy files (one per column, categorical columns
+    stored as int codes plus a categories array) that is memory-mapped on load.
+    Only numeric columns and category codes stay mapped: categories (the address
+    dictionary) and non-categorical string columns such as tx_hash are
+    materialized as Python strings, which is still far cheaper than parsing.
+
+    Take the entry with entry_path() once, before parsing, and pass it to
+    load() and save(). A file modified while it is parsed is then cached under
+    its old key, which later runs never hit.
+    """
+
+    def __init__(self, cache_dir: str = "data/cache", sample_blocks: int = 64, block_size: int = 1024 * 1024):
+        self.cache_dir = cache_dir
+        # Number of evenly spaced blocks hashed for the content fingerprint; None hashes the whole file
+        self.sample_blocks = sample_blocks
+        self.block_size = block_size
+
+    def fingerprint(self, file_path: str) -> str:
+        """Key an input file by its absolute path, size, mtime and content hash."""
+        stat = os.stat(file_path)
+        digest = hashlib.blake2b(digest_size=16)
+        with open(file_path, "rb") as f:
+            if self.sample_blocks is None or stat.st_size <= self.sample_blocks * self.block_size:
+                for block in iter(lambda: f.read(self.block_size), b""):
+                    digest.update(block)
+            else:
+                step = (stat.st_size - self.block_size) // (self.sample_blocks - 1)
+                for i in range(self.sample_blocks):
+                    f.seek(i * step)
+                    digest.update(f.read(self.block_size))
+        key = json.dumps({
+            "path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "content": digest.hexdigest(),
+            "version": CACHE_VERSION,
+        }, sort_keys=True)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+    def entry_path(self, file_path: str) -> str:
+        """Cache entry directory for file_path; hashes the file, so compute it once per run."""
+        return os.path.join(self.cache_dir, self.fingerprint(file_path))
+
+    def load(self, entry: str):
+        """Return the DataFrame cached in entry (numeric columns memory-mapped), or None on a miss."""
+        meta_path = os.path.join(entry, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        columns = {}
+        for i, col in enumerate(meta["columns"]):
+            if col["kind"] == "categorical":
+                codes = np.asarray(np.load(os.path.join(entry, f"{i}.codes.npy"), mmap_mode="r"))
+                categories = np.load(os.path.join(entry, f"{i}.categories.npy"), mmap_mode="r")
+                values = pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+                if not col["as_category"]:
+                    values = np.asarray(values, dtype=object)
+            else:
+                # asarray drops the memmap subclass but keeps the mapped buffer
+                values = np.asarray(np.load(os.path.join(entry, f"{i}.npy"), mmap_mode="r"))
+            columns[col["name"]] = values
+        return pd.DataFrame(columns, copy=False)
+
+    def save(self, entry: str, df: pd.DataFrame) -> bool:
+        """Write df as the cache entry `entry`; returns False if a column cannot be cached."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            meta = {"rows": len(df), "columns": []}
+            for i, name in enumerate(df.columns):
+                series = df[name]
+                if series.dtype.kind in "biuf":
+                    np.save(os.path.join(tmp_dir, f"{i}.npy"), series.to_numpy())
+                    meta["columns"].append({"name": name, "kind": "numeric"})
+                    continue
+                as_category = isinstance(series.dtype, pd.CategoricalDtype)
+                if as_category:
+                    codes, categories = series.cat.codes.to_numpy(), series.cat.categories
+                else:
+                    codes, categories = pd.factorize(series)
+                categories = np.asarray(categories)
+                if categories.dtype == object:
+                    if not all(isinstance(c, str) for c in categories):
+                        return False
+                    categories = categories.astype(str)
+                np.save(os.path.join(tmp_dir, f"{i}.codes.npy"), codes)
+                np.save(os.path.join(tmp_dir, f"{i}.categories.npy"), categories)
+                meta["columns"].append({"name": name, "kind": "categorical", "as_category": as_category})
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.replace(tmp_dir, entry)
+            return True
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir)
+
+    def invalidate(self, entry: str):
+        """Remove the cache entry, if any."""
+        if os.path.exists(entry):
+            shutil.rmtree(entry)
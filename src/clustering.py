@@ -1,53 +1,170 @@
+import time
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-import hdbscan
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from src.address_index import AddressIndex
+from src.profiling import profile_step
+
+# Columns clustering fits on; the extended features are output-only and may be NaN
+CLUSTER_FEATURES = ["sent_count", "sent_total", "received_count", "received_total"]
 
 class ClusteringAnalyzer:
-    def __init__(self, transactions: pd.DataFrame):
+    def __init__(self, transactions: pd.DataFrame, address_index: AddressIndex = None):
         self.transactions = transactions
+        if address_index is None:
+            address_index = AddressIndex.from_transactions(transactions)
+        self.address_index = address_index
         self.address_features = None
         self.clusters = None
+        self.timings = {}
 
-    def compute_address_features(self):
-        """Compute features per address from transactions."""
-        senders = self.transactions.groupby("sender").agg(
-            sent_count=("amount", "count"),
-            sent_total=("amount", "sum")
-        ).reset_index().rename(columns={"sender": "address"})
-        
-        recipients = self.transactions.groupby("recipient").agg(
-            received_count=("amount", "count"),
-            received_total=("amount", "sum")
-        ).reset_index().rename(columns={"recipient": "address"})
+    def compute_address_features(self, extended=False):
+        """Compute features per address from transactions.
+
+        Sent/received counts and totals are accumulated with bincount over the
+        interned address ids in a single pass. With extended=True the frame also
+        gets first/last height seen, active block span, unique counterparties
+        and the largest single transfer (sent or received). The extended
+        columns are output-only (NaN where unknown); cluster_addresses uses
+        CLUSTER_FEATURES alone.
+        """
+        n = len(self.address_index)
+        sender_ids = self.address_index.sender_ids
+        recipient_ids = self.address_index.recipient_ids
+        amount = self.transactions["amount"].to_numpy(dtype=np.float64)
+        has_amount = ~np.isnan(amount)
+        amount = np.where(has_amount, amount, 0.0)
+        sent = sender_ids >= 0
+        received = recipient_ids >= 0
+        s, r = sender_ids[sent], recipient_ids[received]
 
-        features = senders.merge(recipients, on="address", how="outer").fillna(0)
+        seen = np.bincount(s, minlength=n) + np.bincount(r, minlength=n)
+        columns = {
+            "sent_count": np.bincount(s, weights=has_amount[sent], minlength=n).astype(np.int64),
+            "sent_total": np.bincount(s, weights=amount[sent], minlength=n),
+            "received_count": np.bincount(r, weights=has_amount[received], minlength=n).astype(np.int64),
+            "received_total": np.bincount(r, weights=amount[received], minlength=n),
+        }
+        if extended:
+            columns.update(self._extended_features(n, s, r, sent, received, amount, has_amount))
+
+        active = np.flatnonzero(seen)
+        features = pd.DataFrame({name: values[active] for name, values in columns.items()})
+        features.insert(0, "address", self.address_index.as_categorical(active))
         self.address_features = features
         return features
 
-    def cluster_addresses(self, method="hdbscan", **kwargs):
+    def _extended_features(self, n, s, r, sent, received, amount, has_amount):
+        features = {}
+        if "height" in self.transactions.columns:
+            height = self.transactions["height"].to_numpy(dtype=np.float64)
+            first = np.full(n, np.inf)
+            last = np.full(n, -np.inf)
+            for ids, mask in ((s, sent), (r, received)):
+                h = height[mask]
+                known = ~np.isnan(h)
+                np.minimum.at(first, ids[known], h[known])
+                np.maximum.at(last, ids[known], h[known])
+            first[np.isinf(first)] = np.nan
+            last[np.isinf(last)] = np.nan
+            features["first_height"] = first
+            features["last_height"] = last
+            features["active_span"] = last - first
+
+        # Distinct (address, counterparty) pairs in either direction
+        both = sent & received
+        a, b = self.address_index.sender_ids[both].astype(np.int64), self.address_index.recipient_ids[both].astype(np.int64)
+        pairs = np.unique(np.concatenate([a * n + b, b * n + a]))
+        features["unique_counterparties"] = np.bincount(pairs // n, minlength=n)
+
+        # Largest known amount; addresses without one get NaN, like the height columns
+        max_transfer = np.full(n, -np.inf)
+        for ids, mask in ((s, sent), (r, received)):
+            known = has_amount[mask]
+            np.maximum.at(max_transfer, ids[known], amount[mask][known])
+        max_transfer[np.isinf(max_transfer)] = np.nan
+        features["max_transfer"] = max_transfer
+        return features
+
+    def cluster_addresses(self, method="hdbscan", sample_size=None, n_jobs=4, **kwargs):
         """Cluster addresses based on computed features.
         
         Args:
-            method: 'hdbscan' or 'kmeans'
+            method: 'hdbscan', 'kmeans' or 'minibatch_kmeans'
+            sample_size: for 'hdbscan', fit on a stratified sample of this many
+                addresses and assign the rest with hdbscan.approximate_predict
+            n_jobs: parallelism for HDBSCAN core distances (core_dist_n_jobs,
+                default 4 as in hdbscan)
+
+        Fit/predict wall times and row counts are recorded in self.timings.
         """
         if self.address_features is None:
             self.compute_address_features()
         
-        X = self.address_features.drop("address", axis=1).values
+        X = self.address_features[CLUSTER_FEATURES].values
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(X)
+        self.timings = {}
         
         if method == "hdbscan":
-            clusterer = hdbscan.HDBSCAN(**kwargs)
-            labels = clusterer.fit_predict(X_scaled)
-        elif method == "kmeans":
+            if sample_size is not None and len(X_scaled) > sample_size:
+                labels = self._cluster_hdbscan_sampled(X_scaled, sample_size, n_jobs, **kwargs)
+            else:
+                # hdbscan is slow to import, so only load it when HDBSCAN is requested
+                import hdbscan
+                clusterer = hdbscan.HDBSCAN(core_dist_n_jobs=n_jobs, **kwargs)
+                with self._timed("fit", len(X_scaled)):
+                    labels = clusterer.fit_predict(X_scaled)
+        elif method in ("kmeans", "minibatch_kmeans"):
             n_clusters = kwargs.get("n_clusters", 5)
-            clusterer = KMeans(n_clusters=n_clusters, random_state=42)
-            labels = clusterer.fit_predict(X_scaled)
+            if method == "kmeans":
+                clusterer = KMeans(n_clusters=n_clusters, random_state=42)
+            else:
+                clusterer = MiniBatchKMeans(n_clusters=n_clusters, batch_size=kwargs.get("batch_size", 4096),
+                                            random_state=42, n_init=3)
+            with self._timed("fit", len(X_scaled)):
+                clusterer.fit(X_scaled)
+            with self._timed("predict", len(X_scaled)):
+                labels = clusterer.predict(X_scaled)
         else:
             raise ValueError("Unsupported clustering method")
         
         self.address_features["cluster"] = labels
         self.clusters = self.address_features
-        return self.clusters
\ No newline at end of file
+        return self.clusters
+
+    def _cluster_hdbscan_sampled(self, X_scaled, sample_size, n_jobs, **kwargs):
+        """Fit HDBSCAN on a stratified sample and assign the remaining addresses out-of-sample."""
+        sample = self._stratified_sample(sample_size)
+        rest = np.ones(len(X_scaled), dtype=bool)
+        rest[sample] = False
+
+        import hdbscan
+        clusterer = hdbscan.HDBSCAN(prediction_data=True, core_dist_n_jobs=n_jobs, **kwargs)
+        labels = np.empty(len(X_scaled), dtype=np.int64)
+        with self._timed("fit", len(sample)):
+            labels[sample] = clusterer.fit_predict(X_scaled[sample])
+        with self._timed("predict", int(rest.sum())):
+            labels[rest], _ = hdbscan.approximate_predict(clusterer, X_scaled[rest])
+        return labels
+
+    def _stratified_sample(self, sample_size, n_strata=10, random_state=42):
+        """Sample row positions proportionally from activity-level strata.
+
+        Strata are quantile bins of log total transaction count, so rare,
+        very active addresses are represented in the fitted sample.
+        """
+        activity = np.log1p(self.address_features["sent_count"] + self.address_features["received_count"])
+        strata = pd.qcut(activity.rank(method="first"), q=min(n_strata, len(activity)), labels=False)
+        frac = sample_size / len(strata)
+        sampled = pd.Series(np.arange(len(strata))).groupby(strata.to_numpy()).sample(frac=frac, random_state=random_state)
+        return np.sort(sampled.to_numpy())
+
+    @contextmanager
+    def _timed(self, step, rows):
+        start = time.perf_counter()
+        with profile_step(f"clustering.{step}", rows):
+            yield
+        self.timings[step] = {"seconds": time.perf_counter() - start, "rows": rows}
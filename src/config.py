@@ -10,10 +10,9 @@ load_dotenv()
 logger.info("Environment variables loaded from the .env file.")
 
 class Config:
-    # OpenAI API key is loaded from the .env file
+    # OpenAI API key is loaded from the .env file; it is only required by AIAgent
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     if OPENAI_API_KEY is None:
-        logger.error("OPENAI_API_KEY is not set in the .env file.")
-        raise ValueError("Please set your OPENAI_API_KEY in the .env file.")
+        logger.info("OPENAI_API_KEY is not set; AI insight reports will be unavailable.")
     else:
-        logger.info("OPENAI_API_KEY successfully loaded.")
\ No newline at end of file
+        logger.info("OPENAI_API_KEY successfully loaded.")
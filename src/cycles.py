@@ -0,0 +1,195 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# (sender, bucket, position) keys are used while they stay below this bound
+KEY_LIMIT = 2 ** 62
+
+# TransferIndex installed once per worker process by _init_worker
+_worker_index = None
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+def _search_partition(args):
+    starts, max_length, max_span, batch_size = args
+    return _worker_index.search(starts, max_length, max_span, batch_size)
+
+class TransferIndex:
+    """Transfers in (height, row) order with a per-sender adjacency index for temporal path search.
+
+    Out-transfers of each sender are sorted by amount bucket and then by
+    position in height order. Buckets are log(amount) / log1p(tolerance)
+    bins, so every transfer within `tolerance` of an amount sits in the
+    same or an adjacent bucket. All out-transfers of a node in later blocks
+    than some transfer, within a height window and close in amount
+    therefore form at most three contiguous ranges, each found with one
+    binary search.
+    """
+
+    def __init__(self, sender_ids, recipient_ids, amount, height, tolerance=0.1):
+        amount = np.asarray(amount, dtype=np.float64)
+        height = np.asarray(height, dtype=np.float64)
+        valid = ((sender_ids >= 0) & (recipient_ids >= 0) & (sender_ids != recipient_ids)
+                 & (amount > 0) & np.isfinite(amount) & ~np.isnan(height))
+        rows = np.flatnonzero(valid)
+        rows = rows[np.argsort(height[rows], kind="stable")]
+        # Position p is the p-th valid transfer in height order; rows maps it back to the input row
+        self.rows = rows
+        self.sender = sender_ids[rows].astype(np.int64)
+        self.recipient = recipient_ids[rows].astype(np.int64)
+        self.amount = amount[rows]
+        self.height = height[rows]
+        # Last position in each position's block: transfers after it have a strictly greater height
+        self.block_end = np.searchsorted(self.height, self.height, side="right") - 1
+        self.tolerance = tolerance
+        n = len(rows)
+        if n >= 2 ** 31:
+            raise ValueError("Too many transfers for 64-bit index keys")
+        if tolerance is None:
+            self.bucket = np.zeros(n, dtype=np.int64)
+        else:
+            self.bucket = np.floor(np.log(self.amount) / np.log1p(tolerance)).astype(np.int64)
+        self.buckets, self.bucket_rank = np.unique(self.bucket, return_inverse=True)
+        groups = self.sender * len(self.buckets) + self.bucket_rank
+        n_nodes = int(max(self.sender.max(), self.recipient.max())) + 1 if n else 1
+        self.groups = None
+        if n_nodes * len(self.buckets) * max(n, 1) >= KEY_LIMIT:
+            # Too many addresses and buckets for (sender, bucket, position) keys: rank the
+            # occupied (sender, bucket) groups instead, which keeps keys below n * n
+            groups, rank = np.unique(groups, return_inverse=True)
+            self.groups = pd.Index(groups)
+            groups = rank.astype(np.int64)
+        keys = groups * n + np.arange(n)
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, starts, max_length=4, max_span=None, batch_size=50_000):
+        """Enumerate cycles that begin with the transfers at positions `starts`.
+
+        A cycle is a chain of 2..max_length transfers whose heights strictly
+        increase (transfers in the same block never chain), each sent by the
+        previous recipient, that visits no address
+        twice and returns to the first sender. Each amount must be within
+        `tolerance` of the first amount, and with max_span the last transfer
+        must be at most max_span blocks after the first. Since heights
+        increase along the chain, every cycle is found exactly once, from its
+        earliest transfer.
+
+        Returns (cycles, lengths): positions as a (n_cycles, max_length)
+        array padded with -1, and the number of transfers per cycle.
+        """
+        found = []
+        for begin in range(0, len(starts), batch_size):
+            found.extend(self._search_batch(np.asarray(starts[begin:begin + batch_size], dtype=np.int64),
+                                            max_length, max_span))
+        if not found:
+            return np.zeros((0, max_length), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        cycles = np.full((sum(len(paths) for paths in found), max_length), -1, dtype=np.int64)
+        offset = 0
+        for paths in found:
+            cycles[offset:offset + len(paths), :paths.shape[1]] = paths
+            offset += len(paths)
+        return cycles, (cycles >= 0).sum(axis=1)
+
+    def _search_batch(self, starts, max_length, max_span):
+        n = len(self)
+        paths = starts[:, None]
+        origin = self.sender[starts]
+        first_amount = self.amount[starts]
+        first_bucket = self.bucket_rank[starts]
+        if max_span is None:
+            limit = np.full(len(starts), n - 1, dtype=np.int64)
+        else:
+            limit = np.searchsorted(self.height, self.height[starts] + max_span, side="right") - 1
+        found = []
+        for hops in range(2, max_length + 1):
+            if not len(paths):
+                break
+            path, candidate = self._expand(self.recipient[paths[:, -1]], self.block_end[paths[:, -1]], limit,
+                                           first_bucket, first_amount)
+            target = self.recipient[candidate]
+            closes = target == origin[path]
+            if closes.any():
+                found.append(np.column_stack([paths[path[closes]], candidate[closes]]))
+            if hops == max_length:
+                break
+            # Extend only simple paths: the new recipient must not be on the path already
+            keep = ~closes
+            for column in range(paths.shape[1]):
+                keep &= target != self.recipient[paths[path, column]]
+            path, candidate = path[keep], candidate[keep]
+            paths = np.column_stack([paths[path], candidate])
+            origin, first_amount, first_bucket, limit = (origin[path], first_amount[path],
+                                                         first_bucket[path], limit[path])
+        return found
+
+    def _expand(self, nodes, after, limit, first_bucket, first_amount):
+        """Out-transfers of each node at positions after `after`, up to `limit`, close to first_amount.
+
+        Returns (path, candidate): the index into the inputs and the position
+        of each matching transfer.
+        """
+        n = len(self)
+        shifts = (0,) if self.tolerance is None else (-1, 0, 1)
+        paths, candidates = [], []
+        for shift in shifts:
+            # first_bucket holds bucket ranks; the neighbouring bucket may not occur at all
+            bucket = np.clip(first_bucket + shift, 0, len(self.buckets) - 1)
+            known = self.buckets[bucket] == self.buckets[first_bucket] + shift
+            group = nodes * len(self.buckets) + bucket
+            if self.groups is not None:
+                group = self.groups.get_indexer(group).astype(np.int64)
+                known &= group >= 0
+            base = group * n
+            lo = _sorted_search(self.keys, base + after)
+            hi = _sorted_search(self.keys, base + limit)
+            counts = np.where(known, np.maximum(hi - lo, 0), 0)
+            total = int(counts.sum())
+            if not total:
+                continue
+            offsets = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(total)
+            paths.append(np.repeat(np.arange(len(nodes)), counts))
+            candidates.append(self.order[offsets])
+        if not paths:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        path, candidate = np.concatenate(paths), np.concatenate(candidates)
+        if self.tolerance is not None:
+            close = np.abs(self.amount[candidate] - first_amount[path]) <= self.tolerance * first_amount[path]
+            path, candidate = path[close], candidate[close]
+        return path, candidate
+
+def _sorted_search(keys, queries):
+    """searchsorted(side='right') with the queries sorted first, which numpy's binary search is much faster on."""
+    order = np.argsort(queries)
+    found = np.empty(len(queries), dtype=np.int64)
+    found[order] = np.searchsorted(keys, queries[order], side="right")
+    return found
+
+def find_cycles(sender_ids, recipient_ids, amount, height, max_length=4, tolerance=0.1, max_span=None,
+                workers=1, batch_size=50_000):
+    """Enumerate temporal cycles and round trips (cycles of two transfers) up to max_length transfers.
+
+    See TransferIndex.search for the constraints. Start transfers are split
+    into interleaved partitions that `workers` processes search in parallel.
+
+    Returns (cycles, lengths) with cycles as input row numbers, padded with -1.
+    """
+    index = TransferIndex(sender_ids, recipient_ids, amount, height, tolerance)
+    starts = np.arange(len(index))
+    if workers > 1 and len(index) > batch_size:
+        # Interleave partitions so busy periods are spread over all workers
+        partitions = [(starts[i::workers * 4], max_length, max_span, batch_size) for i in range(workers * 4)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(index,)) as pool:
+            results = list(pool.map(_search_partition, partitions))
+        cycles = np.concatenate([cycles for cycles, _ in results])
+    else:
+        cycles, _ = index.search(starts, max_length, max_span, batch_size)
+    # Restore a deterministic order (by first transfer) whatever the partitioning
+    cycles = cycles[np.lexsort(cycles.T[::-1])]
+    rows = np.where(cycles >= 0, index.rows[np.maximum(cycles, 0)], -1)
+    return rows, (cycles >= 0).sum(axis=1)
@@ -1,28 +1,181 @@
-import pandas as pd
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.address_index import share_address_categories
 
 class DataLoader:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, chunk_size: int = 64 * 1024 * 1024, workers: int = 1):
         self.file_path = file_path
+        # Number of bytes read per chunk; bounds memory use of iter_chunks()
+        self.chunk_size = chunk_size
+        # Number of processes used by load_data(); 1 parses serially
+        self.workers = workers
+        self.summary = self._empty_summary()
+
+    def load_data(self, start: int = 0, on_chunk=None, end: int = None) -> pd.DataFrame:
+        """Load dataset from a JSON lines file, handling empty lines and errors.
+
+        start and end are newline-aligned byte offsets delimiting the part of
+        the file to read (end defaults to the file size when reading starts).
+        on_chunk, if given, is called with every parsed chunk in file order, so
+        streaming summaries (e.g. sketches.TransferSketches.update) share the
+        parsing pass.
+        """
+        if self.workers > 1:
+            chunks = self._load_parallel(start, end)
+            for chunk in chunks if on_chunk else ():
+                on_chunk(chunk)
+        else:
+            chunks = []
+            for chunk in self.iter_chunks(start, end):
+                if on_chunk:
+                    on_chunk(chunk)
+                chunks.append(chunk)
+        if not chunks:
+            raise ValueError("No valid data found in the file.")
+        return share_address_categories(concat_chunks(chunks))
 
-    def load_data(self) -> pd.DataFrame:
-        """Load dataset from a JSON lines file, handling empty lines and errors."""
-        data = []
-        with open(self.file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
+    def iter_chunks(self, start: int = 0, end: int = None):
+        """Yield typed DataFrames parsed from fixed-size byte chunks of the file."""
+        self.summary = self._empty_summary()
+        yield from self._iter_range(start, os.path.getsize(self.file_path) if end is None else end)
+        self._report()
+
+    def byte_ranges(self, n: int, start: int = 0, end: int = None):
+        """Split the file from start to end into at most n newline-aligned (start, end) byte ranges."""
+        size = os.path.getsize(self.file_path) if end is None else end
+        bounds = [start]
+        with open(self.file_path, "rb") as f:
+            for i in range(1, n):
+                target = max(start + (size - start) * i // n, bounds[-1])
+                if target >= size:
+                    break
+                f.seek(target)
+                f.readline()
+                pos = min(f.tell(), size)
+                if pos > bounds[-1]:
+                    bounds.append(pos)
+        if bounds[-1] < size:
+            bounds.append(size)
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def _load_parallel(self, start: int = 0, end: int = None):
+        """Parse byte ranges in a process pool, keeping the serial row order."""
+        self.summary = self._empty_summary()
+        ranges = self.byte_ranges(self.workers, start, end)
+        chunks = []
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            args = [(self.file_path, start, end, self.chunk_size) for start, end in ranges]
+            for range_chunks, summary in pool.map(_parse_range, *zip(*args)):
+                chunks.extend(range_chunks)
+                self._merge_summary(summary)
+        self._report()
+        return chunks
+
+    def _iter_range(self, start: int, end: int):
+        """Yield typed DataFrames for the newline-aligned byte range [start, end)."""
+        with open(self.file_path, "rb") as f:
+            f.seek(start)
+            remaining = end - start
+            remainder = b""
+            while remaining > 0:
+                block = f.read(min(self.chunk_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                block = remainder + block
+                cut = block.rfind(b"\n")
+                if cut == -1:
+                    remainder = block
                     continue
+                remainder = block[cut + 1:]
+                df = self._parse_block(block[:cut + 1])
+                if df is not None:
+                    yield df
+            if remainder.strip():
+                df = self._parse_block(remainder)
+                if df is not None:
+                    yield df
+
+    def _parse_block(self, block: bytes):
+        """Parse a newline-aligned block of JSON lines into a typed DataFrame."""
+        lines = [line.strip() for line in block.decode("utf-8").split("\n")]
+        lines = [line for line in lines if line]
+        self.summary["lines"] += len(lines)
+        if not lines:
+            return None
+
+        # Fast path: decode the whole block with a single json.loads call
+        try:
+            records = json.loads("[" + ",".join(lines) + "]")
+            if len(records) != len(lines) or not all(isinstance(r, dict) for r in records):
+                raise ValueError("record count mismatch")
+        except ValueError:
+            records = []
+            for line in lines:
                 try:
                     record = json.loads(line)
-                    data.append(record)
                 except json.JSONDecodeError as e:
-                    print(f"Skipping malformed line: {line}\nError: {e}")
+                    self._record_malformed(line, e)
+                    continue
+                if not isinstance(record, dict):
+                    self._record_malformed(line, "not a JSON object")
+                    continue
+                records.append(record)
 
-        if not data:
-            raise ValueError("No valid data found in the file.")
+        if not records:
+            return None
+        self.summary["rows"] += len(records)
+        self.summary["chunks"] += 1
+        return coerce_types(pd.DataFrame.from_records(records))
+
+    def _record_malformed(self, line, error):
+        self.summary["malformed"] += 1
+        if len(self.summary["malformed_examples"]) < 5:
+            self.summary["malformed_examples"].append(f"{line[:200]} ({error})")
+
+    def _merge_summary(self, summary):
+        for key in ("lines", "rows", "malformed", "chunks"):
+            self.summary[key] += summary[key]
+        examples = self.summary["malformed_examples"] + summary["malformed_examples"]
+        self.summary["malformed_examples"] = examples[:5]
+
+    def _report(self):
+        if self.summary["malformed"]:
+            print(f"Skipped {self.summary['malformed']} malformed lines out of {self.summary['lines']}.")
+            for example in self.summary["malformed_examples"]:
+                print(f"  e.g. {example}")
+
+    @staticmethod
+    def _empty_summary():
+        return {"lines": 0, "rows": 0, "malformed": 0, "chunks": 0, "malformed_examples": []}
+
+def _parse_range(file_path, start, end, chunk_size):
+    """Process pool entry point: parse one byte range of a JSON lines file."""
+    loader = DataLoader(file_path, chunk_size=chunk_size)
+    chunks = list(loader._iter_range(start, end))
+    return chunks, loader.summary
+
+def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert parsed columns to compact dtypes (categorical addresses, float64 amount, int64 height)."""
+    for col in ("sender", "recipient"):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    if "amount" in df.columns:
+        df["amount"] = pd.to_numeric(df["amount"], errors="coerce").astype("float64")
+    if "height" in df.columns:
+        height = pd.to_numeric(df["height"], errors="coerce")
+        # Keep float64 (with NaN) only when some heights could not be parsed
+        df["height"] = height.astype("int64") if height.notna().all() else height.astype("float64")
+    return df
 
-        df = pd.DataFrame(data)
-        df['amount'] = pd.to_numeric(df['amount'], errors='coerce')
-        df['height'] = pd.to_numeric(df['height'], errors='coerce')
-        return df
\ No newline at end of file
+def concat_chunks(chunks) -> pd.DataFrame:
+    """Concatenate typed chunks, unioning the categorical address columns."""
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+    df = pd.concat(chunks, ignore_index=True)
+    for col in ("sender", "recipient"):
+        if col in chunks[0].columns and all(col in c.columns for c in chunks):
+            df[col] = pd.api.types.union_categoricals([c[col] for c in chunks], sort_categories=True)
+    return df
@@ -0,0 +1,41 @@
+import os
+import pandas as pd
+
+EXPORT_FORMATS = ("csv", "parquet", "feather")
+
+def write_table(df: pd.DataFrame, path: str, format: str = "csv", row_group_size: int = 1_000_000,
+                compression: str = "zstd") -> str:
+    """Write a result table in row groups; returns the path written (extension added).
+
+    Address columns may stay categorical: CSV writes the strings, while Parquet
+    and Feather store them dictionary-encoded. Parquet and Feather need the
+    optional pyarrow dependency, imported only when those formats are used.
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    path = f"{path}.{format}"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if format == "csv":
+        df.to_csv(path, index=False, chunksize=row_group_size)
+        return path
+
+    try:
+        import pyarrow as pa
+    except ImportError as exc:
+        raise ImportError(f"Exporting to {format} requires pyarrow (poetry install --extras columnar, or pip install pyarrow)") from exc
+    # Convert once so every row group shares one dictionary per categorical column
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema = table.schema
+    batches = table.to_batches(max_chunksize=row_group_size)
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        with pq.ParquetWriter(path, schema, compression=compression) as writer:
+            for batch in batches:
+                writer.write_batch(batch, row_group_size=row_group_size)
+    else:
+        import pyarrow.ipc as ipc
+        options = ipc.IpcWriteOptions(compression=compression)
+        with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, schema, options=options) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+    return path
@@ -0,0 +1,387 @@
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+from src.anomaly_detection import AnomalyDetector, label_activity_outliers, select_amount_anomalies
+from src.clustering import ClusteringAnalyzer
+from src.data_loader import DataLoader
+from src.export import write_table
+
+STATE_VERSION = 3
+# Bytes before the processed offset hashed to detect a rewritten (not appended) input
+TAIL_BYTES = 64 * 1024
+# Columns of the last processed block kept in the state, to retract it before a rescan re-ingests it
+BLOCK_COLUMNS = ["sender", "recipient", "amount", "height"]
+
+ACCUMULATORS = {
+    # name: (initial value, how new values are merged)
+    "sent_count": (0, np.add),
+    "sent_total": (0.0, np.add),
+    "received_count": (0, np.add),
+    "received_total": (0.0, np.add),
+    "tx_count": (0, np.add),
+    "first_height": (np.inf, np.fmin),
+    "last_height": (-np.inf, np.fmax),
+    "max_transfer": (-np.inf, np.fmax),
+    "unique_counterparties": (0, np.add),
+    "out_degree": (0, np.add),
+    "in_degree": (0, np.add),
+}
+
+def _locate(sorted_keys: np.ndarray, keys: np.ndarray):
+    """Return insertion positions of keys in sorted_keys and whether each key is already present."""
+    pos = np.searchsorted(sorted_keys, keys)
+    if not len(sorted_keys):
+        return pos, np.zeros(len(keys), dtype=bool)
+    return pos, sorted_keys[np.minimum(pos, len(sorted_keys) - 1)] == keys
+
+class IncrementalAnalyzer:
+    """Incremental, block-height windowed analysis that only processes new transactions.
+
+    Persists per-address feature accumulators, the aggregated (sender, recipient)
+    edge table, degree counts and the fitted amount IsolationForest under
+    state_dir. Each run ingests every complete line appended to the input since
+    the last run, whatever its height, and updates the state in place, so
+    features, edges and degree metrics match a full recompute.
+
+    If the input was rewritten rather than appended to, it is rescanned and
+    only rows at or above the last processed height are kept. The rows of that
+    last block are kept in the state, so their additive contributions are
+    retracted before the block is re-ingested. Rows without a height cannot be
+    placed, so a rescan drops them. The input needs a height column.
+
+    The amount IsolationForest is fitted on the first run and scores later
+    rows. Once the ingested rows reach refit_factor times the rows it was
+    fitted on (or on every run with refit=True), it is refitted on the whole
+    input and the amount anomalies are selected again, as a full run would.
+    """
+
+    def __init__(self, file_path: str, state_dir: str = "data/state", workers: int = 1, contamination=0.01,
+                 refit_factor: float = 2.0, refit: bool = False):
+        self.file_path = file_path
+        self.state_path = os.path.join(state_dir, "incremental.pkl")
+        self.workers = workers
+        self.contamination = contamination
+        # Refit the amount model once the input grows by this factor (None or 0 never refits)
+        self.refit_factor = refit_factor
+        self.refit = refit
+        self.state = None
+
+    def run(self):
+        """Ingest new transactions, update the state and return the current results."""
+        self.state = self._load_state()
+        new_transactions, rescan = self._load_new_transactions()
+        if rescan:
+            self._retract_last_block()
+        if new_transactions is not None and len(new_transactions):
+            self._update(new_transactions)
+        if self._refit_due():
+            history = DataLoader(self.file_path, workers=self.workers).load_data(end=self.state["offset"])
+            self._fit_amount_model(history)
+        self._save_state()
+        return self.results()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "rb") as f:
+                state = pickle.load(f)
+            if state.get("version") == STATE_VERSION:
+                return state
+        return {
+            "version": STATE_VERSION,
+            "offset": 0,
+            "tail_hash": None,
+            "last_height": -np.inf,
+            "last_block": pd.DataFrame({name: pd.Series(dtype=object if name in ("sender", "recipient") else float)
+                                        for name in BLOCK_COLUMNS}),
+            "addresses": pd.Index([], dtype=object),
+            "accumulators": {name: np.zeros(0, dtype=type(init)) for name, (init, _) in ACCUMULATORS.items()},
+            "edge_keys": np.zeros(0, dtype=np.int64),
+            "edge_amount": np.zeros(0),
+            "edge_tx_count": np.zeros(0, dtype=np.int64),
+            "pair_keys": np.zeros(0, dtype=np.int64),
+            "rows": 0,
+            "amount_model": None,
+            "model_rows": 0,
+            "amount_anomalies": None,
+        }
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.state_path)
+
+    def _tail_hash(self, offset):
+        with open(self.file_path, "rb") as f:
+            f.seek(max(0, offset - TAIL_BYTES))
+            return hashlib.blake2b(f.read(offset - max(0, offset - TAIL_BYTES)), digest_size=16).hexdigest()
+
+    def _complete_end(self):
+        """Offset after the last complete line; a trailing line still being written is left for the next run."""
+        size = os.path.getsize(self.file_path)
+        with open(self.file_path, "rb") as f:
+            f.seek(max(0, size - TAIL_BYTES))
+            tail = f.read()
+        cut = tail.rfind(b"\n")
+        fragment = tail[cut + 1:]
+        if fragment.strip():
+            # An unterminated last line counts once it is a whole record, as it does for a full load
+            try:
+                if isinstance(json.loads(fragment), dict):
+                    return size
+            except ValueError:
+                pass
+        return size - len(fragment) if cut >= 0 or size <= TAIL_BYTES else size
+
+    def _load_new_transactions(self):
+        """Return (new transactions or None, whether the input was rescanned after a rewrite)."""
+        end = self._complete_end()
+        offset = self.state["offset"]
+        appended = offset == 0 or (offset <= end and self._tail_hash(offset) == self.state["tail_hash"])
+        start = offset if appended else 0
+        if start >= end:
+            return None, False
+        if not appended:
+            print("Input was rewritten since the last run; rescanning it from the last processed height.")
+
+        try:
+            transactions = DataLoader(self.file_path, workers=self.workers).load_data(start=start, end=end)
+        except ValueError:
+            transactions = None
+        if transactions is not None and "height" not in transactions.columns:
+            raise ValueError("Incremental mode needs a height column in the input")
+        self.state["offset"] = end
+        self.state["tail_hash"] = self._tail_hash(end)
+        if appended or transactions is None:
+            # Appended bytes are all new, whatever their height
+            return transactions, False
+        # Blocks below the last processed height were already accumulated; that block itself is re-ingested whole
+        return transactions[transactions["height"] >= self.state["last_height"]].reset_index(drop=True), True
+
+    def _retract_last_block(self):
+        """Subtract the additive contributions of the last processed block, which a rescan re-ingests.
+
+        Minima, maxima, degrees and counterparties need no retraction: the
+        block's edges and heights come back unchanged, so re-merging them is a
+        no-op.
+        """
+        block = self.state["last_block"]
+        if len(block):
+            sender_ids = self._intern(block["sender"].to_numpy(dtype=object))
+            recipient_ids = self._intern(block["recipient"].to_numpy(dtype=object))
+            index = AddressIndex(self.state["addresses"], sender_ids, recipient_ids)
+            acc = self.state["accumulators"]
+            features = ClusteringAnalyzer(block, index).compute_address_features()
+            ids = features["address"].cat.codes.to_numpy()
+            for name in ("sent_count", "sent_total", "received_count", "received_total"):
+                acc[name][ids] -= features[name].to_numpy()
+            sent = sender_ids >= 0
+            acc["tx_count"] -= np.bincount(sender_ids[sent], minlength=len(acc["tx_count"]))
+
+            valid = (sender_ids >= 0) & (recipient_ids >= 0)
+            keys, inverse = np.unique((sender_ids[valid].astype(np.int64) << 32) | recipient_ids[valid],
+                                      return_inverse=True)
+            amount = block["amount"].to_numpy(dtype=np.float64)[valid]
+            pos = np.searchsorted(self.state["edge_keys"], keys)
+            self.state["edge_amount"][pos] -= np.bincount(inverse, weights=np.nan_to_num(amount), minlength=len(keys))
+            self.state["edge_tx_count"][pos] -= np.bincount(inverse, weights=~np.isnan(amount),
+                                                            minlength=len(keys)).astype(np.int64)
+            anomalies = self.state["amount_anomalies"]
+            if anomalies is not None:
+                self.state["amount_anomalies"] = anomalies[anomalies["height"] != self.state["last_height"]]
+        self.state["rows"] -= len(block)
+        self.state["last_block"] = block.iloc[:0]
+
+    def _intern(self, values: np.ndarray) -> np.ndarray:
+        """Map address strings to stable ids, appending unseen addresses to the dictionary."""
+        addresses = self.state["addresses"]
+        ids = addresses.get_indexer(values)
+        missing = (ids < 0) & pd.notna(values)
+        if missing.any():
+            addresses = addresses.append(pd.Index(pd.unique(values[missing])))
+            self.state["addresses"] = addresses
+            ids[missing] = addresses.get_indexer(values[missing])
+        return ids.astype(np.int32)
+
+    def _update(self, transactions: pd.DataFrame):
+        sender_ids = self._intern(np.asarray(transactions["sender"], dtype=object))
+        recipient_ids = self._intern(np.asarray(transactions["recipient"], dtype=object))
+        index = AddressIndex(self.state["addresses"], sender_ids, recipient_ids)
+        n = len(index)
+        acc = self.state["accumulators"]
+        for name, (init, _) in ACCUMULATORS.items():
+            grown = np.full(n, init, dtype=acc[name].dtype)
+            grown[:len(acc[name])] = acc[name]
+            acc[name] = grown
+
+        # Feature accumulators from the new rows only
+        features = ClusteringAnalyzer(transactions, index).compute_address_features(extended=True)
+        ids = features["address"].cat.codes.to_numpy()
+        for name in ("sent_count", "sent_total", "received_count", "received_total", "first_height",
+                     "last_height", "max_transfer"):
+            merge = ACCUMULATORS[name][1]
+            acc[name][ids] = merge(acc[name][ids], features[name].to_numpy())
+        sent = sender_ids >= 0
+        acc["tx_count"] += np.bincount(sender_ids[sent], minlength=n)
+        self.state["rows"] += len(transactions)
+
+        self._update_edges(transactions, sender_ids, recipient_ids)
+        self._update_amount_anomalies(transactions, index)
+        self._update_last_block(transactions)
+
+    def _update_last_block(self, transactions):
+        heights = transactions["height"].to_numpy(dtype=np.float64)
+        if not len(heights) or np.isnan(heights).all():
+            return
+        top = np.nanmax(heights)
+        if top < self.state["last_height"]:
+            return
+        block = transactions.loc[heights == top, BLOCK_COLUMNS].astype({"sender": object, "recipient": object})
+        if top == self.state["last_height"]:
+            block = pd.concat([self.state["last_block"], block], ignore_index=True)
+        self.state["last_block"] = block.reset_index(drop=True)
+        self.state["last_height"] = top
+
+    def _update_edges(self, transactions, sender_ids, recipient_ids):
+        valid = (sender_ids >= 0) & (recipient_ids >= 0)
+        s, r = sender_ids[valid].astype(np.int64), recipient_ids[valid].astype(np.int64)
+        amount = transactions["amount"].to_numpy(dtype=np.float64)[valid]
+        keys, inverse = np.unique((s << 32) | r, return_inverse=True)
+        new_amount = np.bincount(inverse, weights=np.nan_to_num(amount), minlength=len(keys))
+        new_count = np.bincount(inverse, weights=~np.isnan(amount), minlength=len(keys)).astype(np.int64)
+
+        # Existing edges are updated in place; unseen ones are merged into the sorted key array
+        edge_keys = self.state["edge_keys"]
+        pos, exists = _locate(edge_keys, keys)
+        self.state["edge_amount"][pos[exists]] += new_amount[exists]
+        self.state["edge_tx_count"][pos[exists]] += new_count[exists]
+        added = ~exists
+        insert_at = pos[added]
+        self.state["edge_keys"] = np.insert(edge_keys, insert_at, keys[added])
+        self.state["edge_amount"] = np.insert(self.state["edge_amount"], insert_at, new_amount[added])
+        self.state["edge_tx_count"] = np.insert(self.state["edge_tx_count"], insert_at, new_count[added])
+
+        acc = self.state["accumulators"]
+        n = len(acc["out_degree"])
+        acc["out_degree"] += np.bincount(keys[added] >> 32, minlength=n)
+        acc["in_degree"] += np.bincount(keys[added] & 0xFFFFFFFF, minlength=n)
+
+        # Counterparties: unordered address pairs not seen before
+        a, b = keys[added] >> 32, keys[added] & 0xFFFFFFFF
+        pairs = np.unique((np.minimum(a, b) << 32) | np.maximum(a, b))
+        pair_keys = self.state["pair_keys"]
+        pos, seen = _locate(pair_keys, pairs)
+        new_pairs = pairs[~seen]
+        self.state["pair_keys"] = np.insert(pair_keys, pos[~seen], new_pairs)
+        lo, hi = new_pairs >> 32, new_pairs & 0xFFFFFFFF
+        acc["unique_counterparties"] += np.bincount(lo, minlength=n) + np.bincount(hi[hi != lo], minlength=n)
+
+    def _update_amount_anomalies(self, transactions, index):
+        model = self.state["amount_model"]
+        if model is None:
+            # First run: fit on the full history and keep the model for later batches
+            self._fit_amount_model(transactions, index)
+            return
+        preds = model.predict(transactions["amount"].to_numpy().reshape(-1, 1))
+        anomalies = select_amount_anomalies(transactions, preds).astype({"sender": object, "recipient": object})
+        self.state["amount_anomalies"] = pd.concat([self.state["amount_anomalies"], anomalies], ignore_index=True)
+
+    def _refit_due(self) -> bool:
+        if self.state["amount_model"] is None:
+            return False
+        grown = self.refit_factor and self.state["rows"] >= self.refit_factor * self.state["model_rows"]
+        return bool(self.refit or grown)
+
+    def _fit_amount_model(self, transactions, index=None):
+        """Fit the amount model on transactions and replace the amount anomalies with its selection."""
+        detector = AnomalyDetector(transactions, index)
+        anomalies = detector.detect_amount_anomalies(contamination=self.contamination)
+        self.state["amount_model"] = detector.amount_model
+        self.state["model_rows"] = len(transactions)
+        self.state["amount_anomalies"] = anomalies.astype({"sender": object, "recipient": object})
+
+    def results(self) -> dict:
+        """Return address features, edges, degree centrality, hubs and anomalies from the state."""
+        state = self.state
+        addresses = state["addresses"]
+        acc = state["accumulators"]
+        active = np.flatnonzero(acc["sent_count"] + acc["received_count"] + acc["tx_count"]
+                                + acc["out_degree"] + acc["in_degree"])
+        features = pd.DataFrame({"address": pd.Categorical.from_codes(active, categories=addresses)})
+        for name in ("sent_count", "sent_total", "received_count", "received_total", "first_height",
+                     "last_height"):
+            features[name] = acc[name][active]
+        features["active_span"] = features["last_height"] - features["first_height"]
+        features["unique_counterparties"] = acc["unique_counterparties"][active]
+        features["max_transfer"] = acc["max_transfer"][active]
+        for name in ("first_height", "last_height", "active_span", "max_transfer"):
+            features.loc[np.isinf(features[name]), name] = np.nan
+
+        keys = state["edge_keys"]
+        edges = pd.DataFrame({
+            "source": pd.Categorical.from_codes((keys >> 32).astype(np.int32), categories=addresses),
+            "target": pd.Categorical.from_codes((keys & 0xFFFFFFFF).astype(np.int32), categories=addresses),
+            "amount": state["edge_amount"],
+            "tx_count": state["edge_tx_count"],
+        })
+
+        degree = acc["in_degree"] + acc["out_degree"]
+        nodes = np.flatnonzero(degree)
+        scale = 1.0 / (len(nodes) - 1) if len(nodes) > 1 else 1.0
+        centrality = pd.DataFrame({
+            "node": pd.Categorical.from_codes(nodes, categories=addresses),
+            "degree": degree[nodes] * scale,
+        })
+
+        senders = np.flatnonzero(acc["tx_count"])
+        activity = pd.DataFrame({
+            "sender": pd.Categorical.from_codes(senders, categories=addresses),
+            "tx_count": acc["tx_count"][senders],
+        })
+        # Full-run order (sorted addresses) so LOF tie-breaking matches a recompute
+        activity = activity.iloc[np.argsort(addresses[senders].to_numpy(), kind="stable")].reset_index(drop=True)
+        activity_anomalies = label_activity_outliers(activity, self.contamination) if len(activity) > 1 else activity
+
+        return {
+            "address_features": features,
+            "edges": edges,
+            "centrality": centrality,
+            "activity_anomalies": activity_anomalies,
+            "amount_anomalies": state["amount_anomalies"],
+            "last_height": state["last_height"],
+        }
+
+    def save_results(self, results: dict, directory="data/final", hub_threshold=0.05, export_format="csv"):
+        """Write the incremental results next to (or instead of) a full run's.
+
+        network_edges, network_hubs, activity_anomalies and amount_anomalies
+        have the full run's columns. network_centrality has node, degree and
+        hub but no betweenness. address_features (the extended per-address
+        features, without cluster labels) takes the place of
+        clustering_results. Betweenness, clustering, activity spikes, cycles,
+        fund flows, plots and the report need the whole history, so they are
+        not produced; run the full analysis for those. Returns the written paths.
+        """
+        os.makedirs(directory, exist_ok=True)
+        centrality = results["centrality"]
+        hub = centrality["degree"].to_numpy() >= hub_threshold
+        outputs = {
+            "address_features": results["address_features"],
+            "network_edges": results["edges"],
+            "network_centrality": centrality.assign(hub=hub),
+            "network_hubs": pd.DataFrame({"node": centrality["node"][hub], "hub_value": centrality["degree"][hub]}),
+            "activity_anomalies": results["activity_anomalies"],
+        }
+        if results["amount_anomalies"] is not None:
+            outputs["amount_anomalies"] = results["amount_anomalies"]
+        paths = []
+        for name, df in outputs.items():
+            path = write_table(df, os.path.join(directory, name), export_format)
+            print(f"Incremental results saved to {path}")
+            paths.append(path)
+        return paths
@@ -1,18 +1,64 @@
 import networkx as nx
+import numpy as np
 import pandas as pd
+from src.address_index import AddressIndex
+from src.sparse_graph import SparseGraph
+
+BACKENDS = ("networkx", "sparse")
 
 class NetworkAnalyzer:
-    def __init__(self, transactions: pd.DataFrame):
+    def __init__(self, transactions: pd.DataFrame, address_index: AddressIndex = None, backend="networkx"):
+        """Analyze the transaction graph.
+
+        Args:
+            backend: 'networkx' (DiGraph) or 'sparse' (CSR adjacency, scales to
+                tens of millions of edges); both return the same results.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported graph backend: {backend}")
         self.transactions = transactions
+        # Graph nodes are interned address ids; use address_index.decode() for strings
+        if address_index is None:
+            address_index = AddressIndex.from_transactions(transactions)
+        self.address_index = address_index
+        self.backend = backend
         self.graph = None
+        self.edges = None
         self.centrality = {}
+        # Columnar per-node results (node, degree, betweenness, hub), see centrality_table()
+        self.nodes = None
+        self.betweenness_info = None
+        # One row per transfer of each detected cycle, see find_cycles()
+        self.cycles = None
+        # Top exposed addresses per traced seed, see trace_funds()
+        self.fund_flows = None
 
-    def build_graph(self):
-        # Aggregate transactions: sum of amounts and count per (sender, recipient) pair
-        aggregated = self.transactions.groupby(['sender', 'recipient'], as_index=False).agg(
-            amount=('amount', 'sum'),
-            tx_count=('amount', 'count')
-        )
+    def build_graph(self, edges: pd.DataFrame = None):
+        """Build the graph from the transactions, or from pre-aggregated edges.
+
+        edges has the same sender, recipient (address ids), amount and
+        tx_count columns as self.edges, e.g. from
+        partitioned.PartitionedAggregator for inputs larger than memory.
+        """
+        if edges is not None:
+            aggregated = edges
+        else:
+            # Aggregate transactions: sum of amounts and count per (sender, recipient) id pair
+            sender_ids = self.address_index.sender_ids
+            recipient_ids = self.address_index.recipient_ids
+            valid = (sender_ids >= 0) & (recipient_ids >= 0)
+            aggregated = pd.DataFrame({
+                'sender': sender_ids[valid],
+                'recipient': recipient_ids[valid],
+                'amount': self.transactions['amount'].to_numpy()[valid]
+            }).groupby(['sender', 'recipient'], as_index=False).agg(
+                amount=('amount', 'sum'),
+                tx_count=('amount', 'count')
+            )
+        self.edges = aggregated
+        if self.backend == "sparse":
+            self.graph = SparseGraph.from_edges(aggregated)
+            return self.graph
         # Create a directed graph from the aggregated DataFrame
         self.graph = nx.from_pandas_edgelist(
             aggregated,
@@ -23,17 +69,21 @@ class NetworkAnalyzer:
         )
         return self.graph
 
-    def analyze_centrality(self, approximate=True, k=100):
+    def analyze_centrality(self, approximate=True, k=100, epsilon=None, time_budget=None, top_n=100, workers=1, seed=None):
+        """Compute degree and betweenness centrality.
+
+        Betweenness is estimated from k source pivots (all nodes if approximate is
+        False or the graph has at most k nodes). Passing epsilon and/or
+        time_budget keeps adding rounds of k pivots until the top_n ranking
+        stabilizes within epsilon or the budget (seconds) runs out; pivots are
+        spread over `workers` processes. Details land in self.betweenness_info.
+        """
         if self.graph is None:
             self.build_graph()
         # Compute degree centrality
-        degree_centrality = nx.degree_centrality(self.graph)
-        
-        # Compute betweenness centrality (approximate if specified and graph is large)
-        if approximate and len(self.graph) > k:
-            betweenness_centrality = nx.betweenness_centrality(self.graph, k=k, normalized=True)
-        else:
-            betweenness_centrality = nx.betweenness_centrality(self.graph, normalized=True)
+        degree_centrality = self._degree_centrality()
+        csr, betweenness = self._betweenness(approximate, k, epsilon, time_budget, top_n, workers, seed)
+        betweenness_centrality = csr.to_dict(betweenness)
         
         self.centrality = {
             "degree": degree_centrality,
@@ -41,6 +91,39 @@ class NetworkAnalyzer:
         }
         return self.centrality
 
+    def centrality_table(self, hub_threshold=0.1, approximate=True, k=100, epsilon=None, time_budget=None,
+                         top_n=100, workers=1, seed=None) -> pd.DataFrame:
+        """Degree, betweenness and hub flag for every node as one columnar table.
+
+        Same values as analyze_centrality() and get_hubs(), computed as arrays
+        over the CSR adjacency without building per-node dicts. Nodes are
+        address ids, in ascending order.
+        """
+        if self.graph is None:
+            self.build_graph()
+        csr, betweenness = self._betweenness(approximate, k, epsilon, time_budget, top_n, workers, seed)
+        degree = csr.degree_centrality()
+        self.nodes = pd.DataFrame({
+            "node": csr.nodes,
+            "degree": degree,
+            "betweenness": betweenness,
+            "hub": degree >= hub_threshold
+        })
+        return self.nodes
+
+    def _csr(self):
+        return self.graph if self.backend == "sparse" else SparseGraph.from_edges(self.edges)
+
+    def _betweenness(self, approximate, k, epsilon, time_budget, top_n, workers, seed):
+        # Betweenness runs on CSR adjacency for both backends
+        csr = self._csr()
+        betweenness = csr.betweenness(
+            k=k if approximate else None, epsilon=epsilon, time_budget=time_budget,
+            top_n=top_n, workers=workers, seed=seed, normalized=True
+        )
+        self.betweenness_info = csr.betweenness_info
+        return csr, betweenness
+
     def get_hubs(self, threshold=0.1):
         # Use cached degree centrality if available
         if "degree" in self.centrality:
@@ -48,8 +131,114 @@ class NetworkAnalyzer:
         else:
             if self.graph is None:
                 self.build_graph()
-            degree_centrality = nx.degree_centrality(self.graph)
+            degree_centrality = self._degree_centrality()
             self.centrality["degree"] = degree_centrality
         
         hubs = {node: cent for node, cent in degree_centrality.items() if cent >= threshold}
-        return hubs
\ No newline at end of file
+        return hubs
+
+    def connected_components(self):
+        """Return a dict mapping each node to its weakly connected component label."""
+        if self.graph is None:
+            self.build_graph()
+        if self.backend == "sparse":
+            _, labels = self.graph.connected_components(connection="weak")
+            return self.graph.to_dict(labels)
+        labels = {}
+        for label, component in enumerate(nx.weakly_connected_components(self.graph)):
+            labels.update(dict.fromkeys(component, label))
+        return labels
+
+    def pagerank(self, alpha=0.85):
+        if self.graph is None:
+            self.build_graph()
+        if self.backend == "sparse":
+            return self.graph.to_dict(self.graph.pagerank(alpha=alpha))
+        return nx.pagerank(self.graph, alpha=alpha)
+
+    def find_cycles(self, max_length=4, tolerance=0.1, max_span=None, workers=1) -> pd.DataFrame:
+        """Temporal cycles and round trips: chains of 2..max_length transfers returning to the first sender.
+
+        Works on individual transfers rather than the aggregated graph. Heights
+        must increase along the chain, every amount must be within `tolerance`
+        (relative) of the first, and with max_span the chain must complete
+        within that many blocks; see cycles.TransferIndex.search. Start
+        transfers are searched by `workers` processes.
+
+        Returns one row per transfer: cycle, length, hop, source, target
+        (address ids), amount, height, plus tx_hash when present.
+        """
+        from src.cycles import find_cycles
+        rows, lengths = find_cycles(
+            self.address_index.sender_ids, self.address_index.recipient_ids,
+            self.transactions["amount"].to_numpy(dtype=np.float64),
+            self.transactions["height"].to_numpy(dtype=np.float64),
+            max_length=max_length, tolerance=tolerance, max_span=max_span, workers=workers
+        )
+        cycle, hop = np.nonzero(rows >= 0)
+        transfer = rows[cycle, hop]
+        columns = {
+            "cycle": cycle,
+            "length": lengths[cycle],
+            "hop": hop,
+            "source": self.address_index.sender_ids[transfer],
+            "target": self.address_index.recipient_ids[transfer],
+            "amount": self.transactions["amount"].to_numpy()[transfer],
+            "height": self.transactions["height"].to_numpy()[transfer],
+        }
+        if "tx_hash" in self.transactions.columns:
+            columns["tx_hash"] = self.transactions["tx_hash"].to_numpy()[transfer]
+        self.cycles = pd.DataFrame(columns)
+        return self.cycles
+
+    def trace_funds(self, seeds, hops=3, threshold=1e-4, top_n=10, block_size=None) -> pd.DataFrame:
+        """Top addresses exposed to each seed's funds within `hops` hops, weighted by amount shares.
+
+        The aggregated edges become a row-normalized transition matrix once
+        (amount sent on an edge / the sender's total outflow). All seeds are
+        then propagated together, see taint.propagate_taint. Seeds that never
+        appear in the graph are skipped.
+
+        Returns one row per (seed, exposed address): seed, rank, address
+        (address ids), exposure (fraction of the seed's funds received) and
+        hop (first hop at which the address was reached).
+        """
+        from src.taint import propagate_taint
+        if self.graph is None:
+            self.build_graph()
+        csr = self._csr()
+        seeds = np.unique(np.asarray(seeds))
+        local = np.searchsorted(csr.nodes, seeds)
+        present = local < len(csr.nodes)
+        present[present] = csr.nodes[local[present]] == seeds[present]
+        seed, address, exposure, hop = propagate_taint(csr.transition_matrix("amount"), local[present], hops=hops,
+                                                       threshold=threshold, top_n=top_n, block_size=block_size)
+        rank = np.arange(len(seed)) - np.searchsorted(seed, seed) if len(seed) else seed
+        self.fund_flows = pd.DataFrame({
+            "seed": csr.nodes[seed],
+            "rank": rank + 1,
+            "address": csr.nodes[address],
+            "exposure": exposure,
+            "hop": hop
+        })
+        return self.fund_flows
+
+    def _degree_centrality(self):
+        if self.backend == "sparse":
+            return self.graph.to_dict(self.graph.degree_centrality())
+        return nx.degree_centrality(self.graph)
+
+def top_n_indices(values, n, tiebreak=None) -> np.ndarray:
+    """Positions of the n largest values in descending order, ties broken by a second key.
+
+    Uses argpartition to find the cut-off so only the candidates at or above it
+    are sorted, instead of sorting the whole array.
+    """
+    values = np.asarray(values)
+    n = min(n, len(values))
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    cutoff = values[np.argpartition(values, len(values) - n)[len(values) - n:]].min()
+    candidates = np.flatnonzero(values >= cutoff)
+    keys = (-values[candidates],) if tiebreak is None else (-np.asarray(tiebreak)[candidates], -values[candidates])
+    return candidates[np.lexsort(keys)[:n]]
@@ -0,0 +1,247 @@
+import math
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+from src.data_loader import DataLoader
+
+# Parsing a chunk of JSON lines briefly needs over ten times its size in Python objects (line strings, dicts)
+PARSE_EXPANSION = 16
+# Aggregating a partition needs about this many bytes per byte of JSON input it came from
+# (two spilled records per transfer, the groupby and the per-partition address dictionary)
+AGGREGATE_EXPANSION = 2.0
+# Address strings are hashed with this key, so a partition's addresses do not depend on the chunk they came from
+HASH_KEY = "blockchainanalyz"
+
+class PartitionedAggregator:
+    """Out-of-core edge and address-feature aggregation for inputs larger than memory.
+
+    The input is streamed in chunks. Each transfer is spilled to local disk
+    twice: as a sent record in the partition of its sender's address hash and
+    as a received record in the partition of its recipient's. Every address
+    therefore has all of its records, and every (sender, recipient) edge all
+    of its transfers, in exactly one partition. Partitions are aggregated
+    independently (in `workers` processes) and the per-partition edge and
+    feature tables are concatenated.
+
+    Chunk size and partition count are derived from memory_budget (bytes)
+    and the input size, so parsing a chunk or aggregating `workers`
+    partitions at once stays within the budget. The merged tables are
+    results and held in memory; with heavy skew (one address in a large
+    share of all transfers) its partition can exceed the estimate.
+
+    Results match ClusteringAnalyzer.compute_address_features and
+    NetworkAnalyzer.build_graph on the fully loaded input, with ids from an
+    AddressIndex over the sorted address strings (as the loader builds it).
+    That index has no per-transfer ids, since no transfer table is kept.
+    """
+
+    def __init__(self, file_path: str, memory_budget: int = 1024 ** 3, spill_dir: str = None, partitions: int = None,
+                 workers: int = 1, extended: bool = False):
+        self.file_path = file_path
+        self.memory_budget = memory_budget
+        # Spill files go to a temporary directory under spill_dir (system temp by default), removed afterwards
+        self.spill_dir = spill_dir
+        self.workers = workers
+        self.extended = extended
+        size = os.path.getsize(file_path)
+        self.chunk_size = max(1024 * 1024, memory_budget // PARSE_EXPANSION)
+        self.partitions = partitions or max(workers, math.ceil(size * AGGREGATE_EXPANSION * workers / memory_budget))
+        self.address_index = None
+        self.edges = None
+        self.address_features = None
+        self.stats = {}
+
+    def run(self):
+        """Spill, aggregate and merge; returns (address_index, edges, address_features)."""
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+        directory = tempfile.mkdtemp(prefix="partitions-", dir=self.spill_dir)
+        try:
+            paths, has_height = self._spill(directory)
+            self.stats["spill_bytes"] = sum(os.path.getsize(path) for path in paths)
+            args = [(path, has_height, self.extended) for path in paths]
+            if self.workers > 1:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    results = list(pool.map(_aggregate_partition, *zip(*args)))
+            else:
+                results = [_aggregate_partition(*arg) for arg in args]
+            self._merge(results)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return self.address_index, self.edges, self.address_features
+
+    def _spill(self, directory):
+        paths = [os.path.join(directory, f"part-{p:05d}.pkl") for p in range(self.partitions)]
+        files = [open(path, "wb") for path in paths]
+        rows = chunks = 0
+        has_height = False
+        try:
+            loader = DataLoader(self.file_path, chunk_size=self.chunk_size)
+            for chunk in loader.iter_chunks():
+                rows += len(chunk)
+                chunks += 1
+                has_height = has_height or "height" in chunk.columns
+                for p, frames in enumerate(self._split(chunk)):
+                    frames = [frame for frame in frames if len(frame)]
+                    if frames:
+                        pickle.dump(frames, files[p], protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for f in files:
+                f.close()
+        if not rows:
+            raise ValueError("No valid data found in the file.")
+        self.stats.update(rows=rows, chunks=chunks, partitions=self.partitions)
+        return paths, has_height
+
+    def _split(self, chunk: pd.DataFrame):
+        """Frames of sent and received records for each partition, each in input order."""
+        sender = chunk["sender"].astype("category").array
+        recipient = chunk["recipient"].astype("category").array
+        amount = chunk["amount"].to_numpy(dtype=np.float64)
+        height = chunk["height"].to_numpy(dtype=np.float64) if "height" in chunk.columns else None
+        sides = []
+        for address, counterparty, sent in ((sender, recipient, True), (recipient, sender, False)):
+            hashes = pd.util.hash_array(address.categories.to_numpy(dtype=object), hash_key=HASH_KEY)
+            partition = np.where(address.codes >= 0, hashes[address.codes] % self.partitions, -1).astype(np.int64)
+            # Rows grouped by partition (stable, so input order is kept); null addresses sort first and are skipped
+            order = np.argsort(partition, kind="stable")
+            bounds = np.searchsorted(partition[order], np.arange(self.partitions + 1))
+            sides.append((address, counterparty, sent, order, bounds))
+        for p in range(self.partitions):
+            frames = []
+            for address, counterparty, sent, order, bounds in sides:
+                rows = order[bounds[p]:bounds[p + 1]]
+                records = {
+                    "address": _subset(address, rows),
+                    "counterparty": _subset(counterparty, rows),
+                    "amount": amount[rows],
+                    "sent": np.full(len(rows), sent),
+                }
+                if height is not None:
+                    records["height"] = height[rows]
+                frames.append(pd.DataFrame(records))
+            yield frames
+
+    def _merge(self, results):
+        """Concatenate per-partition tables and re-key them by one sorted address dictionary.
+
+        Each partition owns a disjoint set of addresses, so the dictionary is
+        the sorted union of the feature tables' addresses. Edge tables are
+        read back from disk one partition at a time.
+        """
+        results = [result for result in results if result is not None]
+        addresses = pd.Index(np.sort(np.concatenate(
+            [features["address"].to_numpy(dtype=object) for _, features in results])))
+        edges, features = [], []
+        for edges_path, partition_features in results:
+            with open(edges_path, "rb") as f:
+                partition_edges = pickle.load(f)
+            os.remove(edges_path)
+            columns = {}
+            for name in ("sender", "recipient"):
+                values = partition_edges[name].array
+                columns[name] = addresses.get_indexer(values.categories).astype(np.int32).take(values.codes)
+            edges.append(pd.DataFrame({**columns, "amount": partition_edges["amount"].to_numpy(),
+                                       "tx_count": partition_edges["tx_count"].to_numpy()}))
+            values = partition_features["address"].array
+            ids = addresses.get_indexer(values.categories).astype(np.int32).take(values.codes)
+            features.append(partition_features.assign(address=ids))
+        edges = pd.concat(edges, ignore_index=True)
+        edges = edges.iloc[np.lexsort((edges["recipient"].to_numpy(), edges["sender"].to_numpy()))]
+        features = pd.concat(features, ignore_index=True)
+        features = features.iloc[np.argsort(features["address"].to_numpy(), kind="stable")].reset_index(drop=True)
+        empty = np.zeros(0, dtype=np.int32)
+        self.address_index = AddressIndex(addresses, empty, empty)
+        features["address"] = self.address_index.as_categorical(features["address"].to_numpy())
+        self.edges = edges.reset_index(drop=True)
+        self.address_features = features
+
+def _subset(values: pd.Categorical, rows) -> pd.Categorical:
+    """values[rows] with only the categories it uses, so spilled records carry few address strings."""
+    used, codes = np.unique(values.codes[rows], return_inverse=True)
+    if len(used) and used[0] < 0:
+        # Missing addresses (code -1) sort first; shift them back to -1
+        used, codes = used[1:], codes - 1
+    return pd.Categorical.from_codes(codes, categories=values.categories[used])
+
+def _read_partition(path):
+    frames = []
+    with open(path, "rb") as f:
+        while True:
+            try:
+                frames.extend(pickle.load(f))
+            except EOFError:
+                break
+    return frames
+
+def _aggregate_partition(path, has_height, extended):
+    """Process pool entry point: edge and feature tables of the addresses hashed to one partition.
+
+    The edge table is written next to the spill file (its counterparty
+    strings would otherwise pile up in the parent) and its path is returned
+    with the feature table: (edges_path, features), or None for an empty
+    partition. Addresses are categoricals over partition-local dictionaries;
+    PartitionedAggregator._merge maps them to global ids.
+    """
+    frames = _read_partition(path)
+    if not frames:
+        return None
+    # One dictionary for owned addresses and counterparties, built from the per-chunk categories
+    both = pd.api.types.union_categoricals([f["address"] for f in frames] + [f["counterparty"] for f in frames])
+    categories = both.categories
+    codes = both.codes.astype(np.int64)
+    rows = sum(len(f) for f in frames)
+    a, c = codes[:rows], codes[rows:]
+    raw_amount = np.concatenate([f["amount"].to_numpy() for f in frames])
+    sent = np.concatenate([f["sent"].to_numpy() for f in frames])
+    n = len(categories)
+    has_amount = ~np.isnan(raw_amount)
+    amount = np.where(has_amount, raw_amount, 0.0)
+
+    # Edges: all transfers of a sender are sent records here, in input order
+    out = sent & (c >= 0)
+    edges = pd.DataFrame({"sender": a[out], "recipient": c[out], "amount": raw_amount[out]}
+                         ).groupby(["sender", "recipient"], as_index=False).agg(amount=("amount", "sum"),
+                                                                                tx_count=("amount", "count"))
+    edges["sender"] = pd.Categorical.from_codes(edges["sender"].to_numpy(), categories=categories)
+    edges["recipient"] = pd.Categorical.from_codes(edges["recipient"].to_numpy(), categories=categories)
+
+    received = ~sent
+    columns = {
+        "sent_count": np.bincount(a[sent], weights=has_amount[sent], minlength=n).astype(np.int64),
+        "sent_total": np.bincount(a[sent], weights=amount[sent], minlength=n),
+        "received_count": np.bincount(a[received], weights=has_amount[received], minlength=n).astype(np.int64),
+        "received_total": np.bincount(a[received], weights=amount[received], minlength=n),
+    }
+    if extended:
+        if has_height:
+            height = np.concatenate([f["height"].to_numpy() if "height" in f else np.full(len(f), np.nan)
+                                     for f in frames])
+            known = ~np.isnan(height)
+            first = np.full(n, np.inf)
+            last = np.full(n, -np.inf)
+            np.minimum.at(first, a[known], height[known])
+            np.maximum.at(last, a[known], height[known])
+            first[np.isinf(first)] = np.nan
+            last[np.isinf(last)] = np.nan
+            columns.update(first_height=first, last_height=last, active_span=last - first)
+        # Counterparties in either direction: sent records hold a -> c, received records c -> a
+        pairs = np.unique(a[c >= 0] * n + c[c >= 0])
+        columns["unique_counterparties"] = np.bincount(pairs // n, minlength=n)
+        max_transfer = np.full(n, -np.inf)
+        np.maximum.at(max_transfer, a[has_amount], amount[has_amount])
+        max_transfer[np.isinf(max_transfer)] = np.nan
+        columns["max_transfer"] = max_transfer
+
+    owned = np.unique(a)
+    features = pd.DataFrame({name: values[owned] for name, values in columns.items()})
+    features.insert(0, "address", pd.Categorical.from_codes(np.arange(len(owned)), categories=categories[owned]))
+    edges_path = path + ".edges"
+    with open(edges_path, "wb") as f:
+        pickle.dump(edges, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return edges_path, features
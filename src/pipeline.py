@@ -0,0 +1,228 @@
+import gc
+import pickle
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from multiprocessing.util import Finalize
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+from src.profiling import Profiler, active_profiler, profile_step
+
+@dataclass
+class Stage:
+    """A pipeline step: calls analyzer.<method>() once all inputs are available."""
+    name: str
+    method: str
+    inputs: tuple
+    outputs: tuple
+
+class SharedTransactions:
+    """Publishes a transactions frame's columns in shared memory for worker processes.
+
+    Numeric columns, categorical/factorized codes and their string category
+    dictionaries (UTF-8 bytes plus offsets) are copied once into SharedMemory
+    blocks; only the small spec of block names and dtypes is pickled to workers.
+    """
+
+    def __init__(self, transactions: pd.DataFrame):
+        self.blocks = []
+        self.spec = {"rows": len(transactions), "columns": []}
+        for name in transactions.columns:
+            series = transactions[name]
+            categories = None
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                values, categories, kind = series.cat.codes.to_numpy(), series.cat.categories, "categorical"
+            elif series.dtype.kind in "biuf":
+                values, kind = series.to_numpy(), "numeric"
+            else:
+                values, categories = pd.factorize(series)
+                kind = "object"
+            self.spec["columns"].append({
+                "name": name, "kind": kind, "block": self._share(values), "dtype": values.dtype.str,
+                "categories": None if categories is None else self._share_categories(categories)
+            })
+
+    def _share(self, values: np.ndarray) -> str:
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        self.blocks.append(block)
+        return block.name
+
+    def _share_categories(self, categories: pd.Index) -> dict:
+        if pd.api.types.infer_dtype(categories, skipna=False) not in ("string", "empty"):
+            # Non-string dictionaries (e.g. integer categories) are pickled as they are
+            return {"values": categories}
+        encoded = [value.encode() for value in categories]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return {"data": self._share(np.frombuffer(b"".join(encoded), dtype=np.uint8)),
+                "offsets": self._share(offsets), "count": len(encoded)}
+
+    def close(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def _attach_categories(spec: dict) -> pd.Index:
+    """Decode a shared category dictionary; its blocks are closed once the strings are copied out."""
+    if "values" in spec:
+        return spec["values"]
+    data_block = shared_memory.SharedMemory(name=spec["data"])
+    offsets_block = shared_memory.SharedMemory(name=spec["offsets"])
+    try:
+        offsets = np.ndarray((spec["count"] + 1,), dtype=np.int64, buffer=offsets_block.buf).tolist()
+        data = bytes(data_block.buf[:offsets[-1]])
+    finally:
+        data_block.close()
+        offsets_block.close()
+    return pd.Index([data[a:b].decode() for a, b in zip(offsets[:-1], offsets[1:])], dtype=object)
+
+def attach_transactions(spec):
+    """Rebuild a transactions frame backed by the shared memory blocks in spec."""
+    blocks, columns = [], {}
+    for col in spec["columns"]:
+        block = shared_memory.SharedMemory(name=col["block"])
+        blocks.append(block)
+        values = np.ndarray((spec["rows"],), dtype=np.dtype(col["dtype"]), buffer=block.buf)
+        if col["kind"] == "categorical":
+            values = pd.Categorical.from_codes(values, categories=_attach_categories(col["categories"]))
+        elif col["kind"] == "object":
+            # Missing values were factorized to -1, which takes the trailing None
+            categories = np.append(np.asarray(_attach_categories(col["categories"]), dtype=object), None)
+            values = categories.take(values)
+        columns[col["name"]] = values
+    return pd.DataFrame(columns, copy=False), blocks
+
+# Per-worker analyzer shell whose transactions live in shared memory
+_worker = {}
+
+def _init_worker(analyzer_bytes, spec):
+    analyzer = pickle.loads(analyzer_bytes)
+    analyzer.transactions, _worker["blocks"] = attach_transactions(spec)
+    analyzer.address_index = AddressIndex.from_transactions(analyzer.transactions)
+    _worker["analyzer"] = analyzer
+    # Worker processes outlive single stages, so their mappings are released when the pool shuts them down
+    Finalize(None, _close_worker, exitpriority=0)
+
+def _close_worker():
+    """Drop the worker's analyzer and close its shared memory handles (the parent unlinks them)."""
+    _worker.pop("analyzer", None)
+    gc.collect()
+    for block in _worker.pop("blocks", []):
+        block.close()
+
+def _run_stage(stage: Stage, inputs=None):
+    # Outputs of earlier stages arrive with the stage; the initial inputs are already in the worker
+    analyzer = _worker["analyzer"]
+    for name, value in (inputs or {}).items():
+        setattr(analyzer, name, value)
+    # Workers collect their own profile records and ship them back with the outputs
+    profiler = Profiler()
+    with profiler.activate():
+        outputs, seconds = _execute(analyzer, stage)
+    return outputs, seconds, profiler.records
+
+def _execute(analyzer, stage: Stage):
+    start = time.perf_counter()
+    with profile_step(stage.name):
+        getattr(analyzer, stage.method)()
+    return {name: getattr(analyzer, name) for name in stage.outputs}, time.perf_counter() - start
+
+class Pipeline:
+    """Runs stages as soon as their inputs exist, in parallel worker processes when workers > 1.
+
+    Results are written back onto the analyzer as the attributes named in each
+    stage's outputs. run() returns a report with per-stage wall time and the
+    critical path through the stage dependency graph.
+    """
+
+    def __init__(self, stages, workers: int = 1):
+        self.stages = list(stages)
+        self.workers = workers
+
+    def run(self, analyzer, available=("transactions", "address_index")):
+        available = set(available)
+        pending = list(self.stages)
+        report = {"stages": {}}
+        start = time.perf_counter()
+        if self.workers > 1:
+            self._run_parallel(analyzer, pending, available, report, start)
+        else:
+            while pending:
+                stage = self._next_ready(pending, available)
+                stage_start = time.perf_counter() - start
+                outputs, seconds = _execute(analyzer, stage)
+                self._finish(stage, outputs, seconds, stage_start, analyzer, available, report, start)
+        report["wall_seconds"] = time.perf_counter() - start
+        report["critical_path"], report["critical_path_seconds"] = self._critical_path(report["stages"])
+        return report
+
+    def _run_parallel(self, analyzer, pending, available, report, start):
+        initial = set(available)
+        shared = SharedTransactions(analyzer.transactions)
+        # Pickle the analyzer without its large inputs; workers rebuild them from shared memory
+        transactions, address_index = analyzer.transactions, analyzer.address_index
+        analyzer.transactions, analyzer.address_index = None, None
+        try:
+            analyzer_bytes = pickle.dumps(analyzer)
+        finally:
+            analyzer.transactions, analyzer.address_index = transactions, address_index
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)), initializer=_init_worker,
+                                     initargs=(analyzer_bytes, shared.spec)) as pool:
+                running = {}
+                while pending or running:
+                    while pending and any(set(s.inputs) <= available for s in pending):
+                        stage = self._next_ready(pending, available)
+                        inputs = {name: getattr(analyzer, name) for name in stage.inputs if name not in initial}
+                        running[pool.submit(_run_stage, stage, inputs)] = (stage, time.perf_counter() - start)
+                    if not running:
+                        raise ValueError(f"Unsatisfiable stage inputs: {[s.name for s in pending]}")
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, stage_start = running.pop(future)
+                        outputs, seconds, records = future.result()
+                        if active_profiler() is not None:
+                            active_profiler().extend(records)
+                        self._finish(stage, outputs, seconds, stage_start, analyzer, available, report, start)
+        finally:
+            shared.close()
+
+    @staticmethod
+    def _next_ready(pending, available):
+        for stage in pending:
+            if set(stage.inputs) <= available:
+                pending.remove(stage)
+                return stage
+        raise ValueError(f"Unsatisfiable stage inputs: {[s.name for s in pending]}")
+
+    @staticmethod
+    def _finish(stage, outputs, seconds, stage_start, analyzer, available, report, start):
+        for name, value in outputs.items():
+            setattr(analyzer, name, value)
+        available.update(stage.outputs)
+        report["stages"][stage.name] = {
+            "seconds": seconds,
+            "start": stage_start,
+            "end": time.perf_counter() - start,
+        }
+
+    def _critical_path(self, timings):
+        """Longest chain of dependent stages, weighted by each stage's own run time."""
+        producers = {out: s for s in self.stages for out in s.outputs}
+        best = {}
+
+        def longest(stage):
+            if stage.name not in best:
+                parents = [producers[i] for i in stage.inputs if i in producers]
+                chains = [longest(p) for p in parents]
+                seconds, path = max(chains, default=(0.0, []), key=lambda c: c[0])
+                best[stage.name] = (seconds + timings[stage.name]["seconds"], path + [stage.name])
+            return best[stage.name]
+
+        seconds, path = max((longest(s) for s in self.stages if s.name in timings), default=(0.0, []),
+                            key=lambda c: c[0])
+        return path, seconds
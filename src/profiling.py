@@ -0,0 +1,171 @@
+import cProfile
+import functools
+import json
+import os
+import platform
+import resource
+import shutil
+import signal
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Profiler collecting profile_step() records in this process, if any
+_active = None
+
+def _status_mb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise KeyError(field)
+
+def reset_peak_rss() -> bool:
+    """Reset the RSS high-water mark to the current RSS; returns False where unsupported (non-Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def current_rss_mb() -> float:
+    try:
+        return _status_mb("VmRSS")
+    except (OSError, KeyError):
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    """Peak RSS since the last reset_peak_rss() (Linux), otherwise since process start."""
+    try:
+        return _status_mb("VmHWM")
+    except (OSError, KeyError):
+        # ru_maxrss is reported in KiB on Linux and bytes on macOS
+        scale = 1024 * 1024 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+class Profiler:
+    """Records wall time, CPU time, peak RSS and rows processed for named, possibly nested, steps.
+
+    Activate it to make profile_step() and @profiled record into it. Steps
+    named in `capture` are additionally profiled with cProfile (a .prof file
+    for pstats/snakeviz) or, with tool='py-spy', recorded by an attached
+    py-spy process (a flame graph SVG). Outputs go to output_dir.
+    """
+
+    def __init__(self, capture=(), tool="cprofile", output_dir="data/final/profiles"):
+        if tool not in ("cprofile", "py-spy"):
+            raise ValueError(f"Unsupported profiler: {tool}")
+        self.capture = set(capture or ())
+        self.tool = tool
+        self.output_dir = output_dir
+        self.records = []
+        self.started = datetime.now(timezone.utc)
+        self._stack = []
+
+    @contextmanager
+    def activate(self):
+        global _active
+        previous, _active = _active, self
+        try:
+            yield self
+        finally:
+            _active = previous
+
+    @contextmanager
+    def step(self, name, rows=None):
+        """Time a step; the yielded record's "rows" may be filled in inside the block."""
+        record = {"name": name, "parent": self._stack[-1]["name"] if self._stack else None, "rows": rows}
+        if self._stack:
+            # Fold the parent's peak so far in before resetting the high-water mark
+            self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], peak_rss_mb())
+        record["peak_rss_scope"] = "step" if reset_peak_rss() else "process"
+        record["rss_start_mb"] = current_rss_mb()
+        record["_peak"] = record["rss_start_mb"]
+        self._stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            with self._capture(name):
+                yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["peak_rss_mb"] = max(record.pop("_peak"), peak_rss_mb())
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]["_peak"] = max(self._stack[-1]["_peak"], record["peak_rss_mb"])
+            if record["rows"] is not None and record["wall_seconds"] > 0:
+                record["rows_per_sec"] = record["rows"] / record["wall_seconds"]
+            self.records.append(record)
+
+    @contextmanager
+    def _capture(self, name):
+        if name not in self.capture:
+            yield
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.tool == "cprofile":
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.output_dir, f"{name}.prof"))
+            return
+        executable = shutil.which("py-spy")
+        if executable is None:
+            raise RuntimeError("py-spy is not installed (pip install py-spy)")
+        recorder = subprocess.Popen([executable, "record", "--pid", str(os.getpid()), "--output",
+                                     os.path.join(self.output_dir, f"{name}.svg")])
+        try:
+            yield
+        finally:
+            # py-spy writes its output when interrupted
+            recorder.send_signal(signal.SIGINT)
+            recorder.wait()
+
+    def extend(self, records, parent=None):
+        """Add records collected elsewhere (e.g. by a worker process)."""
+        for record in records:
+            self.records.append(dict(record, parent=record["parent"] or parent))
+
+    def to_dict(self, **extra) -> dict:
+        return {
+            "started": self.started.isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_mb": max((r["peak_rss_mb"] for r in self.records), default=peak_rss_mb()),
+            "steps": self.records,
+            **extra,
+        }
+
+    def write_json(self, path, **extra) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(**extra), f, indent=2, default=str)
+        return path
+
+def active_profiler():
+    return _active
+
+@contextmanager
+def profile_step(name, rows=None):
+    """Record a step in the active profiler; a no-op yielding a scratch record when none is active."""
+    if _active is None:
+        yield {"name": name, "rows": rows}
+        return
+    with _active.step(name, rows) as record:
+        yield record
+
+def profiled(name):
+    """Decorator form of profile_step."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profile_step(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
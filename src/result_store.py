@@ -0,0 +1,307 @@
+"""Per-address analysis results in one indexed SQLite file, with a lookup API, CLI and HTTP endpoint.
+
+Usage: python -m src.result_store data/final/results.sqlite lookup ADDRESS [ADDRESS ...] [--edges]
+       python -m src.result_store data/final/results.sqlite serve --port 8000
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+
+# Result columns of the addresses table, in order; NULL where the stage producing them did not run
+COLUMNS = {
+    "cluster": "INTEGER",
+    "sent_count": "INTEGER",
+    "sent_total": "REAL",
+    "received_count": "INTEGER",
+    "received_total": "REAL",
+    "amount_anomalies": "INTEGER",
+    "max_anomalous_amount": "REAL",
+    "activity_anomaly": "INTEGER",
+    "spikes": "INTEGER",
+    "max_spike_score": "REAL",
+    "degree": "REAL",
+    "betweenness": "REAL",
+    "hub": "INTEGER",
+    "edge_offset": "INTEGER",
+    "out_edges": "INTEGER",
+}
+# Bound parameters per IN (...) query in batch lookups
+BATCH_SIZE = 500
+# Bytes of the file SQLite may memory-map for reads
+MMAP_SIZE = 1 << 30
+# Most edges one HTTP /edges request returns; larger limits are capped
+MAX_EDGE_LIMIT = 10_000
+
+def build_result_store(path: str, address_index: AddressIndex, clusters: pd.DataFrame = None,
+                       anomalies: dict = None, nodes: pd.DataFrame = None, edges: pd.DataFrame = None) -> str:
+    """Write the per-address results of a run to an SQLite file at path, replacing any earlier one.
+
+    Args:
+        clusters: clustering results (address, features, cluster)
+        anomalies: raw anomaly results (amount_anomalies, activity_anomalies, activity_spikes)
+        nodes: network centrality table (node, degree, betweenness, hub)
+        edges: aggregated edge table (sender, recipient, amount, tx_count), sorted by sender
+
+    One row per address in the index, keyed by the address string. Edges
+    are stored in sender order, so an address's outgoing edges are the
+    out_edges rows starting at rowid edge_offset + 1; incoming edges are
+    found through an index on the target.
+    """
+    n = len(address_index)
+    columns = {name: np.full(n, None, dtype=object) for name in COLUMNS}
+    if clusters is not None:
+        ids = _ids(address_index, clusters["address"])
+        for name in ("cluster", "sent_count", "sent_total", "received_count", "received_total"):
+            if name in clusters:
+                columns[name][ids] = clusters[name].tolist()
+    if anomalies is not None:
+        _anomaly_columns(columns, address_index, anomalies)
+    if nodes is not None:
+        ids = nodes["node"].to_numpy()
+        for name in ("degree", "betweenness", "hub"):
+            columns[name][ids] = nodes[name].tolist()
+    if edges is not None:
+        senders = edges["sender"].to_numpy()
+        if len(senders) and (np.diff(senders) < 0).any():
+            raise ValueError("edges must be sorted by sender")
+        out_edges = np.bincount(senders, minlength=n)
+        columns["edge_offset"][:] = (np.cumsum(out_edges) - out_edges).tolist()
+        columns["out_edges"][:] = out_edges.tolist()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.execute("CREATE TABLE addresses (address TEXT PRIMARY KEY, id INTEGER NOT NULL, "
+                   + ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items()) + ") WITHOUT ROWID")
+        db.executemany(f"INSERT INTO addresses VALUES ({', '.join('?' * (len(COLUMNS) + 2))})",
+                       zip(address_index.addresses.astype(str), range(n), *columns.values()))
+        db.execute("CREATE UNIQUE INDEX addresses_id ON addresses (id)")
+        db.execute("CREATE TABLE edges (source INTEGER NOT NULL, target INTEGER NOT NULL, amount REAL, "
+                   "tx_count INTEGER)")
+        if edges is not None:
+            db.executemany("INSERT INTO edges VALUES (?, ?, ?, ?)",
+                           zip(edges["sender"].tolist(), edges["recipient"].tolist(), edges["amount"].tolist(),
+                               edges["tx_count"].tolist()))
+        db.execute("CREATE INDEX edges_target ON edges (target)")
+        db.commit()
+    finally:
+        db.close()
+    os.replace(tmp_path, path)
+    return path
+
+def _ids(address_index: AddressIndex, column) -> np.ndarray:
+    """Address ids of a result column (categorical over the index, or address strings)."""
+    values = column.array if isinstance(column.dtype, pd.CategoricalDtype) else None
+    if values is not None and values.categories.equals(address_index.addresses):
+        return values.codes.astype(np.int64)
+    return address_index.encode(np.asarray(column, dtype=object)).astype(np.int64)
+
+def _anomaly_columns(columns, address_index, anomalies):
+    n = len(address_index)
+    amount = anomalies.get("amount_anomalies")
+    if amount is not None:
+        flagged = np.zeros(n, dtype=np.int64)
+        largest = np.full(n, np.nan)
+        for side in ("sender", "recipient"):
+            ids = _ids(address_index, amount[side])
+            known = ids >= 0
+            flagged += np.bincount(ids[known], minlength=n)
+            np.fmax.at(largest, ids[known], amount["amount"].to_numpy(dtype=np.float64)[known])
+        columns["amount_anomalies"][:] = flagged.tolist()
+        columns["max_anomalous_amount"][:] = [None if math.isnan(x) else x for x in largest.tolist()]
+    activity = anomalies.get("activity_anomalies")
+    if activity is not None:
+        flag = np.zeros(n, dtype=np.int64)
+        ids = _ids(address_index, activity["sender"])
+        flag[ids[ids >= 0]] = 1
+        columns["activity_anomaly"][:] = flag.tolist()
+    spikes = anomalies.get("activity_spikes")
+    if spikes is not None:
+        ids = _ids(address_index, spikes["address"])
+        columns["spikes"][:] = np.bincount(ids, minlength=n).tolist()
+        score = np.full(n, np.nan)
+        np.fmax.at(score, ids, spikes["score"].to_numpy(dtype=np.float64))
+        columns["max_spike_score"][:] = [None if math.isnan(x) else x for x in score.tolist()]
+
+class ResultStore:
+    """Read-only lookups of per-address results written by build_result_store.
+
+    Single lookups are one primary-key probe; batches are IN (...) queries
+    of up to BATCH_SIZE addresses. The connection memory-maps the file, so
+    repeated lookups are served from the page cache.
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No result store at {path}")
+        self.path = path
+        # Read-only, so the connection may be handed to the HTTP server's thread
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.db.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self.db.row_factory = sqlite3.Row
+        self.columns = ["address", "id"] + list(COLUMNS)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, address: str):
+        """Results for one address as a dict, or None if the address is unknown."""
+        row = self.db.execute("SELECT * FROM addresses WHERE address = ?", (address,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def lookup_many(self, addresses) -> pd.DataFrame:
+        """Results for many addresses, one row per input address in input order (missing values for unknown ones)."""
+        addresses = [str(address) for address in addresses]
+        unique = list(dict.fromkeys(addresses))
+        rows = []
+        for start in range(0, len(unique), BATCH_SIZE):
+            batch = unique[start:start + BATCH_SIZE]
+            rows += self.db.execute(f"SELECT * FROM addresses WHERE address IN ({', '.join('?' * len(batch))})",
+                                    batch).fetchall()
+        found = pd.DataFrame([tuple(row) for row in rows], columns=self.columns).set_index("address")
+        # Nullable integers, so unknown addresses do not turn counts and flags into floats
+        integers = {name: "Int64" for name, kind in (("id", "INTEGER"), *COLUMNS.items()) if kind == "INTEGER"}
+        return found.reindex(addresses).astype(integers).reset_index()
+
+    def edges(self, address: str, direction: str = "out", limit: int = 100) -> pd.DataFrame:
+        """Outgoing ('out') or incoming ('in') edges of an address, largest amount first."""
+        if direction not in ("out", "in"):
+            raise ValueError(f"Unsupported edge direction: {direction}")
+        row = self.db.execute("SELECT id, edge_offset, out_edges FROM addresses WHERE address = ?",
+                              (address,)).fetchone()
+        if row is None:
+            return pd.DataFrame(columns=["source", "target", "amount", "tx_count"])
+        if direction == "out":
+            # Outgoing edges are a contiguous rowid range
+            where, params = "e.rowid BETWEEN ? AND ?", (row["edge_offset"] + 1, row["edge_offset"] + row["out_edges"])
+        else:
+            where, params = "e.target = ?", (row["id"],)
+        edges = self.db.execute(
+            "SELECT s.address AS source, t.address AS target, e.amount, e.tx_count FROM edges e "
+            "JOIN addresses s ON s.id = e.source JOIN addresses t ON t.id = e.target "
+            f"WHERE {where} ORDER BY e.amount DESC LIMIT ?", (*params, limit)).fetchall()
+        return pd.DataFrame([tuple(edge) for edge in edges], columns=["source", "target", "amount", "tx_count"])
+
+def _records(df: pd.DataFrame):
+    """JSON-ready records: NaN becomes null."""
+    return json.loads(df.to_json(orient="records"))
+
+def make_server(store: ResultStore, host="127.0.0.1", port=8000) -> HTTPServer:
+    """HTTP server answering lookups as JSON (port 0 picks a free port).
+
+    GET /address/<address>                        one address (404 if unknown)
+    GET /lookup?address=A&address=B               batch lookup, also POST /lookup with {"addresses": [...]}
+    GET /edges/<address>?direction=in&limit=50    edges of an address (limit capped at MAX_EDGE_LIMIT)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            parts = url.path.strip("/").split("/", 1)
+            if parts[0] == "address" and len(parts) == 2:
+                result = store.lookup(unquote(parts[1]))
+                self._send(result, 404 if result is None else 200)
+            elif parts[0] == "lookup":
+                self._send(_records(store.lookup_many(query.get("address", []))))
+            elif parts[0] == "edges" and len(parts) == 2:
+                direction = query.get("direction", ["out"])[0]
+                if direction not in ("out", "in"):
+                    self._send({"error": f"Unsupported edge direction: {direction}"}, 400)
+                    return
+                raw_limit = query.get("limit", ["100"])[0]
+                try:
+                    limit = int(raw_limit)
+                except ValueError:
+                    limit = 0
+                if limit < 1:
+                    self._send({"error": f"limit must be a positive integer, got {raw_limit!r}"}, 400)
+                    return
+                self._send(_records(store.edges(unquote(parts[1]), direction, min(limit, MAX_EDGE_LIMIT))))
+            else:
+                self._send({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if urlparse(self.path).path.strip("/") != "lookup":
+                self._send({"error": "not found"}, 404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                addresses = body["addresses"]
+            except (ValueError, KeyError, TypeError):
+                self._send({"error": 'expected a JSON body {"addresses": [...]}'}, 400)
+                return
+            self._send(_records(store.lookup_many(addresses)))
+
+        def _send(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return HTTPServer((host, port), Handler)
+
+def serve(store: ResultStore, host="127.0.0.1", port=8000):
+    server = make_server(store, host, port)
+    print(f"Serving {store.path} on http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query per-address analysis results")
+    parser.add_argument("store", help="Result store written with --result-store (e.g. data/final/results.sqlite)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    lookup = commands.add_parser("lookup", help="Print results for addresses as JSON lines")
+    lookup.add_argument("addresses", nargs="+")
+    lookup.add_argument("--edges", choices=["out", "in"], default=None, help="Also print the address's edges")
+    lookup.add_argument("--limit", type=int, default=20, help="Edges printed per address")
+    http = commands.add_parser("serve", help="Serve lookups over HTTP")
+    http.add_argument("--host", default="127.0.0.1")
+    http.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    with ResultStore(args.store) as store:
+        if args.command == "serve":
+            serve(store, args.host, args.port)
+            return
+        missing = []
+        for record in _records(store.lookup_many(args.addresses)):
+            if record["id"] is None:
+                missing.append(record["address"])
+                continue
+            if args.edges:
+                record["edges"] = _records(store.edges(record["address"], args.edges, args.limit))
+            print(json.dumps(record))
+        if missing:
+            sys.exit("Not found: " + " ".join(missing))
+
+if __name__ == "__main__":
+    main()
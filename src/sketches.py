@@ -0,0 +1,376 @@
+"""Fixed-memory, mergeable streaming sketches of transfer traffic.
+
+Each sketch is updated one parsed chunk at a time, keeps a fixed amount of
+memory whatever the input size, and merges with a sketch of the same shape
+built over another shard (the result is as if one sketch had seen both
+streams). Error bounds, with N the total weight seen:
+
+- CountMinSketch (width w, depth d): estimates never undercount and
+  overcount by at most e/w * N with probability at least 1 - e^-d.
+- SpaceSaving (capacity k): every key's true total lies in
+  [estimate, estimate + error], with error <= N / (k + 1); every key whose
+  total exceeds N / (k + 1) is kept.
+- HyperLogLog (2^p registers): relative standard error 1.04 / sqrt(2^p).
+- CounterpartySketch: a Count-Min layout of HyperLogLog cells. An address's
+  distinct counterparties are overestimated by at most e/w times all
+  distinct pairs (probability 1 - e^-d), plus the HyperLogLog error.
+
+Usage: python -m src.sketches shard1.jsonl shard2.jsonl ... --workers 4 --top 20
+"""
+import argparse
+import math
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import pandas as pd
+
+# Key for hashing address strings, shared by all sketches so shards built anywhere merge
+HASH_KEY = "transfersketches"
+
+def hash_keys(values) -> np.ndarray:
+    """64-bit hashes of address strings (or of a Categorical's values)."""
+    if isinstance(values, pd.Categorical):
+        hashes = pd.util.hash_array(values.categories.to_numpy(dtype=object), hash_key=HASH_KEY)
+        return hashes[values.codes[values.codes >= 0]]
+    return pd.util.hash_array(np.asarray(values, dtype=object), hash_key=HASH_KEY)
+
+def _row_hashes(seed, depth):
+    """Odd multipliers and offsets of the multiply-shift hash for each sketch row."""
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(0, 2 ** 63, depth, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    return multipliers, rng.integers(0, 2 ** 63, depth, dtype=np.uint64)
+
+def _buckets(hashes, multiplier, offset, bits):
+    return ((hashes * multiplier + offset) >> np.uint64(64 - bits)).astype(np.int64)
+
+class CountMinSketch:
+    """Per-key totals (counts or amounts) in a depth x width table.
+
+    width is rounded up to a power of two. For an overcount of at most eps * N
+    with probability 1 - delta, use width = e / eps and depth = ln(1 / delta).
+    """
+
+    def __init__(self, width=4096, depth=4, seed=0):
+        self.bits = max(1, math.ceil(math.log2(width)))
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.seed = seed
+        self.multipliers, self.offsets = _row_hashes(seed, depth)
+        self.table = np.zeros((depth, self.width))
+        self.total = 0.0
+
+    def update(self, hashes, weights=None):
+        weights = np.ones(len(hashes)) if weights is None else np.asarray(weights, dtype=np.float64)
+        for row in range(self.depth):
+            self.table[row] += np.bincount(_buckets(hashes, self.multipliers[row], self.offsets[row], self.bits),
+                                           weights=weights, minlength=self.width)
+        self.total += float(weights.sum())
+
+    def query(self, hashes) -> np.ndarray:
+        estimates = [self.table[row][_buckets(hashes, self.multipliers[row], self.offsets[row], self.bits)]
+                     for row in range(self.depth)]
+        return np.min(estimates, axis=0)
+
+    def merge(self, other: "CountMinSketch"):
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Count-Min sketches must share width, depth and seed to merge")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    @property
+    def error_bound(self) -> float:
+        """Overcount bound e/width * N, holding with probability 1 - e^-depth."""
+        return math.e / self.width * self.total
+
+class SpaceSaving:
+    """Heavy hitters: the `capacity` keys with the largest totals, with per-key error bounds.
+
+    Kept in the Misra-Gries form of Space-Saving (the two are isomorphic), which
+    merges exactly (Agarwal et al., "Mergeable Summaries"): each chunk is
+    aggregated exactly, added to the counters, and if more than capacity keys
+    remain, the (capacity + 1)-th largest counter is subtracted from all of
+    them and non-positive ones are dropped. The subtracted amounts add up to
+    `error`, which bounds how far any counter (or an absent key's 0) is below
+    the true total. Weights must be non-negative.
+    """
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=object)
+        self.counts = np.zeros(0)
+        self.error = 0.0
+        self.total = 0.0
+
+    def update(self, keys, weights=None):
+        if isinstance(keys, pd.Categorical):
+            valid = keys.codes >= 0
+            codes, uniques = keys.codes[valid], keys.categories.to_numpy(dtype=object)
+        else:
+            codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+            valid = codes >= 0
+            codes = codes[valid]
+        weights = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=np.float64)[valid]
+        if (weights < 0).any():
+            raise ValueError("Space-Saving weights must be non-negative")
+        counts = np.bincount(codes, weights=weights, minlength=len(uniques))
+        seen = np.flatnonzero(counts)
+        self.total += float(weights.sum())
+        self._add(uniques[seen], counts[seen])
+
+    def merge(self, other: "SpaceSaving"):
+        if self.capacity != other.capacity:
+            raise ValueError("Space-Saving summaries must share capacity to merge")
+        self.total += other.total
+        self.error += other.error
+        self._add(other.keys, other.counts)
+        return self
+
+    def _add(self, keys, counts):
+        combined = pd.Series(np.concatenate([self.counts, counts]),
+                             index=np.concatenate([self.keys, keys])).groupby(level=0, sort=False).sum()
+        if len(combined) > self.capacity:
+            cut = np.partition(combined.to_numpy(), len(combined) - self.capacity - 1)[len(combined) - self.capacity - 1]
+            combined = combined - cut
+            combined = combined[combined > 0]
+            self.error += float(cut)
+        self.keys = combined.index.to_numpy(dtype=object)
+        self.counts = combined.to_numpy(dtype=np.float64)
+
+    def top(self, n=10) -> pd.DataFrame:
+        """The n largest keys: key, estimate (a lower bound) and error (true <= estimate + error)."""
+        order = np.argsort(-self.counts, kind="stable")[:n]
+        return pd.DataFrame({"key": self.keys[order], "estimate": self.counts[order],
+                             "error": np.full(len(order), self.error)})
+
+    @property
+    def error_bound(self) -> float:
+        """Guaranteed bound N / (capacity + 1) on every key's error."""
+        return self.total / (self.capacity + 1)
+
+def _ranks(hashes, precision):
+    """HyperLogLog register index (top `precision` bits) and rank (leading zeros + 1 of the next bits)."""
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # At most 52 remaining bits, so float64 log2 is exact
+    bits = min(64 - precision, 52)
+    rest = ((hashes >> np.uint64(64 - precision - bits)) & np.uint64((1 << bits) - 1)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        rank = np.where(rest > 0, bits - np.floor(np.log2(rest)), bits + 1)
+    return index, rank.astype(np.uint8)
+
+def hll_estimate(registers: np.ndarray) -> np.ndarray:
+    """Cardinality estimates for HyperLogLog register rows (n_sketches x 2^precision)."""
+    registers = np.atleast_2d(registers)
+    m = registers.shape[1]
+    alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)), axis=1)
+    zeros = np.sum(registers == 0, axis=1)
+    # Linear counting for small cardinalities (Flajolet et al.)
+    with np.errstate(divide="ignore"):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+class HyperLogLog:
+    """Distinct count of hashed keys in 2^precision one-byte registers."""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        index, rank = _ranks(hashes, self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def count(self) -> float:
+        return float(hll_estimate(self.registers)[0])
+
+    def merge(self, other: "HyperLogLog"):
+        if self.precision != other.precision:
+            raise ValueError("HyperLogLog sketches must share precision to merge")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(1 << self.precision)
+
+class CounterpartySketch:
+    """Distinct counterparties per address: a Count-Min layout whose cells are HyperLogLog sketches.
+
+    The (address, counterparty) pair is added to the HyperLogLog cell of
+    the address in every row, and an address's estimate is the smallest
+    of its cells. Memory is depth x width x 2^precision bytes.
+    """
+
+    def __init__(self, width=2048, depth=3, precision=7, seed=1):
+        self.bits = max(1, math.ceil(math.log2(width)))
+        self.width = 1 << self.bits
+        self.depth = depth
+        self.precision = precision
+        self.seed = seed
+        self.multipliers, self.offsets = _row_hashes(seed, depth)
+        self.registers = np.zeros((depth, self.width << precision), dtype=np.uint8)
+        self.pairs = HyperLogLog(precision=12)
+
+    def update(self, address_hashes, counterparty_hashes):
+        pairs = pd.util.hash_array(address_hashes ^ (counterparty_hashes * np.uint64(0x9E3779B97F4A7C15)))
+        index, rank = _ranks(pairs, self.precision)
+        self.pairs.update(pairs)
+        for row in range(self.depth):
+            cells = _buckets(address_hashes, self.multipliers[row], self.offsets[row], self.bits)
+            np.maximum.at(self.registers[row], (cells << self.precision) + index, rank)
+
+    def query(self, address_hashes) -> np.ndarray:
+        m = 1 << self.precision
+        estimates = []
+        for row in range(self.depth):
+            cells = _buckets(address_hashes, self.multipliers[row], self.offsets[row], self.bits)
+            estimates.append(hll_estimate(self.registers[row].reshape(self.width, m)[cells]))
+        return np.min(estimates, axis=0)
+
+    def merge(self, other: "CounterpartySketch"):
+        if (self.width, self.depth, self.precision, self.seed) != (other.width, other.depth, other.precision,
+                                                                   other.seed):
+            raise ValueError("Counterparty sketches must share shape and seed to merge")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.pairs.merge(other.pairs)
+        return self
+
+    @property
+    def error_bound(self) -> float:
+        """Collision overcount bound e/width * distinct pairs (probability 1 - e^-depth), before HLL error."""
+        return math.e / self.width * self.pairs.count()
+
+class TransferSketches:
+    """All traffic sketches for a transfer stream: heavy senders, recipients and value movers, with Count-Min
+    point estimates, distinct recipients per sender and the number of distinct addresses.
+
+    Call update() with every parsed chunk (see DataLoader.load_data's on_chunk),
+    and merge() sketches of separate shards. Negative amounts count as zero
+    value, since the value sketches only bound non-negative totals.
+    """
+
+    def __init__(self, capacity=1000, width=4096, depth=4, precision=14):
+        self.rows = 0
+        self.senders = SpaceSaving(capacity)
+        self.recipients = SpaceSaving(capacity)
+        self.value = SpaceSaving(capacity)
+        self.sent_counts = CountMinSketch(width, depth, seed=0)
+        self.received_counts = CountMinSketch(width, depth, seed=1)
+        self.sent_value = CountMinSketch(width, depth, seed=2)
+        self.recipients_per_sender = CounterpartySketch()
+        self.addresses = HyperLogLog(precision)
+
+    def update(self, chunk: pd.DataFrame):
+        # Slices of a loaded table keep every address as a category; hash and count only this chunk's
+        sender = pd.Categorical(chunk["sender"]).remove_unused_categories()
+        recipient = pd.Categorical(chunk["recipient"]).remove_unused_categories()
+        amount = chunk["amount"].to_numpy(dtype=np.float64)
+        amount = np.where(np.isnan(amount) | (amount < 0), 0.0, amount)
+        self.rows += len(chunk)
+        sent, received = sender.codes >= 0, recipient.codes >= 0
+        sender_hashes, recipient_hashes = hash_keys(sender), hash_keys(recipient)
+        self.senders.update(sender)
+        self.recipients.update(recipient)
+        self.value.update(sender, amount)
+        self.sent_counts.update(sender_hashes)
+        self.received_counts.update(recipient_hashes)
+        self.sent_value.update(sender_hashes, amount[sent])
+        self.addresses.update(sender_hashes)
+        self.addresses.update(recipient_hashes)
+        # Pairs need both ends: positions of the valid rows within each side's hashes
+        both = sent & received
+        self.recipients_per_sender.update(sender_hashes[np.cumsum(sent)[both] - 1],
+                                          recipient_hashes[np.cumsum(received)[both] - 1])
+
+    def merge(self, other: "TransferSketches"):
+        self.rows += other.rows
+        for name in ("senders", "recipients", "value", "sent_counts", "received_counts", "sent_value",
+                     "recipients_per_sender", "addresses"):
+            getattr(self, name).merge(getattr(other, name))
+        return self
+
+    def top_senders(self, n=10) -> pd.DataFrame:
+        """Most active senders: estimated transfers (upper bound min(Space-Saving, Count-Min)) and distinct recipients."""
+        return self._top(self.senders, self.sent_counts, n, "transfers", counterparties=True)
+
+    def top_recipients(self, n=10) -> pd.DataFrame:
+        return self._top(self.recipients, self.received_counts, n, "transfers")
+
+    def top_value_movers(self, n=10) -> pd.DataFrame:
+        """Senders moving the most value: estimated amount sent and distinct recipients."""
+        return self._top(self.value, self.sent_value, n, "amount_sent", counterparties=True)
+
+    def _top(self, summary, count_min, n, name, counterparties=False):
+        top = summary.top(n)
+        hashes = hash_keys(top["key"].to_numpy())
+        table = pd.DataFrame({
+            "address": top["key"].to_numpy(),
+            name: top["estimate"].to_numpy(),
+            f"{name}_max": np.minimum(top["estimate"].to_numpy() + top["error"].to_numpy(), count_min.query(hashes)),
+        })
+        if counterparties:
+            table["distinct_recipients"] = np.round(self.recipients_per_sender.query(hashes)).astype(np.int64)
+        return table
+
+    def error_bounds(self) -> dict:
+        """Absolute error bounds of the top lists and Count-Min estimates, and relative errors of distinct counts."""
+        return {
+            "rows": self.rows,
+            # Error accumulated by the heavy-hitter summaries; never above N / (capacity + 1)
+            "heavy_hitter_transfers": max(self.senders.error, self.recipients.error),
+            "heavy_hitter_amount": self.value.error,
+            "count_min_transfers": self.sent_counts.error_bound,
+            "count_min_amount": self.sent_value.error_bound,
+            "count_min_confidence": 1 - math.exp(-self.sent_counts.depth),
+            "distinct_recipients_overcount": self.recipients_per_sender.error_bound,
+            "distinct_relative_error": 1.04 / math.sqrt(1 << self.recipients_per_sender.precision),
+            "addresses": self.addresses.count(),
+            "addresses_relative_error": self.addresses.relative_error,
+        }
+
+    def summary(self, top_n=20) -> list:
+        """Report items (text and tables) describing the traffic, as used by the AI report."""
+        bounds = self.error_bounds()
+        return [
+            f"Traffic from streaming sketches over {self.rows} transfers: about {bounds['addresses']:,.0f} distinct "
+            f"addresses (±{bounds['addresses_relative_error']:.1%}). Transfer counts are lower bounds within "
+            f"{bounds['heavy_hitter_transfers']:,.0f} of the truth and amounts within "
+            f"{bounds['heavy_hitter_amount']:,.2f}; the *_max columns are upper bounds. Distinct recipients are "
+            f"approximate (±{bounds['distinct_relative_error']:.0%}).",
+            self.top_senders(top_n),
+            self.top_value_movers(top_n),
+            self.top_recipients(top_n),
+        ]
+
+def sketch_file(path, chunk_size=64 * 1024 * 1024, **kwargs) -> TransferSketches:
+    """Sketch one JSON lines file in a single streaming pass."""
+    from src.data_loader import DataLoader
+    sketches = TransferSketches(**kwargs)
+    for chunk in DataLoader(path, chunk_size=chunk_size).iter_chunks():
+        sketches.update(chunk)
+    return sketches
+
+def main():
+    parser = argparse.ArgumentParser(description="Approximate traffic summary of transfer files (one shard each)")
+    parser.add_argument("inputs", nargs="+", help="JSON lines files; each is sketched separately and merged")
+    parser.add_argument("--workers", type=int, default=1, help="Shards sketched in parallel")
+    parser.add_argument("--top", type=int, default=20, help="Rows per top list")
+    parser.add_argument("--capacity", type=int, default=1000, help="Space-Saving counters per top list")
+    args = parser.parse_args()
+
+    sketch = partial(sketch_file, capacity=args.capacity)
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            shards = list(pool.map(sketch, args.inputs))
+    else:
+        shards = [sketch(path) for path in args.inputs]
+    sketches = shards[0]
+    for shard in shards[1:]:
+        sketches.merge(shard)
+    with pd.option_context("display.width", 200, "display.max_columns", 10):
+        for item in sketches.summary(args.top):
+            print(item if isinstance(item, str) else item.to_string(index=False), end="\n\n")
+
+if __name__ == "__main__":
+    main()
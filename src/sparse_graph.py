@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+from src.betweenness import estimate_betweenness
+
+class SparseGraph:
+    """Directed transaction graph stored as CSR adjacency with parallel weight arrays.
+
+    Nodes are the (interned) ids that appear in the aggregated edge table;
+    internally they are renumbered 0..n-1 and results are keyed by the
+    original ids, matching the networkx backend of NetworkAnalyzer.
+    """
+
+    def __init__(self, nodes: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 amount: np.ndarray, tx_count: np.ndarray):
+        self.nodes = nodes
+        self.indptr = indptr
+        self.indices = indices
+        self.amount = amount
+        self.tx_count = tx_count
+        self.betweenness_info = None
+
+    @classmethod
+    def from_edges(cls, edges: pd.DataFrame, source="sender", target="recipient") -> "SparseGraph":
+        """Build the CSR adjacency from an aggregated (source, target, amount, tx_count) table."""
+        src = edges[source].to_numpy()
+        dst = edges[target].to_numpy()
+        nodes = np.unique(np.concatenate([src, dst]))
+        src_local = np.searchsorted(nodes, src)
+        dst_local = np.searchsorted(nodes, dst)
+        order = np.lexsort((dst_local, src_local))
+        counts = np.bincount(src_local, minlength=len(nodes))
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return cls(
+            nodes,
+            indptr,
+            dst_local[order].astype(np.int32),
+            edges["amount"].to_numpy(dtype=np.float64)[order],
+            edges["tx_count"].to_numpy(dtype=np.int64)[order],
+        )
+
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    def __len__(self):
+        return self.number_of_nodes()
+
+    def adjacency(self, weight=None) -> sparse.csr_matrix:
+        """Return the adjacency as a scipy CSR matrix (weight: None, 'amount' or 'tx_count')."""
+        data = np.ones(len(self.indices)) if weight is None else getattr(self, weight)
+        n = self.number_of_nodes()
+        return sparse.csr_matrix((data, self.indices, self.indptr), shape=(n, n))
+
+    def transition_matrix(self, weight="amount") -> sparse.csr_matrix:
+        """Row-normalized adjacency: entry (u, v) is the share of u's outflow (by weight) sent to v.
+
+        Nodes without outflow get an all-zero row.
+        """
+        data = np.ones(len(self.indices)) if weight is None else getattr(self, weight).astype(np.float64)
+        n = self.number_of_nodes()
+        outflow = np.bincount(self.sources(), weights=data, minlength=n)
+        share = np.divide(data, outflow[self.sources()], out=np.zeros(len(data)), where=outflow[self.sources()] > 0)
+        return sparse.csr_matrix((share, self.indices, self.indptr), shape=(n, n))
+
+    def out_degree(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def in_degree(self) -> np.ndarray:
+        return np.bincount(self.indices, minlength=self.number_of_nodes())
+
+    def sources(self) -> np.ndarray:
+        """Local source index of every edge, aligned with indices."""
+        return np.repeat(np.arange(self.number_of_nodes(), dtype=np.int32), self.out_degree())
+
+    def to_dict(self, values) -> dict:
+        """Key a per-node array by the original node ids."""
+        return dict(zip(self.nodes.tolist(), np.asarray(values).tolist()))
+
+    def degree_centrality(self) -> np.ndarray:
+        n = self.number_of_nodes()
+        if n <= 1:
+            return np.ones(n)
+        return (self.out_degree() + self.in_degree()) / (n - 1)
+
+    def connected_components(self, connection="weak"):
+        """Return (n_components, per-node component labels)."""
+        return csgraph.connected_components(self.adjacency(), directed=True, connection=connection)
+
+    def pagerank(self, alpha=0.85, max_iter=100, tol=1.0e-6) -> np.ndarray:
+        """Power-iteration PageRank with uniform teleport and dangling redistribution (as networkx)."""
+        n = self.number_of_nodes()
+        if n == 0:
+            return np.zeros(0)
+        out_degree = self.out_degree()
+        dangling = out_degree == 0
+        # Row-stochastic transition matrix, transposed for x @ P as P.T @ x
+        inv_degree = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+        transition = sparse.csr_matrix(
+            (inv_degree[self.sources()], self.indices, self.indptr), shape=(n, n)
+        ).T.tocsr()
+        x = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            last = x
+            x = alpha * (transition @ last + last[dangling].sum() / n) + (1.0 - alpha) / n
+            if np.abs(x - last).sum() < n * tol:
+                return x
+        raise RuntimeError(f"pagerank failed to converge in {max_iter} iterations")
+
+    def betweenness(self, k=None, normalized=True, seed=None, **kwargs) -> np.ndarray:
+        """Brandes betweenness over the CSR adjacency; see betweenness.estimate_betweenness.
+
+        k=None computes exact betweenness, otherwise k source pivots are sampled.
+        """
+        values, self.betweenness_info = estimate_betweenness(
+            self.indptr, self.indices, k=k or self.number_of_nodes(), normalized=normalized, seed=seed, **kwargs
+        )
+        return values
+
+    def to_networkx(self, nodes=None):
+        """Materialize a networkx DiGraph, optionally restricted to a subset of node ids."""
+        import networkx as nx
+        src, dst = self.sources(), self.indices
+        keep = np.ones(len(dst), dtype=bool)
+        if nodes is not None:
+            selected = np.zeros(self.number_of_nodes(), dtype=bool)
+            selected[np.searchsorted(self.nodes, np.asarray(nodes))] = True
+            keep = selected[src] & selected[dst]
+        graph = nx.DiGraph()
+        graph.add_nodes_from((self.nodes if nodes is None else np.asarray(nodes)).tolist())
+        graph.add_edges_from(
+            (u, v, {"amount": a, "tx_count": c})
+            for u, v, a, c in zip(self.nodes[src[keep]].tolist(), self.nodes[dst[keep]].tolist(),
+                                  self.amount[keep].tolist(), self.tx_count[keep].tolist())
+        )
+        return graph
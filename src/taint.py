@@ -0,0 +1,66 @@
+import numpy as np
+from scipy import sparse
+
+# Dense propagation blocks are sized to stay under this many bytes (three n x block arrays)
+MAX_BLOCK_BYTES = 256 * 1024 * 1024
+
+def propagate_taint(transition: sparse.csr_matrix, seeds, hops=3, threshold=1e-4, top_n=10, block_size=None):
+    """Trace where each seed's funds flow within `hops` hops of a row-normalized transition matrix.
+
+    Seeds are propagated together as the columns of a dense block: each hop
+    is one sparse matrix x dense block product with the transposed
+    transition matrix. After every hop, fractions below `threshold` are
+    dropped, so negligible flows stop spreading. A node's exposure is the
+    total fraction of the seed's funds it received over all hops (the
+    haircut model: a node forwards tainted funds in the same proportions as
+    all of its outflow). Seeds themselves are excluded from their results.
+
+    Returns (seed, address, exposure, hop) arrays with the top_n exposed
+    nodes per seed, highest first. hop is the first hop at which the node was
+    reached. Seeds and addresses are row indices of `transition`.
+    """
+    n = transition.shape[0]
+    seeds = np.asarray(seeds, dtype=np.int64)
+    if block_size is None:
+        block_size = max(1, MAX_BLOCK_BYTES // (3 * 8 * max(n, 1)))
+    # x @ P for a block of row vectors is P.T @ X for column vectors
+    backward = transition.T.tocsr()
+    results = []
+    for start in range(0, len(seeds), block_size):
+        block = seeds[start:start + block_size]
+        columns = np.arange(len(block))
+        x = np.zeros((n, len(block)))
+        x[block, columns] = 1.0
+        exposure = np.zeros_like(x)
+        first_hop = np.zeros((n, len(block)), dtype=np.int16)
+        for hop in range(1, hops + 1):
+            x = backward @ x
+            x[x < threshold] = 0.0
+            reached = (x > 0) & (first_hop == 0)
+            first_hop[reached] = hop
+            exposure += x
+            if not x.any():
+                break
+        exposure[block, columns] = 0.0
+        results.append(_top_per_column(exposure, first_hop, block, top_n))
+    if not results:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0), empty
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+def _top_per_column(exposure, first_hop, block, top_n):
+    k = min(top_n, exposure.shape[0])
+    if k == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0), empty
+    # Top k rows of every column at once, then sorted within each column
+    top = np.argpartition(-exposure, k - 1, axis=0)[:k]
+    values = np.take_along_axis(exposure, top, axis=0)
+    order = np.argsort(-values, axis=0, kind="stable")
+    top = np.take_along_axis(top, order, axis=0)
+    values = np.take_along_axis(values, order, axis=0)
+    hops = np.take_along_axis(first_hop, top, axis=0)
+    keep = values > 0
+    seed = np.broadcast_to(block, top.shape)
+    # Column-major flattening keeps each seed's rows together
+    return seed.T[keep.T], top.T[keep.T], values.T[keep.T], hops.T[keep.T].astype(np.int64)
@@ -1,62 +1,300 @@
+import json
+import os
+from string import Template
 import matplotlib.pyplot as plt
-import networkx as nx
-from pyvis.network import Network
-
-def plot_clusters(df, x_col, y_col, cluster_col, save_path=None):
-    plt.figure(figsize=(10, 6))
-    scatter = plt.scatter(df[x_col], df[y_col], c=df[cluster_col], cmap='viridis')
-    plt.xlabel(x_col)
-    plt.ylabel(y_col)
-    plt.title("Address Clusters")
-    plt.colorbar(scatter)
-    plt.savefig(save_path)
-
-def plot_network(graph, save_path="network.html", max_nodes=200):
-    # If the graph is huge, restrict to a subgraph for visualization
-    if graph.number_of_nodes() > max_nodes:
-        # Extract the largest weakly connected component for a directed graph
-        largest_cc = max(nx.weakly_connected_components(graph), key=len)
-        subgraph = graph.subgraph(largest_cc).copy()
-        # If still too many nodes, select top nodes by degree
-        if subgraph.number_of_nodes() > max_nodes:
-            sorted_nodes = sorted(subgraph.degree, key=lambda x: x[1], reverse=True)
-            top_nodes = [n for n, d in sorted_nodes[:max_nodes]]
-            subgraph = subgraph.subgraph(top_nodes).copy()
-        graph = subgraph
-    # Create a PyVis network
-    net = Network(height="750px", width="100%", bgcolor="#222222", font_color="white")
-    # Add nodes with degree information
-    for node in graph.nodes():
-        degree = graph.degree[node]
-        net.add_node(node, label=str(node), title=f"Degree: {degree}")
-    # Add edges with additional info in the tooltip
-    for u, v, data in graph.edges(data=True):
-        title = f"Amount: {data.get('amount', 'N/A')}<br>Transactions: {data.get('tx_count', 'N/A')}"
-        net.add_edge(u, v, title=title)
-    # Use a physics layout for better node separation
-    net.show_buttons(filter_=['physics'])
-    net.show(save_path, notebook=False)
+from matplotlib.colors import LogNorm
+import numpy as np
+import pandas as pd
+from src.network_analysis import top_n_indices
+from src.sparse_graph import SparseGraph
+
+# Above this many points, plots bin the data into a density raster instead of drawing every point
+MAX_SCATTER_POINTS = 200_000
+DENSITY_BINS = (400, 200)
+
+# Standalone vis-network page; nodes and edges are inlined as JSON
+NETWORK_HTML = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/dist/vis-network.min.css" integrity="sha512-WgxfT5LWjfszlPHXRmBWHkV2eceiWTOBvrKCNbdgDYTHrT2AeLCGbF4sZlZw3UMN3WtL0tGUoIAKsu8mllg/XA==" crossorigin="anonymous" referrerpolicy="no-referrer" />
+<script src="https://cdnjs.cloudflare.com/ajax/libs/vis-network/9.1.2/dist/vis-network.min.js" integrity="sha512-LnvoEWDFrqGHlHmDD2101OrLcbsfkrzoSpvtSQtxK3RMnRV0eOkhhBN2dXHKRrUU8p2DGRTk35n4O8nWSVe1mQ==" crossorigin="anonymous" referrerpolicy="no-referrer"></script>
+<style>body { margin: 0; } #network { width: 100%; height: 750px; background-color: #222222; }</style>
+</head>
+<body>
+<div id="network"></div>
+<script>
+var nodes = new vis.DataSet($nodes);
+var edges = new vis.DataSet($edges);
+new vis.Network(document.getElementById("network"), {nodes: nodes, edges: edges}, $options);
+</script>
+</body>
+</html>
+""")
+
+def plot_clusters(df, x_col, y_col, cluster_col, save_path=None, max_points=MAX_SCATTER_POINTS, bins=DENSITY_BINS):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if len(df) > max_points:
+        # Colour each bin by its most common cluster
+        scatter = _cluster_density(ax, df[x_col].to_numpy(), df[y_col].to_numpy(), df[cluster_col].to_numpy(), bins)
+    else:
+        scatter = ax.scatter(df[x_col], df[y_col], c=df[cluster_col], cmap='viridis')
+    ax.set_xlabel(x_col)
+    ax.set_ylabel(y_col)
+    ax.set_title("Address Clusters")
+    if scatter is not None:
+        fig.colorbar(scatter, ax=ax)
+    fig.savefig(save_path)
+    plt.close(fig)
+
+def plot_network(graph, save_path="network.html", max_nodes=200, labels=None, by="degree", anomalies=None,
+                 hops=1, layout_iterations=100):
+    """Write an interactive view of a sampled subgraph with a precomputed layout (physics off).
+
+    Shows the top max_nodes nodes by `by` ('degree' or 'pagerank'), or, when
+    anomaly node ids are given, their `hops`-hop neighbourhood. Nodes may be
+    interned address ids; labels maps them back to address strings.
+    """
+    graph = _as_sparse(graph)
+    selected = sample_nodes(graph, max_nodes, by=by, anomalies=anomalies, hops=hops)
+    positions = force_layout(graph, selected, iterations=layout_iterations)
+    _write_network_html(graph, selected, positions, save_path, labels, anomalies)
     print(f"Interactive network visualization saved as {save_path}")
 
-def plot_amount_anomalies(transactions, anomalies, save_path=None):
-    plt.figure(figsize=(10, 6))
-    plt.scatter(transactions.index, transactions['amount'], label='Normal', alpha=0.5)
-    plt.scatter(anomalies.index, anomalies['amount'], color='red', label='Anomaly')
-    plt.xlabel('Transaction Index')
-    plt.ylabel('Amount')
-    plt.title('Transaction Amounts with Anomalies')
-    plt.legend()
-    plt.savefig(save_path)
-
-def plot_activity_anomalies(activity, anomalies, save_path=None):
-    plt.figure(figsize=(10, 6))
+def export_network_views(graph, directory, sizes=(200, 2000, 10000), labels=None, by="pagerank", anomalies=None,
+                         hops=1, layout_iterations=100):
+    """Level-of-detail export: one HTML view per size, nested and sharing one layout.
+
+    The layout is computed once for the largest view; each smaller view keeps
+    the most important nodes of the next one at the same coordinates, so
+    analysts can open a small view first and drill into larger ones.
+    """
+    graph = _as_sparse(graph)
+    selected = sample_nodes(graph, max(sizes), by=by, anomalies=anomalies, hops=hops)
+    positions = force_layout(graph, selected, iterations=layout_iterations)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for size in sorted(sizes):
+        path = os.path.join(directory, f"transaction_network_{size}.html")
+        _write_network_html(graph, selected[:size], positions[:size], path, labels, anomalies)
+        paths.append(path)
+        print(f"Network view with {min(size, len(selected))} nodes saved as {path}")
+    return paths
+
+def sample_nodes(graph: SparseGraph, max_nodes=200, by="degree", anomalies=None, hops=1) -> np.ndarray:
+    """Local indices of the nodes to draw, most important first, without copying the graph.
+
+    Nodes are ranked by degree or PageRank and the top max_nodes are picked
+    with a partial selection. With anomaly node ids, only their hops-hop
+    (undirected) neighbourhood is eligible, anomalies first.
+    """
+    if by == "degree":
+        scores = (graph.out_degree() + graph.in_degree()).astype(np.float64)
+    elif by == "pagerank":
+        scores = graph.pagerank()
+    else:
+        raise ValueError(f"Unsupported node ranking: {by}")
+    if anomalies is None:
+        return top_n_indices(scores, max_nodes)
+
+    seeds = _local_nodes(graph, anomalies)
+    reached = np.zeros(graph.number_of_nodes(), dtype=bool)
+    reached[seeds] = True
+    adjacency = graph.adjacency()
+    undirected = adjacency + adjacency.T
+    for _ in range(hops):
+        reached |= undirected @ reached.astype(np.float64) > 0
+    # Seeds outrank their neighbours; within each group order by score
+    priority = scores / (scores.max() + 1.0) if len(scores) else scores
+    priority[seeds] += 1.0
+    candidates = np.flatnonzero(reached)
+    return candidates[top_n_indices(priority[candidates], max_nodes)]
+
+def force_layout(graph: SparseGraph, nodes, iterations=100, seed=42, dense_limit=2000, samples=32) -> np.ndarray:
+    """Fruchterman-Reingold positions for the subgraph induced by nodes, vectorized with numpy.
+
+    Repulsion is exact below dense_limit nodes; above it each node is pushed by
+    `samples` random nodes per iteration (scaled up), keeping each iteration
+    linear in the view size. Returns an (n, 2) array in the unit square,
+    aligned with nodes.
+    """
+    n = len(nodes)
+    rng = np.random.default_rng(seed)
+    positions = rng.random((n, 2))
+    if n < 2:
+        return positions
+    src, dst = _induced_edges(graph, nodes)
+    k = np.sqrt(1.0 / n)
+    temperature = 0.1
+    for _ in range(iterations):
+        if n <= dense_limit:
+            delta = positions[:, None, :] - positions[None, :, :]
+            dist2 = (delta ** 2).sum(axis=-1) + 1e-9
+            displacement = (delta * (k * k / dist2)[..., None]).sum(axis=1)
+        else:
+            partners = rng.integers(0, n, (n, samples))
+            delta = positions[:, None, :] - positions[partners]
+            dist2 = (delta ** 2).sum(axis=-1) + 1e-9
+            displacement = (delta * (k * k / dist2)[..., None]).sum(axis=1) * (n / samples)
+        delta = positions[src] - positions[dst]
+        pull = delta * (np.sqrt((delta ** 2).sum(axis=1)) / k)[:, None]
+        np.add.at(displacement, src, -pull)
+        np.add.at(displacement, dst, pull)
+        length = np.sqrt((displacement ** 2).sum(axis=1)) + 1e-9
+        positions += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature -= 0.1 / (iterations + 1)
+    # Rescale into the unit square
+    positions -= positions.min(axis=0)
+    return positions / max(positions.max(), 1e-9)
+
+def _as_sparse(graph) -> SparseGraph:
+    if isinstance(graph, SparseGraph):
+        return graph
+    edges = pd.DataFrame(
+        [(u, v, data.get("amount", 0.0), data.get("tx_count", 1)) for u, v, data in graph.edges(data=True)],
+        columns=["sender", "recipient", "amount", "tx_count"]
+    )
+    return SparseGraph.from_edges(edges)
+
+def _local_nodes(graph: SparseGraph, node_ids) -> np.ndarray:
+    """Local indices of the given node ids that are present in the graph."""
+    node_ids = np.asarray(node_ids)
+    if graph.number_of_nodes() == 0:
+        return np.zeros(0, dtype=np.int64)
+    positions = np.searchsorted(graph.nodes, node_ids).clip(0, graph.number_of_nodes() - 1)
+    return np.unique(positions[graph.nodes[positions] == node_ids])
+
+def _induced_edges(graph: SparseGraph, nodes, with_index=False):
+    """Edges between the given local nodes, as positions into nodes (and optionally edge indices)."""
+    position = np.full(graph.number_of_nodes(), -1, dtype=np.int64)
+    position[nodes] = np.arange(len(nodes))
+    src, dst = position[graph.sources()], position[graph.indices]
+    keep = np.flatnonzero((src >= 0) & (dst >= 0))
+    if with_index:
+        return src[keep], dst[keep], keep
+    return src[keep], dst[keep]
+
+def _write_network_html(graph: SparseGraph, nodes, positions, save_path, labels=None, anomalies=None):
+    degree = graph.out_degree() + graph.in_degree()
+    flagged = np.zeros(graph.number_of_nodes(), dtype=bool)
+    if anomalies is not None:
+        flagged[_local_nodes(graph, anomalies)] = True
+    # Spread the unit-square layout so node spacing stays readable as views grow
+    coords = (positions - 0.5) * 40.0 * np.sqrt(max(len(nodes), 1))
+    # The node and edge lists are built in one vectorised pass each
+    ids = graph.nodes[nodes].tolist()
+    node_data = [
+        {"id": node, "label": str(labels[node]) if labels is not None else str(node), "shape": "dot",
+         "color": "#ff4136" if flag else "#97c2fc", "title": f"Degree: {d}", "x": x, "y": y}
+        for node, d, flag, (x, y) in zip(ids, degree[nodes].tolist(), flagged[nodes].tolist(), coords.tolist())
+    ]
+    src, dst, edge = _induced_edges(graph, nodes, with_index=True)
+    edge_data = [
+        {"from": ids[u], "to": ids[v], "title": f"Amount: {a}<br>Transactions: {c}"}
+        for u, v, a, c in zip(src.tolist(), dst.tolist(), graph.amount[edge].tolist(), graph.tx_count[edge].tolist())
+    ]
+    # Positions are final: no in-browser physics, so large views open immediately
+    options = {"physics": {"enabled": False}, "nodes": {"font": {"color": "white"}}}
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    with open(save_path, "w", encoding="utf-8") as f:
+        f.write(NETWORK_HTML.substitute(nodes=_script_json(node_data), edges=_script_json(edge_data),
+                                        options=_script_json(options)))
+
+def _script_json(value) -> str:
+    """JSON safe to inline in a <script> element."""
+    return json.dumps(value).replace("</", "<\\/")
+
+def plot_amount_anomalies(transactions, anomalies, save_path=None, max_points=MAX_SCATTER_POINTS, bins=DENSITY_BINS):
+    fig, ax = plt.subplots(figsize=(10, 6))
+    if len(transactions) > max_points:
+        _density(ax, transactions.index.to_numpy(), transactions['amount'].to_numpy(), bins, label='Normal')
+    else:
+        ax.scatter(transactions.index, transactions['amount'], label='Normal', alpha=0.5)
+    _overlay(ax, anomalies.index.to_numpy(), anomalies['amount'].to_numpy(), max_points, label='Anomaly')
+    ax.set_xlabel('Transaction Index')
+    ax.set_ylabel('Amount')
+    ax.set_title('Transaction Amounts with Anomalies')
+    ax.legend(loc='upper right')
+    fig.savefig(save_path)
+    plt.close(fig)
+
+def plot_activity_anomalies(activity, anomalies, save_path=None, max_points=MAX_SCATTER_POINTS, bins=DENSITY_BINS):
+    fig, ax = plt.subplots(figsize=(10, 6))
     # Plot all sender activity in blue
-    plt.scatter(activity.index, activity['tx_count'], label='Normal', alpha=0.5)
+    if len(activity) > max_points:
+        _density(ax, activity.index.to_numpy(), activity['tx_count'].to_numpy(), bins, label='Normal')
+    else:
+        ax.scatter(activity.index, activity['tx_count'], label='Normal', alpha=0.5)
     # Identify anomalies based on sender IDs
-    anomaly_mask = activity['sender'].isin(anomalies['sender'])
-    plt.scatter(activity[anomaly_mask].index, activity[anomaly_mask]['tx_count'], color='red', label='Anomaly')
-    plt.xlabel('Sender Index')
-    plt.ylabel('Transaction Count')
-    plt.title('Sender Activity with Anomalies')
-    plt.legend()
-    plt.savefig(save_path)
\ No newline at end of file
+    anomaly_mask = activity['sender'].isin(anomalies['sender']).to_numpy()
+    _overlay(ax, activity.index.to_numpy()[anomaly_mask], activity['tx_count'].to_numpy()[anomaly_mask], max_points,
+             label='Anomaly')
+    ax.set_xlabel('Sender Index')
+    ax.set_ylabel('Transaction Count')
+    ax.set_title('Sender Activity with Anomalies')
+    ax.legend(loc='upper right')
+    fig.savefig(save_path)
+    plt.close(fig)
+
+def _bin_edges(values, n, allow_log=True):
+    """Bin edges over the values; log-spaced for positive data spanning over three decades."""
+    lo, hi = values.min(), values.max()
+    if allow_log and lo > 0 and hi / lo > 1e3:
+        return np.geomspace(lo, hi, n + 1), True
+    if lo == hi:
+        hi = lo + 1.0
+    return np.linspace(lo, hi, n + 1), False
+
+def _finite(*columns):
+    columns = [np.asarray(c, dtype=np.float64) for c in columns]
+    keep = np.logical_and.reduce([np.isfinite(c) for c in columns])
+    return [c[keep] for c in columns]
+
+def _density(ax, x, y, bins, cmap='Blues', label=None):
+    """Draw point density as a log-coloured 2D histogram: linear in the points, fixed drawing cost."""
+    x, y = _finite(x, y)
+    if len(x) == 0:
+        return None
+    y_edges, log_y = _bin_edges(y, bins[1])
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=(_bin_edges(x, bins[0], allow_log=False)[0], y_edges))
+    mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap=cmap,
+                         norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), rasterized=True)
+    if log_y:
+        ax.set_yscale('log')
+    # pcolormesh has no legend entry; add a proxy so the legend still names the binned points
+    if label is not None:
+        ax.scatter([], [], color=plt.get_cmap(cmap)(0.7), marker='s', label=f'{label} (density)')
+    return mesh
+
+def _cluster_density(ax, x, y, labels, bins):
+    """Draw the most common cluster label of each 2D bin."""
+    x, y, labels = _finite(x, y, labels)
+    if len(x) == 0:
+        return None
+    x_edges, log_x = _bin_edges(x, bins[0])
+    y_edges, log_y = _bin_edges(y, bins[1])
+    col = np.clip(np.searchsorted(x_edges, x, side='right') - 1, 0, bins[0] - 1)
+    row = np.clip(np.searchsorted(y_edges, y, side='right') - 1, 0, bins[1] - 1)
+    clusters, codes = np.unique(labels, return_inverse=True)
+    # Count (bin, cluster) pairs, then keep the largest count per bin
+    pairs, counts = np.unique((row * bins[0] + col) * len(clusters) + codes, return_counts=True)
+    cell, code = pairs // len(clusters), pairs % len(clusters)
+    order = np.lexsort((-counts, cell))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cell[order][1:] != cell[order][:-1]
+    grid = np.full(bins[0] * bins[1], np.nan)
+    grid[cell[order][first]] = clusters[code[order][first]]
+    mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_invalid(grid.reshape(bins[1], bins[0])), cmap='viridis',
+                         rasterized=True)
+    if log_x:
+        ax.set_xscale('log')
+    if log_y:
+        ax.set_yscale('log')
+    return mesh
+
+def _overlay(ax, x, y, max_points, **kwargs):
+    """Scatter individual points, thinned evenly to at most max_points."""
+    if len(x) > max_points:
+        keep = np.linspace(0, len(x) - 1, max_points).astype(np.int64)
+        x, y = x[keep], y[keep]
+    ax.scatter(x, y, color='red', rasterized=True, **kwargs)
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex, share_address_categories
+from src.clustering import ClusteringAnalyzer
+from src.network_analysis import NetworkAnalyzer
+
+def test_from_transactions_shares_ids():
+    data = pd.DataFrame([
+        {"sender": "A", "recipient": "B", "amount": 100},
+        {"sender": "B", "recipient": "C", "amount": 150},
+        {"sender": "C", "recipient": "A", "amount": 50}
+    ])
+    index = AddressIndex.from_transactions(data)
+    assert len(index) == 3
+    assert list(index.decode(index.sender_ids)) == ["A", "B", "C"]
+    assert list(index.decode(index.recipient_ids)) == ["B", "C", "A"]
+    assert index.sender_ids.dtype == "int32"
+    assert list(index.encode(["C", "Z"])) == [index.sender_ids[2], -1]
+
+def test_categorical_columns_reuse_codes():
+    data = pd.DataFrame({"sender": pd.Categorical(["A", "B"]), "recipient": pd.Categorical(["C", "A"])})
+    share_address_categories(data)
+    index = AddressIndex.from_transactions(data)
+    assert list(index.decode(index.recipient_ids)) == ["C", "A"]
+    assert (index.sender_ids == data["sender"].cat.codes.to_numpy()).all()
+
+def test_empty_index_is_kept_by_analyzers():
+    # The partitioned path passes no transactions, so an empty index must not be rebuilt from them
+    index = AddressIndex(pd.Index([], dtype=object), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32))
+    assert ClusteringAnalyzer(None, index).address_index is index
+    assert NetworkAnalyzer(None, index).address_index is index
@@ -1,10 +1,80 @@
+import asyncio
 import os
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
 import pytest
-from src.ai_agent import AIAgent
+from src.ai_agent import AIAgent, REPORT_SECTIONS, compact_summary, count_tokens
 
 @pytest.mark.skipif(not os.getenv("OPENAI_API_KEY"), reason="No OpenAI API key provided")
 def test_generate_insight_report():
     agent = AIAgent(api_key=os.getenv("OPENAI_API_KEY"))
     report = agent.generate_insight_report("Test summary for blockchain analysis")
     assert isinstance(report, str)
-    assert len(report) > 0
\ No newline at end of file
+    assert len(report) > 0
+
+class StubClient:
+    """Local stand-in for openai.AsyncOpenAI: echoes the section title, optionally failing first."""
+
+    def __init__(self, failures=0, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, temperature):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.failures:
+                self.failures -= 1
+                raise self.error("transient")
+            title = messages[1]["content"].split("'")[1]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" about {title} "))])
+        finally:
+            self.active -= 1
+
+def test_sections_are_concurrent_and_cached(tmp_path):
+    client = StubClient()
+    agent = AIAgent(client=client, cache_dir=str(tmp_path))
+    summary = {title: [f"{title} facts"] for title in REPORT_SECTIONS}
+    report = agent.generate_insight_report(summary)
+    assert client.calls == len(REPORT_SECTIONS)
+    assert client.max_active == len(REPORT_SECTIONS)
+    assert report.startswith("1. Clustering & Address Profiling:\nabout Clustering & Address Profiling")
+
+    rerun = AIAgent(client=client, cache_dir=str(tmp_path))
+    assert rerun.generate_insight_report(summary) == report
+    assert client.calls == len(REPORT_SECTIONS)
+    assert rerun.stats["cache_hits"] == len(REPORT_SECTIONS)
+
+def test_transient_errors_are_retried(tmp_path):
+    client = StubClient(failures=2)
+    agent = AIAgent(client=client, cache_dir=None, max_concurrency=1, backoff=0.0)
+    assert asyncio.run(agent.complete("Write the 'x' section")) == "about x"
+    assert agent.stats["retries"] == 2
+
+    failing = AIAgent(client=StubClient(failures=1, error=ValueError), cache_dir=str(tmp_path), backoff=0.0)
+    assert asyncio.run(failing.complete("Write the 'x' section")).startswith("Error generating report")
+    assert failing.stats["retries"] == 0
+    # Errors are not cached
+    assert not list(tmp_path.iterdir())
+
+def test_summary_is_compacted_to_budget():
+    table = pd.DataFrame({"address": [f"0x{i:040x}" for i in range(5000)], "score": np.linspace(1, 0, 5000)})
+    sections = {"Network Analysis": ["Graph with 5000 addresses.", table]}
+    text = compact_summary(sections, token_budget=500)
+    assert count_tokens(text) <= 500
+    assert "Graph with 5000 addresses." in text
+    assert f"0x{0:040x}" in text and "of 5000 rows" in text
+    assert compact_summary(sections, token_budget=10**6).count("\n0x") == 5000
+
+def test_text_over_budget_is_truncated_by_tokens():
+    sections = {"Notes": [" ".join(f"fact{i}" for i in range(5000))]}
+    text = compact_summary(sections, token_budget=100)
+    assert count_tokens(text) <= 100
+    assert text.endswith("[summary truncated]") and "fact0 " in text
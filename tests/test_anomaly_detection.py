@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-from src.anomaly_detection import AnomalyDetector
+from src.anomaly_detection import AnomalyDetector, spike_scores, window_activity
 
 def test_detect_amount_anomalies():
     data = pd.DataFrame([
@@ -12,6 +13,10 @@ def test_detect_amount_anomalies():
     detector = AnomalyDetector(data)
     anomalies = detector.detect_amount_anomalies(contamination=0.2)
     assert not anomalies.empty
+    # Results are a row selection; the shared frame is left untouched
+    assert "anomaly_if" not in data.columns
+    assert (anomalies["anomaly_if"] == -1).all()
+    assert anomalies.index.tolist() == data.index[detector.amount_mask].tolist()
 
 def test_detect_activity_anomalies():
     data = pd.DataFrame([
@@ -38,4 +43,95 @@ def test_detect_activity_anomalies():
     ])
     detector = AnomalyDetector(data)
     anomalies = detector.detect_activity_anomalies(contamination=0.2)
-    assert not anomalies.empty
\ No newline at end of file
+    assert not anomalies.empty
+
+def test_score_with_persisted_models(tmp_path):
+    data = pd.DataFrame({
+        "sender": [f"S{i % 10}" for i in range(200)],
+        "recipient": [f"R{i % 7}" for i in range(200)],
+        "amount": [5000 if i % 40 == 0 else 100 + (i % 13) for i in range(200)]
+    })
+    detector = AnomalyDetector(data)
+    detector.detect_amount_anomalies(contamination=0.05)
+    detector.detect_activity_anomalies(contamination=0.05)
+    path = str(tmp_path / "models.pkl")
+    detector.save_models(path)
+
+    streaming = AnomalyDetector.load_models(path)
+    chunk = pd.DataFrame({"sender": ["S1", "NEW", "NEW"], "recipient": ["R1", "R2", "R3"], "amount": [105, 10_000_000, 104]})
+    scores = streaming.score(chunk)
+    assert list(scores.index) == list(chunk.index)
+    assert scores.loc[1, "amount_anomaly"]
+    assert not scores.loc[0, "amount_anomaly"]
+    assert list(scores["sender_tx_count"]) == [21, 2, 2]
+    streaming.score(chunk)
+    assert streaming.scoring_stats["batches"] == 2
+    assert streaming.scoring_stats["rows"] == 6
+    assert streaming.scoring_stats["rows_per_sec"] > 0
+
+def test_score_tracks_new_and_missing_senders():
+    data = pd.DataFrame({
+        "sender": [f"S{i % 10}" for i in range(200)],
+        "recipient": [f"R{i % 7}" for i in range(200)],
+        "amount": [100 + (i % 13) for i in range(200)]
+    })
+    detector = AnomalyDetector(data)
+    detector.detect_amount_anomalies(contamination=0.05)
+    detector.detect_activity_anomalies(contamination=0.05)
+
+    missing = detector.score(pd.DataFrame({"sender": ["S1", None], "recipient": ["R1", "R2"], "amount": [100, 101]}))
+    assert list(missing["sender_tx_count"]) == [21, 0]
+    assert np.isnan(missing.loc[1, "activity_score"]) and not missing.loc[1, "activity_anomaly"]
+
+    # Enough new senders that they are folded into the sender index between batches
+    expected = detector.sender_counts.to_dict()
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        senders = [f"N{i}" for i in rng.integers(0, 3000, 1000)]
+        scores = detector.score(pd.DataFrame({"sender": senders, "recipient": "R1", "amount": 100.0}))
+        for sender in senders:
+            expected[sender] = expected.get(sender, 0) + 1
+        assert list(scores["sender_tx_count"]) == [expected[sender] for sender in senders]
+    assert detector.sender_counts.to_dict() == expected
+
+def _steady_with_burst():
+    # A sends 3 transfers every 10 blocks for 500 blocks, except a burst of 40 at height 300;
+    # B sends one transfer every block
+    rows = []
+    for height in range(0, 500, 10):
+        rows += [("A", "B", 10.0, height)] * (40 if height == 300 else 3)
+    rows += [("B", "A", 1.0, height) for height in range(500)]
+    data = pd.DataFrame(rows, columns=["sender", "recipient", "amount", "height"])
+    return data.assign(token="token", tx_hash=[f"h{i}" for i in range(len(data))])
+
+def test_window_activity_matches_groupby():
+    data = _steady_with_burst()
+    detector = AnomalyDetector(data)
+    index = detector.address_index
+    matrices, first = window_activity(index.sender_ids, index.recipient_ids, data["amount"].to_numpy(),
+                                      data["height"].to_numpy(dtype=float), 50, len(index))
+    assert first == 0 and matrices["sent_count"].shape == (2, 10)
+    expected = data.assign(window=data["height"] // 50).groupby(["sender", "window"])["amount"].agg(["count", "sum"])
+    for (sender, window), row in expected.iterrows():
+        address = index.encode([sender])[0]
+        assert matrices["sent_count"][address, window] == row["count"]
+        assert matrices["sent_amount"][address, window] == row["sum"]
+
+def test_activity_spikes_flag_the_burst():
+    data = _steady_with_burst()
+    for method in ("ewma", "mad"):
+        spikes = AnomalyDetector(data).detect_activity_spikes(window=10, method=method, threshold=5.0, min_count=10)
+        assert set(zip(spikes["address"], spikes["start_height"])) == {("A", 300), ("B", 300)}
+        assert spikes["score"].is_monotonic_decreasing
+
+def test_ewma_decays_over_idle_windows():
+    # One address active in windows 0, 3 and 4: the closed-form decay must match feeding the zeros one by one
+    indptr, indices, values = np.array([0, 3]), np.array([0, 3, 4]), np.array([5.0, 2.0, 9.0])
+    baseline, score = spike_scores(indptr, indices, values, alpha=0.3, min_scale=0.01, warmup=0)
+    mean = var = 0.0
+    expected = []
+    for x in [5.0, 0.0, 0.0, 2.0, 9.0]:
+        expected.append((x - mean) / max(np.sqrt(var), 0.01))
+        diff = x - mean
+        mean, var = mean + 0.3 * diff, 0.7 * (var + 0.3 * diff ** 2)
+    np.testing.assert_allclose(score, [expected[0], expected[3], expected[4]])
@@ -0,0 +1,47 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+import pytest
+from src.betweenness import estimate_betweenness
+from src.sparse_graph import SparseGraph
+
+def _random_graph(n_edges=600, n_nodes=120, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = pd.DataFrame({
+        "sender": rng.integers(0, n_nodes, n_edges),
+        "recipient": rng.integers(0, n_nodes, n_edges),
+        "amount": rng.random(n_edges)
+    })
+    edges = edges[edges["sender"] != edges["recipient"]]
+    return edges.groupby(["sender", "recipient"], as_index=False).agg(
+        amount=("amount", "sum"), tx_count=("amount", "count")
+    )
+
+def test_exact_betweenness_matches_networkx():
+    edges = _random_graph()
+    graph = SparseGraph.from_edges(edges)
+    values, info = estimate_betweenness(graph.indptr, graph.indices, k=graph.number_of_nodes())
+    assert info["exact"]
+    expected = nx.betweenness_centrality(nx.from_pandas_edgelist(edges, "sender", "recipient", create_using=nx.DiGraph()))
+    assert graph.to_dict(values) == pytest.approx(expected)
+
+def test_adaptive_betweenness_converges_within_epsilon_and_parallel_matches_serial():
+    edges = _random_graph(n_edges=1500, n_nodes=300)
+    graph = SparseGraph.from_edges(edges)
+    exact, _ = estimate_betweenness(graph.indptr, graph.indices, k=graph.number_of_nodes())
+    serial, info = estimate_betweenness(graph.indptr, graph.indices, k=20, epsilon=0.01, top_n=5, seed=1)
+    assert info["converged"] and not info["exact"] and info["rounds"] > 1
+    assert info["pivots"] < graph.number_of_nodes()
+    assert np.abs(serial - exact).max() < 0.01
+    parallel, parallel_info = estimate_betweenness(graph.indptr, graph.indices, k=20, epsilon=0.01, top_n=5, seed=1,
+                                                   workers=2)
+    assert parallel_info["pivots"] == info["pivots"]
+    assert parallel == pytest.approx(serial)
+
+def test_exact_betweenness_in_parallel():
+    edges = _random_graph()
+    graph = SparseGraph.from_edges(edges)
+    serial, _ = estimate_betweenness(graph.indptr, graph.indices, k=graph.number_of_nodes())
+    parallel, info = estimate_betweenness(graph.indptr, graph.indices, k=graph.number_of_nodes(), workers=2)
+    assert info["exact"] and info["rounds"] == 1
+    assert parallel == pytest.approx(serial)
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import pandas as pd
+from src.cache import TransactionCache
+from src.data_loader import DataLoader
+
+def _write_jsonl(path, n):
+    with open(path, "w") as f:
+        for i in range(n):
+            f.write(json.dumps({"sender": f"S{i % 3}", "recipient": f"R{i % 4}", "amount": str(i), "token": "token", "height": str(i), "tx_hash": f"h{i}"}) + "\n")
+
+def test_cache_roundtrip():
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "transfers.jsonl")
+    _write_jsonl(path, 20)
+    cache = TransactionCache(os.path.join(tmp_dir, "cache"))
+    entry = cache.entry_path(path)
+    assert cache.load(entry) is None
+
+    df = DataLoader(path).load_data()
+    assert cache.save(entry, df)
+    cached = cache.load(entry)
+    pd.testing.assert_frame_equal(df, cached)
+    cache.invalidate(entry)
+    assert cache.load(entry) is None
+
+def test_cache_key_changes_with_content():
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "transfers.jsonl")
+    _write_jsonl(path, 5)
+    cache = TransactionCache(os.path.join(tmp_dir, "cache"))
+    key = cache.fingerprint(path)
+    assert key == cache.fingerprint(path)
+    _write_jsonl(path, 6)
+    assert key != cache.fingerprint(path)
+
+def test_analyzer_fingerprints_input_once(monkeypatch):
+    from src.analyzer import BlockchainAnalyzer
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "transfers.jsonl")
+    _write_jsonl(path, 20)
+    calls = []
+    fingerprint = TransactionCache.fingerprint
+    monkeypatch.setattr(TransactionCache, "fingerprint", lambda self, p: calls.append(p) or fingerprint(self, p))
+    for _ in range(2):
+        analyzer = BlockchainAnalyzer(path, cache_dir=os.path.join(tmp_dir, "cache"))
+        analyzer.load_data()
+    # One content hash per run, shared by the cache lookup, the save and the log lines
+    assert len(calls) == 2
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from src.clustering import ClusteringAnalyzer
 
@@ -20,4 +21,53 @@ def test_cluster_addresses():
     ])
     clustering = ClusteringAnalyzer(data)
     clusters = clustering.cluster_addresses(method="kmeans", n_clusters=2)
-    assert "cluster" in clusters.columns
\ No newline at end of file
+    assert "cluster" in clusters.columns
+
+def test_compute_extended_address_features():
+    data = pd.DataFrame([
+        {"sender": "A", "recipient": "B", "amount": 100, "height": 1},
+        {"sender": "A", "recipient": "C", "amount": 200, "height": 5},
+        {"sender": "B", "recipient": "A", "amount": 150, "height": 3},
+        {"sender": "A", "recipient": "B", "amount": 50, "height": 9},
+        {"sender": "D", "recipient": "E", "amount": -5, "height": 10},
+        {"sender": "F", "recipient": "D", "amount": None, "height": 11}
+    ])
+    clustering = ClusteringAnalyzer(data)
+    features = clustering.compute_address_features(extended=True).set_index("address")
+    assert features.loc["A", "sent_count"] == 3
+    assert features.loc["A", "sent_total"] == 350
+    assert features.loc["A", "received_total"] == 150
+    assert features.loc["C", "sent_count"] == 0
+    assert features.loc["A", "first_height"] == 1
+    assert features.loc["A", "active_span"] == 8
+    assert features.loc["A", "unique_counterparties"] == 2
+    assert features.loc["B", "unique_counterparties"] == 1
+    assert features.loc["A", "max_transfer"] == 200
+    assert features.loc["D", "max_transfer"] == -5
+    assert np.isnan(features.loc["F", "max_transfer"])
+
+    # The NaN extended columns are not clustering inputs
+    clusters = clustering.cluster_addresses(method="kmeans", n_clusters=2)
+    assert clusters["cluster"].notna().all() and "max_transfer" in clusters.columns
+
+def _many_addresses(n=400):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "sender": [f"S{i}" for i in rng.integers(0, n, 4 * n)],
+        "recipient": [f"R{i}" for i in rng.integers(0, n, 4 * n)],
+        "amount": rng.lognormal(3, 1, 4 * n)
+    })
+
+def test_cluster_addresses_sampled_hdbscan():
+    clustering = ClusteringAnalyzer(_many_addresses())
+    clusters = clustering.cluster_addresses(method="hdbscan", sample_size=200, min_cluster_size=5)
+    assert "cluster" in clusters.columns
+    assert clusters["cluster"].notna().all()
+    assert clustering.timings["fit"]["rows"] == 200
+    assert clustering.timings["fit"]["rows"] + clustering.timings["predict"]["rows"] == len(clusters)
+
+def test_cluster_addresses_minibatch_kmeans():
+    clustering = ClusteringAnalyzer(_many_addresses())
+    clusters = clustering.cluster_addresses(method="minibatch_kmeans", n_clusters=3)
+    assert set(clusters["cluster"]) <= {0, 1, 2}
+    assert "predict" in clustering.timings
@@ -0,0 +1,76 @@
+import itertools
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex
+from src import cycles
+from src.cycles import find_cycles
+from src.network_analysis import NetworkAnalyzer
+
+def _brute_force(s, r, a, h, max_length, tolerance, max_span):
+    valid = [i for i in range(len(s)) if s[i] != r[i]]
+    expected = set()
+    for length in range(2, max_length + 1):
+        for chain in itertools.permutations(valid, length):
+            # Transfers in the same block never chain, whatever their order in the input
+            if any(h[x] >= h[y] or r[x] != s[y] for x, y in zip(chain, chain[1:])):
+                continue
+            nodes = [s[chain[0]]] + [r[row] for row in chain[:-1]]
+            if (r[chain[-1]] == s[chain[0]] and len(set(nodes)) == length
+                    and all(abs(a[row] - a[chain[0]]) <= tolerance * a[chain[0]] for row in chain)
+                    and h[chain[-1]] - h[chain[0]] <= max_span):
+                expected.add(chain)
+    return expected
+
+def test_cycles_match_brute_force_and_parallel_search():
+    rng = np.random.default_rng(1)
+    n = 120
+    s, r = rng.integers(0, 6, n), rng.integers(0, 6, n)
+    a = rng.choice([10.0, 10.5, 11.0, 20.0], n)
+    h = rng.integers(0, 40, n).astype(float)
+    rows, lengths = find_cycles(s, r, a, h, max_length=3, tolerance=0.1, max_span=10)
+    found = [tuple(row[row >= 0]) for row in rows]
+    assert set(found) == _brute_force(s, r, a, h, 3, 0.1, 10)
+    assert len(found) == len(set(found))
+    assert (lengths == [len(chain) for chain in found]).all()
+    parallel, _ = find_cycles(s, r, a, h, max_length=3, tolerance=0.1, max_span=10, workers=2, batch_size=10)
+    np.testing.assert_array_equal(parallel, rows)
+
+def test_ranked_group_keys_match_brute_force(monkeypatch):
+    # Many addresses and fine buckets fall back to ranked (sender, bucket) groups instead of failing
+    monkeypatch.setattr(cycles, "KEY_LIMIT", 1)
+    rng = np.random.default_rng(2)
+    n = 80
+    s, r = rng.integers(0, 5, n) * 2 ** 28, rng.integers(0, 5, n) * 2 ** 28
+    a = rng.choice([10.0, 10.0 + 5e-9, 1e6], n)
+    h = rng.integers(0, 30, n).astype(float)
+    assert cycles.TransferIndex(s, r, a, h, tolerance=1e-9).groups is not None
+    rows, _ = find_cycles(s, r, a, h, max_length=3, tolerance=1e-9, max_span=10)
+    assert {tuple(row[row >= 0]) for row in rows} == _brute_force(s, r, a, h, 3, 1e-9, 10)
+
+def test_transfers_in_one_block_do_not_chain():
+    rows, _ = find_cycles(np.array([0, 1]), np.array([1, 0]), np.array([10.0, 10.0]), np.array([5.0, 5.0]))
+    assert len(rows) == 0
+    s, r = np.array([0, 1, 1]), np.array([1, 0, 0])
+    a, h = np.full(3, 10.0), np.array([5.0, 5.0, 6.0])
+    assert _brute_force(s, r, a, h, 2, 0.1, 10) == {(0, 2)}
+    rows, _ = find_cycles(s, r, a, h, max_length=2)
+    assert [tuple(row) for row in rows] == [(0, 2)]
+
+def test_network_analyzer_cycles_table():
+    transactions = pd.DataFrame({
+        "sender": ["A", "B", "C", "A", "B", "D"],
+        "recipient": ["B", "C", "A", "B", "A", "A"],
+        "amount": [100.0, 99.0, 98.0, 50.0, 10.0, 100.0],
+        "height": [1, 2, 3, 4, 5, 0],
+        "tx_hash": [f"h{i}" for i in range(6)],
+    })
+    index = AddressIndex.from_transactions(transactions)
+    analyzer = NetworkAnalyzer(transactions, index, backend="sparse")
+    cycles = analyzer.find_cycles(max_length=3, tolerance=0.05)
+    # A -> B -> C -> A keeps the amount; A -> B -> A (50 then 10) does not
+    assert cycles["tx_hash"].tolist() == ["h0", "h1", "h2"]
+    assert cycles["hop"].tolist() == [0, 1, 2]
+    assert index.decode(cycles["source"]).tolist() == ["A", "B", "C"]
+    assert (cycles["length"] == 3).all()
+    loose = analyzer.find_cycles(max_length=2, tolerance=None)
+    assert loose.groupby("cycle")["tx_hash"].agg(tuple).tolist() == [("h0", "h4"), ("h3", "h4")]
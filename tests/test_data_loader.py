@@ -18,4 +18,40 @@ def test_load_data():
     df = loader.load_data()
     assert isinstance(df, pd.DataFrame)
     assert df.shape[0] == 2
-    os.unlink(temp_file.name)
\ No newline at end of file
+    os.unlink(temp_file.name)
+
+def test_iter_chunks_typed_columns_and_malformed_summary():
+    lines = [json.dumps({"sender": f"S{i % 3}", "recipient": f"R{i % 4}", "amount": str(i * 10), "height": str(100 + i)}) for i in range(50)]
+    lines.insert(10, "{not valid json")
+    lines.insert(20, "")
+    temp_file = tempfile.NamedTemporaryFile(delete=False, mode='w')
+    temp_file.write("\n".join(lines))
+    temp_file.close()
+
+    loader = DataLoader(temp_file.name, chunk_size=256)
+    chunks = list(loader.iter_chunks())
+    assert len(chunks) > 1
+    assert loader.summary["malformed"] == 1
+    assert loader.summary["rows"] == 50
+
+    df = loader.load_data()
+    assert df.shape[0] == 50
+    assert isinstance(df["sender"].dtype, pd.CategoricalDtype)
+    assert df["amount"].dtype == "float64"
+    assert df["height"].dtype == "int64"
+    assert df["height"].tolist() == list(range(100, 150))
+    os.unlink(temp_file.name)
+
+
+def test_parallel_load_matches_serial():
+    temp_file = tempfile.NamedTemporaryFile(delete=False, mode='w')
+    for i in range(200):
+        temp_file.write(json.dumps({"sender": f"S{i % 7}", "recipient": f"R{i % 5}", "amount": i, "height": i}) + "\n")
+    temp_file.close()
+
+    serial = DataLoader(temp_file.name, chunk_size=512).load_data()
+    loader = DataLoader(temp_file.name, chunk_size=512, workers=3)
+    assert len(loader.byte_ranges(3)) == 3
+    parallel = loader.load_data()
+    pd.testing.assert_frame_equal(serial, parallel)
+    os.unlink(temp_file.name)
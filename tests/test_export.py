@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+from src.export import write_table
+
+def _table():
+    addresses = pd.Index(["A", "B", "C"])
+    return pd.DataFrame({
+        "source": pd.Categorical.from_codes([0, 1, 2, 0, 1], categories=addresses),
+        "target": pd.Categorical.from_codes([1, 2, 0, 2, 0], categories=addresses),
+        "amount": [1.5, 2.0, 3.0, 4.5, 5.0],
+        "tx_count": [1, 2, 1, 3, 1],
+    })
+
+def test_write_csv_in_row_groups(tmp_path):
+    df = _table()
+    path = write_table(df, str(tmp_path / "edges"), "csv", row_group_size=2)
+    assert path.endswith("edges.csv")
+    pd.testing.assert_frame_equal(pd.read_csv(path), df.astype({"source": object, "target": object}))
+
+@pytest.mark.parametrize("export_format", ["parquet", "feather"])
+def test_write_columnar_formats(tmp_path, export_format):
+    pytest.importorskip("pyarrow")
+    df = _table()
+    path = write_table(df, str(tmp_path / "edges"), export_format, row_group_size=2)
+    read = pd.read_parquet(path) if export_format == "parquet" else pd.read_feather(path)
+    pd.testing.assert_frame_equal(read.astype({"source": str, "target": str}),
+                                  df.astype({"source": str, "target": str}))
+
+def test_unknown_format_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_table(_table(), str(tmp_path / "edges"), "xlsx")
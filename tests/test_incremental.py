@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pytest
+from src.clustering import ClusteringAnalyzer
+from src.data_loader import DataLoader
+from src.incremental import IncrementalAnalyzer
+from src.network_analysis import NetworkAnalyzer
+
+def _records(start, stop, seed):
+    rng = np.random.default_rng(seed)
+    return [
+        {"sender": f"A{rng.integers(0, 30)}", "recipient": f"A{rng.integers(0, 40)}",
+         "amount": str(round(float(rng.lognormal(3, 1)), 4)), "height": str(h)}
+        for h in range(start, stop) for _ in range(3)
+    ]
+
+def _append(path, records):
+    with open(path, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+def _assert_matches_full_recompute(results, path):
+    transactions = DataLoader(path).load_data()
+    expected = ClusteringAnalyzer(transactions).compute_address_features(extended=True)
+    features = results["address_features"]
+    for df in (expected, features):
+        df["address"] = df["address"].astype(str)
+    expected = expected.sort_values("address").reset_index(drop=True)
+    features = features.sort_values("address").reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected, features[expected.columns], check_dtype=False)
+
+    network = NetworkAnalyzer(transactions)
+    network.build_graph()
+    edges = results["edges"].assign(source=results["edges"]["source"].astype(str),
+                                    target=results["edges"]["target"].astype(str))
+    expected_edges = pd.DataFrame({
+        "source": network.address_index.decode(network.edges["sender"].to_numpy()),
+        "target": network.address_index.decode(network.edges["recipient"].to_numpy()),
+        "amount": network.edges["amount"].to_numpy(),
+        "tx_count": network.edges["tx_count"].to_numpy(),
+    })
+    pd.testing.assert_frame_equal(edges.sort_values(["source", "target"], ignore_index=True),
+                                  expected_edges.sort_values(["source", "target"], ignore_index=True),
+                                  check_dtype=False)
+    degree = dict(zip(results["centrality"]["node"].astype(str), results["centrality"]["degree"]))
+    expected_degree = network.analyze_centrality(k=5)["degree"]
+    addresses = network.address_index.decode(list(expected_degree))
+    assert degree == pytest.approx(dict(zip(addresses, expected_degree.values())))
+    return transactions
+
+def test_incremental_matches_full_recompute():
+    tmp_dir = tempfile.mkdtemp()
+    path = os.path.join(tmp_dir, "transfers.jsonl")
+    state_dir = os.path.join(tmp_dir, "state")
+    _append(path, _records(0, 50, seed=1))
+    first = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert first["last_height"] == 49
+
+    _append(path, _records(50, 80, seed=2))
+    results = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert results["last_height"] == 79
+    _assert_matches_full_recompute(results, path)
+
+    # Nothing new: the state is reused without re-reading the input
+    again = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert len(again["edges"]) == len(results["edges"])
+
+def test_appended_rows_at_the_last_height_and_without_height(tmp_path):
+    path = str(tmp_path / "transfers.jsonl")
+    state_dir = str(tmp_path / "state")
+    records = _records(0, 4, seed=3)
+    records[1]["height"] = "n/a"
+    _append(path, records)
+    first = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert first["address_features"]["sent_count"].sum() == 12
+
+    # Four more transfers in the last processed block, one in a new block, and a line still being written
+    _append(path, _records(3, 4, seed=4) + _records(3, 4, seed=5)[:1] + [dict(_records(9, 10, seed=6)[0])])
+    with open(path, "a") as f:
+        f.write('{"sender": "A1", "recipient": "A2", "amo')
+    results = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert results["address_features"]["sent_count"].sum() == 17
+    assert results["last_height"] == 9
+
+    with open(path, "a") as f:
+        f.write('unt": "5.0", "height": "9"}\n')
+    results = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    transactions = _assert_matches_full_recompute(results, path)
+    assert len(transactions) == 18
+
+def test_rewritten_input_rescans_from_the_last_height(tmp_path):
+    path = str(tmp_path / "transfers.jsonl")
+    state_dir = str(tmp_path / "state")
+    records = _records(0, 20, seed=7)
+    _append(path, records)
+    IncrementalAnalyzer(path, state_dir=state_dir).run()
+
+    # Same history written differently, plus more transfers in the last block and a new one
+    records += _records(19, 21, seed=8)
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    results = IncrementalAnalyzer(path, state_dir=state_dir).run()
+    assert results["last_height"] == 20
+    _assert_matches_full_recompute(results, path)
+
+def test_saved_tables_share_the_full_run_schema(tmp_path):
+    from src.analyzer import ANALYSIS_STAGES, BlockchainAnalyzer
+    path = str(tmp_path / "transfers.jsonl")
+    _append(path, _records(0, 40, seed=9))
+    incremental = IncrementalAnalyzer(path, state_dir=str(tmp_path / "state"))
+    written = incremental.save_results(incremental.run(), directory=str(tmp_path / "incremental"))
+    assert sorted(os.path.basename(p) for p in written) == sorted(
+        f"{name}.csv" for name in ("address_features", "network_edges", "network_centrality", "network_hubs",
+                                   "activity_anomalies", "amount_anomalies"))
+
+    analyzer = BlockchainAnalyzer(path, use_cache=False, graph_backend="sparse",
+                                  models_path=str(tmp_path / "models.pkl"), cycle_max_length=0)
+    analyzer.load_data()
+    analyzer.run_analysis([stage for stage in ANALYSIS_STAGES
+                           if stage.name in ("anomaly_detection", "network_analysis")])
+    analyzer.save_results_to_filesystem(str(tmp_path / "full"))
+    for name in ("network_edges", "network_hubs", "activity_anomalies", "amount_anomalies", "network_centrality"):
+        full = pd.read_csv(tmp_path / "full" / f"{name}.csv")
+        partial = pd.read_csv(tmp_path / "incremental" / f"{name}.csv")
+        # Betweenness needs the whole graph, so it is the one column the incremental run leaves out
+        assert list(partial.columns) == [c for c in full.columns if c != "betweenness"]
+
+def test_amount_model_is_refitted_once_the_input_doubles(tmp_path):
+    from src.anomaly_detection import AnomalyDetector
+    path = str(tmp_path / "transfers.jsonl")
+    state_dir = str(tmp_path / "state")
+    _append(path, _records(0, 40, seed=10))
+    incremental = IncrementalAnalyzer(path, state_dir=state_dir)
+    incremental.run()
+    assert incremental.state["model_rows"] == 120
+
+    # 90 more rows stay below twice the fitted rows: new rows are only scored
+    _append(path, _records(40, 70, seed=11))
+    incremental.run()
+    assert incremental.state["model_rows"] == 120
+    # Crossing the factor refits on everything, so the anomalies are the full run's
+    _append(path, _records(70, 90, seed=12))
+    results = incremental.run()
+    assert incremental.state["model_rows"] == 270
+    expected = AnomalyDetector(DataLoader(path).load_data()).detect_amount_anomalies()
+    columns = ["sender", "recipient", "amount", "height"]
+    pd.testing.assert_frame_equal(results["amount_anomalies"][columns].astype(str).reset_index(drop=True),
+                                  expected[columns].astype(str).reset_index(drop=True))
+
+    # refit=True refits whatever the growth
+    _append(path, _records(90, 91, seed=13))
+    forced = IncrementalAnalyzer(path, state_dir=state_dir, refit_factor=None, refit=True)
+    forced.run()
+    assert forced.state["model_rows"] == 273
+
+def test_input_without_height_is_rejected(tmp_path):
+    path = str(tmp_path / "transfers.jsonl")
+    _append(path, [{k: v for k, v in record.items() if k != "height"} for record in _records(0, 5, seed=14)])
+    with pytest.raises(ValueError, match="height"):
+        IncrementalAnalyzer(path, state_dir=str(tmp_path / "state")).run()
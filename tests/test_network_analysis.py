@@ -1,5 +1,7 @@
+import pytest
+import numpy as np
 import pandas as pd
-from src.network_analysis import NetworkAnalyzer
+from src.network_analysis import NetworkAnalyzer, top_n_indices
 
 def test_build_graph():
     data = pd.DataFrame([
@@ -19,4 +21,45 @@ def test_get_hubs():
     analyzer = NetworkAnalyzer(data)
     analyzer.build_graph()
     hubs = analyzer.get_hubs(threshold=0.5)
-    assert isinstance(hubs, dict)
\ No newline at end of file
+    assert isinstance(hubs, dict)
+
+def test_sparse_backend_matches_networkx():
+    data = pd.DataFrame([
+        {"sender": "A", "recipient": "B", "amount": 100},
+        {"sender": "A", "recipient": "C", "amount": 150},
+        {"sender": "B", "recipient": "C", "amount": 200},
+        {"sender": "C", "recipient": "D", "amount": 50},
+        {"sender": "D", "recipient": "A", "amount": 75},
+        {"sender": "E", "recipient": "F", "amount": 10}
+    ])
+    results = {}
+    for backend in ("networkx", "sparse"):
+        analyzer = NetworkAnalyzer(data, backend=backend)
+        analyzer.build_graph()
+        results[backend] = (
+            analyzer.analyze_centrality(approximate=False),
+            analyzer.get_hubs(threshold=0.5),
+            analyzer.pagerank(),
+            len(set(analyzer.connected_components().values()))
+        )
+        # The columnar table carries the same values as the per-node dicts
+        table = analyzer.centrality_table(hub_threshold=0.5, approximate=False)
+        centrality, hubs = results[backend][:2]
+        assert dict(zip(table["node"], table["degree"])) == pytest.approx(centrality["degree"])
+        assert dict(zip(table["node"], table["betweenness"])) == pytest.approx(centrality["betweenness"])
+        assert set(table.loc[table["hub"], "node"]) == set(hubs)
+    nx_centrality, nx_hubs, nx_pagerank, nx_components = results["networkx"]
+    sp_centrality, sp_hubs, sp_pagerank, sp_components = results["sparse"]
+    for metric in ("degree", "betweenness"):
+        assert nx_centrality[metric] == pytest.approx(sp_centrality[metric])
+    assert nx_hubs == pytest.approx(sp_hubs)
+    assert nx_pagerank == pytest.approx(sp_pagerank, abs=1e-6)
+    assert nx_components == sp_components == 2
+
+def test_top_n_indices_matches_full_sort():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, 500).astype(float)
+    tiebreak = rng.random(500)
+    expected = pd.DataFrame({"v": values, "t": tiebreak}).sort_values(["v", "t"], ascending=False).index[:10]
+    assert top_n_indices(values, 10, tiebreak=tiebreak).tolist() == expected.tolist()
+    assert len(top_n_indices(values[:3], 10)) == 3
@@ -0,0 +1,56 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src.address_index import AddressIndex
+from src.clustering import ClusteringAnalyzer
+from src.data_loader import DataLoader
+from src.network_analysis import NetworkAnalyzer
+from src.partitioned import PartitionedAggregator
+
+def _write(path, n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        for i in range(n):
+            record = {"sender": f"A{rng.integers(0, 40)}", "recipient": f"A{rng.integers(0, 60)}",
+                      "amount": str(round(float(rng.lognormal(3, 1)), 4)), "height": str(i // 5)}
+            if i % 50 == 0:
+                record["amount"] = "n/a"
+            if i % 70 == 0:
+                record["recipient"] = None
+            if i % 90 == 0:
+                record["recipient"] = record["sender"]
+            f.write(json.dumps(record) + "\n")
+
+@pytest.mark.parametrize("partitions,workers", [(1, 1), (5, 1), (4, 2)])
+def test_partitioned_matches_in_memory(tmp_path, partitions, workers):
+    path = str(tmp_path / "transfers.jsonl")
+    _write(path)
+    aggregator = PartitionedAggregator(path, memory_budget=2 ** 20, spill_dir=str(tmp_path / "spill"),
+                                       partitions=partitions, workers=workers, extended=True)
+    # Several chunks, so addresses and edges are spread over many spill writes
+    aggregator.chunk_size = 4096
+    index, edges, features = aggregator.run()
+    assert aggregator.stats["rows"] == 600 and aggregator.stats["chunks"] > 5
+    assert not list((tmp_path / "spill").iterdir())
+
+    transactions = DataLoader(path).load_data()
+    expected_index = AddressIndex.from_transactions(transactions)
+    assert index.addresses.equals(expected_index.addresses)
+    expected = ClusteringAnalyzer(transactions, expected_index).compute_address_features(extended=True)
+    pd.testing.assert_frame_equal(features, expected)
+    network = NetworkAnalyzer(transactions, expected_index)
+    network.build_graph()
+    pd.testing.assert_frame_equal(edges, network.edges)
+
+    from_edges = NetworkAnalyzer(None, index, backend="sparse")
+    from_edges.build_graph(edges=edges)
+    assert from_edges.graph.number_of_nodes() == network.graph.number_of_nodes()
+
+def test_partition_count_follows_memory_budget(tmp_path):
+    path = str(tmp_path / "transfers.jsonl")
+    _write(path)
+    size = (tmp_path / "transfers.jsonl").stat().st_size
+    assert PartitionedAggregator(path, memory_budget=10 * size).partitions == 1
+    assert PartitionedAggregator(path, memory_budget=size // 4).partitions >= 8
+    assert PartitionedAggregator(path, memory_budget=10 * size, workers=3).partitions == 3
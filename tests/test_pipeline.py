@@ -0,0 +1,71 @@
+import pickle
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex, share_address_categories
+from src.analyzer import BlockchainAnalyzer
+from src.pipeline import SharedTransactions, _close_worker, _init_worker, _worker, attach_transactions
+
+def _transactions(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "sender": pd.Categorical([f"A{i}" for i in rng.integers(0, 40, n)]),
+        "recipient": pd.Categorical([f"A{i}" for i in rng.integers(0, 60, n)]),
+        "amount": rng.lognormal(3, 1, n),
+        "token": "token",
+        "height": np.arange(n, dtype=np.int64),
+        "tx_hash": [f"h{i}" for i in range(n)],
+    })
+    return share_address_categories(df)
+
+def test_shared_transactions_roundtrip():
+    df = _transactions()
+    df.loc[3, "tx_hash"] = None
+    shared = SharedTransactions(df)
+    try:
+        # Address and tx_hash dictionaries travel in shared memory, not in the pickled spec
+        assert len(pickle.dumps(shared.spec)) < 2000
+        attached, blocks = attach_transactions(shared.spec)
+        pd.testing.assert_frame_equal(attached, df)
+        for block in blocks:
+            block.close()
+    finally:
+        shared.close()
+
+def test_worker_closes_shared_blocks():
+    shared = SharedTransactions(_transactions())
+    try:
+        _init_worker(pickle.dumps(BlockchainAnalyzer("unused.jsonl")), shared.spec)
+        blocks = _worker["blocks"]
+        assert len(_worker["analyzer"].transactions) == 400
+        _close_worker()
+        assert not _worker and all(block.buf is None for block in blocks)
+    finally:
+        shared.close()
+
+def test_parallel_stages_match_sequential(tmp_path):
+    results = []
+    for stage_workers in (1, 2):
+        analyzer = BlockchainAnalyzer("unused.jsonl", clustering_method="kmeans", graph_backend="sparse",
+                                      models_path=str(tmp_path / f"models_{stage_workers}.pkl"),
+                                      stage_workers=stage_workers)
+        analyzer.transactions = _transactions()
+        analyzer.address_index = AddressIndex.from_transactions(analyzer.transactions)
+        report = analyzer.run_analysis()
+        assert set(report["stages"]) == {"clustering", "anomaly_detection", "network_analysis", "fund_flows"}
+        # fund_flows waits for the anomaly and network stages; any other stage is a critical path on its own
+        path = report["critical_path"]
+        assert len(path) == 1 or (len(path) == 2 and path[-1] == "fund_flows")
+        assert report["stages"]["fund_flows"]["start"] >= max(report["stages"][name]["end"]
+                                                              for name in ("anomaly_detection", "network_analysis"))
+        results.append(analyzer)
+
+    sequential, parallel = results
+    pd.testing.assert_frame_equal(sequential.raw_clustering_results, parallel.raw_clustering_results)
+    for key in ("amount_anomalies", "activity_anomalies"):
+        pd.testing.assert_frame_equal(sequential.raw_anomaly_results[key], parallel.raw_anomaly_results[key])
+    pd.testing.assert_frame_equal(sequential.raw_network_results["nodes"], parallel.raw_network_results["nodes"])
+    assert sequential.network_results["hubs"] == parallel.network_results["hubs"]
+    # The summary dict keeps plain records: {"source": address, "direct_connection": count}
+    assert sequential.network_results["network_edges"] == parallel.network_results["network_edges"]
+    assert isinstance(sequential.network_results["network_edges"][0]["source"], str)
+    pd.testing.assert_frame_equal(sequential.fund_flows, parallel.fund_flows)
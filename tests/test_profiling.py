@@ -0,0 +1,60 @@
+import json
+import pstats
+import numpy as np
+import pandas as pd
+from src.address_index import AddressIndex, share_address_categories
+from src.analyzer import BlockchainAnalyzer
+from src.profiling import Profiler, profile_step, profiled
+
+def test_nested_steps_and_json(tmp_path):
+    profiler = Profiler(capture=["inner"], output_dir=str(tmp_path / "profiles"))
+
+    @profiled("outer")
+    def work():
+        with profile_step("inner", rows=1000) as record:
+            sum(range(10000))
+        record["rows"] = 500
+
+    with profiler.activate():
+        work()
+    # Outside activate() steps are not recorded
+    with profile_step("ignored"):
+        pass
+
+    inner, outer = profiler.records
+    assert (inner["name"], inner["parent"], inner["rows"]) == ("inner", "outer", 500)
+    assert (outer["name"], outer["parent"], outer["rows"]) == ("outer", None, None)
+    assert inner["rows_per_sec"] > 0
+    assert outer["wall_seconds"] >= inner["wall_seconds"]
+    assert outer["peak_rss_mb"] >= inner["peak_rss_mb"] > 0
+    assert pstats.Stats(str(tmp_path / "profiles" / "inner.prof")).total_calls > 0
+
+    path = profiler.write_json(str(tmp_path / "run_profile.json"), input="x.jsonl")
+    data = json.load(open(path))
+    assert data["input"] == "x.jsonl"
+    assert [step["name"] for step in data["steps"]] == ["inner", "outer"]
+
+def test_analysis_steps_are_recorded(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 300
+    transactions = share_address_categories(pd.DataFrame({
+        "sender": pd.Categorical([f"A{i}" for i in rng.integers(0, 30, n)]),
+        "recipient": pd.Categorical([f"A{i}" for i in rng.integers(0, 40, n)]),
+        "amount": rng.lognormal(3, 1, n),
+        "token": "token",
+        "height": np.arange(n, dtype=np.int64),
+        "tx_hash": [f"h{i}" for i in range(n)],
+    }))
+    analyzer = BlockchainAnalyzer("unused.jsonl", clustering_method="kmeans", graph_backend="sparse",
+                                  models_path=str(tmp_path / "models.pkl"))
+    analyzer.transactions = transactions
+    analyzer.address_index = AddressIndex.from_transactions(transactions)
+    profiler = Profiler()
+    with profiler.activate():
+        analyzer.run_analysis()
+    steps = {record["name"]: record for record in profiler.records}
+    for stage in ("clustering", "anomaly_detection", "network_analysis"):
+        assert steps[stage]["parent"] is None
+    assert steps["clustering.fit"]["parent"] == "clustering"
+    assert steps["anomaly.isolation_forest"]["rows"] == n
+    assert steps["network.centrality"]["parent"] == "network_analysis"
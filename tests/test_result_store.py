@@ -0,0 +1,100 @@
+import json
+import threading
+import urllib.request
+import numpy as np
+import pandas as pd
+import pytest
+from src.address_index import AddressIndex
+from src.anomaly_detection import AnomalyDetector
+from src.clustering import ClusteringAnalyzer
+from src.network_analysis import NetworkAnalyzer
+from src.result_store import ResultStore, build_result_store, make_server
+
+def _transactions():
+    rng = np.random.default_rng(0)
+    n = 400
+    amount = rng.lognormal(3, 1, n)
+    amount[::97] *= 500
+    return pd.DataFrame({
+        "sender": pd.Series([f"A{i}" for i in rng.integers(0, 30, n)], dtype="category"),
+        "recipient": pd.Series([f"A{i}" for i in rng.integers(0, 45, n)], dtype="category"),
+        "amount": amount,
+        "height": np.arange(n) // 4,
+    })
+
+@pytest.fixture
+def store(tmp_path):
+    transactions = _transactions()
+    index = AddressIndex.from_transactions(transactions)
+    clusters = ClusteringAnalyzer(transactions, index).cluster_addresses(method="kmeans", n_clusters=3)
+    detector = AnomalyDetector(transactions, index)
+    anomalies = {"amount_anomalies": detector.detect_amount_anomalies(),
+                 "activity_anomalies": detector.detect_activity_anomalies()}
+    network = NetworkAnalyzer(transactions, index, backend="sparse")
+    network.build_graph()
+    nodes = network.centrality_table(hub_threshold=0.05, approximate=False)
+    path = build_result_store(str(tmp_path / "results.sqlite"), index, clusters=clusters, anomalies=anomalies,
+                              nodes=nodes, edges=network.edges)
+    with ResultStore(path) as store:
+        yield store, index, clusters, anomalies, nodes, network.edges
+
+def test_lookup_joins_all_results(store):
+    store, index, clusters, anomalies, nodes, edges = store
+    amount = anomalies["amount_anomalies"]
+    flagged = pd.concat([amount["sender"].astype(str), amount["recipient"].astype(str)]).value_counts()
+    for address in index.addresses:
+        result = store.lookup(address)
+        row = clusters[clusters["address"] == address].iloc[0]
+        assert result["cluster"] == row["cluster"] and result["sent_total"] == pytest.approx(row["sent_total"])
+        assert result["amount_anomalies"] == flagged.get(address, 0)
+        assert result["activity_anomaly"] == int(address in set(anomalies["activity_anomalies"]["sender"]))
+        node = nodes[nodes["node"] == index.encode([address])[0]].iloc[0]
+        assert result["degree"] == pytest.approx(node["degree"]) and result["hub"] == node["hub"]
+        assert result["out_edges"] == (edges["sender"] == result["id"]).sum()
+    assert store.lookup("unknown") is None
+
+def test_batch_lookup_and_edges(store):
+    store, index, _, _, _, edges = store
+    batch = store.lookup_many(["A3", "unknown", "A1", "A3"])
+    assert list(batch["address"]) == ["A3", "unknown", "A1", "A3"]
+    assert batch["id"].isna().tolist() == [False, True, False, False]
+    assert batch["cluster"].dtype == "Int64"
+
+    a3 = index.encode(["A3"])[0]
+    out = store.edges("A3", "out", limit=1000)
+    expected = edges[edges["sender"] == a3].sort_values("amount", ascending=False)
+    assert list(out["target"]) == list(index.decode(expected["recipient"]))
+    np.testing.assert_allclose(out["amount"], expected["amount"])
+    incoming = store.edges("A3", "in", limit=2)
+    assert len(incoming) == 2 and set(incoming["target"]) == {"A3"}
+    assert store.edges("unknown").empty
+
+def test_http_lookups(store):
+    store = store[0]
+    server = make_server(store, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    try:
+        with urllib.request.urlopen(f"{base}/address/A3") as response:
+            assert json.load(response)["address"] == "A3"
+        with urllib.request.urlopen(f"{base}/lookup?address=A1&address=nope") as response:
+            assert [r["id"] is None for r in json.load(response)] == [False, True]
+        request = urllib.request.Request(f"{base}/lookup", data=json.dumps({"addresses": ["A2"]}).encode(),
+                                         method="POST")
+        with urllib.request.urlopen(request) as response:
+            assert json.load(response)[0]["address"] == "A2"
+        with urllib.request.urlopen(f"{base}/edges/A3?direction=in&limit=1") as response:
+            assert len(json.load(response)) == 1
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{base}/address/nope")
+        assert error.value.code == 404
+        for limit in ("abc", "0", "-5", "%C2%B2"):
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(f"{base}/edges/A3?limit={limit}")
+            assert error.value.code == 400 and "limit" in json.load(error.value)["error"]
+        with urllib.request.urlopen(f"{base}/edges/A3?limit=10000000") as response:
+            assert len(json.load(response)) > 1
+    finally:
+        server.shutdown()
+        server.server_close()
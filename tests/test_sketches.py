@@ -0,0 +1,133 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from src.data_loader import DataLoader
+from src.sketches import CountMinSketch, CounterpartySketch, HyperLogLog, SpaceSaving, TransferSketches, hash_keys
+
+def _keys(n=50000, seed=0):
+    """Zipf-distributed address strings: a few heavy hitters and a long tail."""
+    rng = np.random.default_rng(seed)
+    return np.array([f"A{k}" for k in rng.zipf(1.3, n) % 20000], dtype=object)
+
+def test_count_min_never_undercounts():
+    keys = _keys()
+    sketch = CountMinSketch(width=512, depth=4)
+    sketch.update(hash_keys(keys))
+    truth = pd.Series(keys).value_counts()
+    estimates = sketch.query(hash_keys(truth.index.to_numpy()))
+    assert (estimates >= truth.to_numpy()).all()
+    # The e/w * N bound holds per key with probability 1 - e^-4; allow the rare miss
+    assert ((estimates - truth.to_numpy()) <= sketch.error_bound).mean() > 0.95
+
+def test_space_saving_bounds_and_heavy_hitters():
+    keys = _keys()
+    summary = SpaceSaving(capacity=100)
+    for chunk in np.array_split(keys, 7):
+        summary.update(chunk)
+    truth = pd.Series(keys).value_counts()
+    top = summary.top(100)
+    true_counts = truth.reindex(top["key"]).to_numpy()
+    assert (top["estimate"].to_numpy() <= true_counts).all()
+    assert (true_counts <= top["estimate"].to_numpy() + summary.error).all()
+    assert summary.error <= summary.error_bound
+    heavy = truth[truth > summary.error_bound].index
+    assert set(heavy) <= set(summary.keys)
+
+def test_merged_shards_match_single_pass():
+    keys = _keys()
+    shards = np.array_split(keys, 3)
+    single_cms, single_hll = CountMinSketch(), HyperLogLog()
+    single_cms.update(hash_keys(keys))
+    single_hll.update(hash_keys(keys))
+    merged_cms, merged_hll, merged_summary = CountMinSketch(), HyperLogLog(), SpaceSaving(capacity=50)
+    for shard in shards:
+        cms, hll, summary = CountMinSketch(), HyperLogLog(), SpaceSaving(capacity=50)
+        cms.update(hash_keys(shard))
+        hll.update(hash_keys(shard))
+        summary.update(shard)
+        merged_cms.merge(cms)
+        merged_hll.merge(hll)
+        merged_summary.merge(summary)
+    np.testing.assert_array_equal(merged_cms.table, single_cms.table)
+    assert merged_hll.count() == single_hll.count()
+
+    truth = pd.Series(keys).value_counts()
+    top = merged_summary.top(50)
+    true_counts = truth.reindex(top["key"]).to_numpy()
+    assert (top["estimate"].to_numpy() <= true_counts).all()
+    assert (true_counts <= top["estimate"].to_numpy() + merged_summary.error).all()
+    assert merged_summary.error <= merged_summary.error_bound
+
+    with pytest.raises(ValueError):
+        CountMinSketch(width=256).merge(CountMinSketch(width=512))
+
+@pytest.mark.parametrize("n", [100, 10000, 200000])
+def test_hyperloglog_accuracy(n):
+    hll = HyperLogLog(precision=12)
+    hll.update(hash_keys(np.array([f"A{i}" for i in range(n)], dtype=object)))
+    assert abs(hll.count() / n - 1) < 4 * hll.relative_error
+
+def test_counterparty_estimates():
+    rng = np.random.default_rng(1)
+    fan_out = {"hub": 3000, "mid": 300, "small": 5}
+    senders, recipients = [], []
+    for sender, k in fan_out.items():
+        targets = [f"{sender}-R{i}" for i in range(k)]
+        # Repeated transfers to the same recipient must not be counted twice
+        senders += [sender] * 3 * k
+        recipients += list(rng.choice(targets, 3 * k)) + targets
+        senders += [sender] * k
+    sketch = CounterpartySketch()
+    sketch.update(hash_keys(np.array(senders, dtype=object)), hash_keys(np.array(recipients, dtype=object)))
+    estimates = sketch.query(hash_keys(np.array(list(fan_out), dtype=object)))
+    np.testing.assert_allclose(estimates, list(fan_out.values()), rtol=0.3)
+
+def test_transfer_sketches_from_loader(tmp_path):
+    rng = np.random.default_rng(2)
+    path = tmp_path / "transfers.jsonl"
+    with open(path, "w") as f:
+        for i in range(3000):
+            sender = "whale" if i % 4 == 0 else f"A{rng.integers(0, 300)}"
+            record = {"sender": sender, "recipient": f"B{rng.integers(0, 200)}",
+                      "amount": str(1000.0 if sender == "whale" else 1.0), "height": str(i)}
+            if i % 100 == 0:
+                record["recipient"] = None
+            f.write(json.dumps(record) + "\n")
+    sketches = TransferSketches(capacity=50)
+    loader = DataLoader(str(path), chunk_size=8192)
+    transactions = loader.load_data(on_chunk=sketches.update)
+    assert loader.summary["chunks"] > 1 and sketches.rows == len(transactions) == 3000
+
+    senders = sketches.top_senders(3)
+    assert senders["address"].iloc[0] == "whale"
+    assert senders["transfers"].iloc[0] <= 750 <= senders["transfers_max"].iloc[0]
+    whale_recipients = transactions.loc[transactions["sender"] == "whale", "recipient"].nunique()
+    assert senders["distinct_recipients"].iloc[0] == pytest.approx(whale_recipients, rel=0.3)
+    assert sketches.top_value_movers(1)["amount_sent"].iloc[0] <= 750000
+    assert sketches.error_bounds()["addresses"] == pytest.approx(501, rel=0.05)
+
+    text, *tables = sketches.summary(5)
+    assert "3000 transfers" in text and [len(t) for t in tables] == [5, 5, 5]
+
+def test_transfer_sketches_on_table_slices():
+    rng = np.random.default_rng(3)
+    n = 2000
+    table = pd.DataFrame({
+        "sender": pd.Categorical([f"A{i}" for i in rng.integers(0, 50, n)], categories=[f"A{i}" for i in range(5000)]),
+        "recipient": pd.Categorical([f"B{i}" for i in rng.integers(0, 50, n)]),
+        "amount": rng.choice([-3.0, 1.0, 2.0], n),
+    })
+    sliced, plain = TransferSketches(capacity=100), TransferSketches(capacity=100)
+    for start in range(0, n, 300):
+        sliced.update(table.iloc[start:start + 300])
+    plain.update(table.astype({"sender": object, "recipient": object}))
+    senders = [sketch.top_senders(50).sort_values("address").reset_index(drop=True) for sketch in (sliced, plain)]
+    pd.testing.assert_frame_equal(*senders)
+
+    # Negative amounts add no value, so capacity above the address count gives exact totals
+    expected = table["amount"].clip(lower=0).groupby(table["sender"], observed=True).sum()
+    movers = sliced.top_value_movers(5).set_index("address")
+    np.testing.assert_allclose(movers["amount_sent"], expected.reindex(movers.index.astype(str)).to_numpy())
+    with pytest.raises(ValueError):
+        SpaceSaving().update(np.array(["A"], dtype=object), [-1.0])
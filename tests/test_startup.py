@@ -0,0 +1,13 @@
+import pytest
+from benchmarks.bench_startup import loaded_heavy_modules
+from src.ai_agent import AIAgent
+from src.config import Config
+
+def test_analyzer_import_is_lightweight():
+    # Runs without OPENAI_API_KEY: only the AI report needs it
+    assert loaded_heavy_modules("src.analyzer") == []
+
+def test_api_key_checked_when_agent_is_created(monkeypatch):
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", None)
+    with pytest.raises(ValueError):
+        AIAgent()
@@ -0,0 +1,38 @@
+import json
+import numpy as np
+from benchmarks.synthetic import generate_transactions, synthetic_transactions
+from src.address_index import AddressIndex
+from src.anomaly_detection import AnomalyDetector
+from src.cycles import find_cycles
+from src.data_loader import DataLoader
+
+def test_generator_is_seeded_and_heavy_tailed():
+    columns, truth = synthetic_transactions(20_000, seed=1)
+    again, _ = synthetic_transactions(20_000, seed=1)
+    for name in columns:
+        np.testing.assert_array_equal(columns[name], again[name])
+    assert (np.diff(columns["height"]) >= 0).all()
+    counts = np.bincount(columns["sender"])
+    regular = counts[:2000]
+    # Power-law hubs: the busiest regular sender far exceeds the median one
+    assert regular.max() > 50 * np.median(regular[regular > 0])
+    assert (counts[truth["burst_senders"]] > np.quantile(regular[regular > 0], 0.999)).all()
+    assert len(truth["amount_rows"]) == 20
+    rows, _ = find_cycles(columns["sender"], columns["recipient"], columns["amount"],
+                          columns["height"].astype(float), max_length=4, max_span=10)
+    found = {tuple(row[row >= 0]) for row in rows}
+    assert len(truth["cycles"]) == 2
+    assert all(tuple(cycle) in found for cycle in truth["cycles"])
+
+def test_injected_anomalies_are_detected(tmp_path):
+    path = str(tmp_path / "transfers.jsonl")
+    truth_path = str(tmp_path / "truth.json")
+    generate_transactions(path, 20_000, seed=3, truth_path=truth_path)
+    truth = json.load(open(truth_path))
+    transactions = DataLoader(path).load_data()
+    assert len(transactions) == 20_000
+    detector = AnomalyDetector(transactions, AddressIndex.from_transactions(transactions))
+    amount = set(detector.detect_amount_anomalies()["tx_hash"])
+    activity = set(detector.detect_activity_anomalies()["sender"])
+    assert set(truth["amount_anomalies"]) <= amount
+    assert set(truth["burst_senders"]) <= activity
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from src.address_index import AddressIndex
+from src.network_analysis import NetworkAnalyzer
+from src.taint import propagate_taint
+
+def _transition(edges, n):
+    rows, cols, weights = zip(*edges)
+    matrix = sparse.csr_matrix((weights, (rows, cols)), shape=(n, n)).toarray()
+    outflow = matrix.sum(axis=1, keepdims=True)
+    return sparse.csr_matrix(np.divide(matrix, outflow, out=np.zeros_like(matrix), where=outflow > 0))
+
+def test_propagation_matches_dense_powers():
+    rng = np.random.default_rng(0)
+    n = 30
+    edges = [(u, v, w) for u, v, w in zip(rng.integers(0, n, 120), rng.integers(0, n, 120), rng.uniform(1, 10, 120))
+             if u != v]
+    transition = _transition(edges, n)
+    seeds = np.array([0, 5, 17])
+    seed, address, exposure, hop = propagate_taint(transition, seeds, hops=3, threshold=0.0, top_n=n, block_size=2)
+    dense = transition.toarray()
+    for s in seeds:
+        x = np.eye(n)[s]
+        expected = np.zeros(n)
+        for _ in range(3):
+            x = x @ dense
+            expected += x
+        expected[s] = 0.0
+        mask = seed == s
+        got = np.zeros(n)
+        got[address[mask]] = exposure[mask]
+        np.testing.assert_allclose(got, expected)
+        assert (np.diff(exposure[mask]) <= 0).all()
+
+def test_threshold_hops_and_top_n():
+    # 0 sends 90% to 1 and 10% to 2; 1 forwards everything to 3, 3 to 4
+    transition = _transition([(0, 1, 9.0), (0, 2, 1.0), (1, 3, 5.0), (3, 4, 2.0)], 5)
+    seed, address, exposure, hop = propagate_taint(transition, [0], hops=2, threshold=0.0, top_n=10)
+    assert dict(zip(address, exposure)) == {1: 0.9, 3: 0.9, 2: 0.1}
+    assert dict(zip(address, hop)) == {1: 1, 2: 1, 3: 2}
+    # The 10% flow is dropped, and 4 lies beyond the hop limit
+    _, address, _, _ = propagate_taint(transition, [0], hops=2, threshold=0.5, top_n=10)
+    assert set(address) == {1, 3}
+    _, address, _, _ = propagate_taint(transition, [0], hops=3, threshold=0.0, top_n=2)
+    assert len(address) == 2 and set(address) <= {1, 3, 4}
+
+def test_network_analyzer_trace_funds():
+    transactions = pd.DataFrame({
+        "sender": ["A", "A", "B", "C", "D"],
+        "recipient": ["B", "C", "D", "D", "A"],
+        "amount": [3.0, 1.0, 3.0, 1.0, 4.0],
+    })
+    index = AddressIndex.from_transactions(transactions)
+    for backend in ("networkx", "sparse"):
+        analyzer = NetworkAnalyzer(transactions, index, backend=backend)
+        flows = analyzer.trace_funds(index.encode(pd.Series(["A", "Z"])), hops=2, top_n=2)
+        assert list(index.decode(flows["address"])) == ["D", "B"]
+        assert list(flows["rank"]) == [1, 2]
+        np.testing.assert_allclose(flows["exposure"], [1.0, 0.75])
+        assert list(flows["hop"]) == [2, 1]
@@ -0,0 +1,61 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from src.sparse_graph import SparseGraph
+from src.utils import (export_network_views, force_layout, plot_activity_anomalies, plot_amount_anomalies,
+                       plot_clusters, plot_network, sample_nodes)
+
+def _graph():
+    # A star around node 0, a chain 10 -> 11 -> 12 -> 13 and an isolated pair
+    edges = pd.DataFrame({
+        "sender": [0, 0, 0, 0, 10, 11, 12, 20],
+        "recipient": [1, 2, 3, 4, 11, 12, 13, 21],
+        "amount": [1.0] * 8,
+        "tx_count": [1] * 8,
+    })
+    return SparseGraph.from_edges(edges)
+
+def test_sample_nodes_by_degree_and_anomaly_neighbourhood():
+    graph = _graph()
+    assert graph.nodes[sample_nodes(graph, 1)].tolist() == [0]
+    neighbourhood = graph.nodes[sample_nodes(graph, 10, anomalies=[11], hops=1)]
+    assert neighbourhood[0] == 11
+    assert set(neighbourhood) == {10, 11, 12}
+    assert set(graph.nodes[sample_nodes(graph, 10, anomalies=[11], hops=2)]) == {10, 11, 12, 13}
+
+def test_force_layout_in_unit_square():
+    graph = _graph()
+    nodes = np.arange(graph.number_of_nodes())
+    for dense_limit in (1000, 2):
+        positions = force_layout(graph, nodes, iterations=20, dense_limit=dense_limit, samples=4)
+        assert positions.shape == (len(nodes), 2)
+        assert np.isfinite(positions).all()
+        assert positions.min() >= 0.0 and positions.max() <= 1.0
+
+def test_network_views_have_physics_off(tmp_path):
+    graph = _graph()
+    path = str(tmp_path / "network.html")
+    plot_network(graph, save_path=path, max_nodes=5, layout_iterations=5)
+    html = open(path).read()
+    assert '"enabled": false' in html
+    paths = export_network_views(graph, str(tmp_path), sizes=(3, 6), layout_iterations=5)
+    assert [p.rsplit("_", 1)[1] for p in paths] == ["3.html", "6.html"]
+
+def test_large_plots_are_binned_and_closed(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 5000
+    transactions = pd.DataFrame({"amount": rng.lognormal(3, 2, n)})
+    anomalies = transactions.nlargest(20, "amount")
+    activity = pd.DataFrame({"sender": [f"A{i}" for i in range(n)], "tx_count": rng.integers(1, 50, n)})
+    clusters = pd.DataFrame({"sent_total": rng.random(n), "received_total": rng.random(n),
+                             "cluster": rng.integers(-1, 4, n)})
+    before = len(plt.get_fignums())
+    plot_amount_anomalies(transactions, anomalies, save_path=str(tmp_path / "amount.png"), max_points=1000)
+    plot_activity_anomalies(activity, activity.head(5), save_path=str(tmp_path / "activity.png"), max_points=1000)
+    plot_clusters(clusters, "sent_total", "received_total", "cluster", save_path=str(tmp_path / "clusters.png"),
+                  max_points=1000)
+    plot_clusters(clusters.head(100), "sent_total", "received_total", "cluster",
+                  save_path=str(tmp_path / "small.png"))
+    assert len(plt.get_fignums()) == before
+    for name in ("amount", "activity", "clusters", "small"):
+        assert (tmp_path / f"{name}.png").stat().st_size > 0